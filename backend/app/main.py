@@ -1,21 +1,33 @@
 import logging
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, HttpUrl, ValidationError
+from typing import List, Optional
 import sys
 import os
 import re
+import uuid
 from pathlib import Path
-from services.video_service import VideoService
+from services.video_utils import OUTPUT_DIR, get_video_id, expand_playlist
 from services.gemini_service import GeminiChatbot
+from services.checkpoint_service import CheckpointManager, load_job_manifests
+from services.retention_service import RetentionManager
+from services.metrics import REGISTRY, QUEUE_JOBS
+from services.job_queue import create_job_queue, PRIORITY_INTERACTIVE, PRIORITY_BATCH, DEFAULT_TENANT
+from services.worker import Worker
+from services.search_service import SearchIndex
+from services.chat_service import ChatService, create_chat_store
+from services.upstream import UpstreamError, RateLimitedError
+import math
 import shutil
+import threading
 
 current_dir = Path(__file__).resolve().parent
 sys.path.append(str(current_dir))
 
 app = FastAPI()
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 # Check for required environment variables
@@ -31,13 +43,30 @@ if missing_vars:
     logger.error("Please set up your .env file with the required API keys.")
     logger.error("See .env.example for reference.")
 
-video_service = VideoService()
+# Created on first job so API workers that only serve status and chat never
+# load cv2, numpy, yt_dlp, groq or pytesseract
+video_service = None
+video_service_lock = threading.Lock()
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 if not gemini_api_key:
     logger.error("GEMINI_API_KEY not found. AI chat functionality will fail.")
     gemini_api_key = "dummy_key"  # Prevent crashes during development
 
 gemini_chatbot = GeminiChatbot(gemini_api_key)
+chat_service = ChatService(gemini_chatbot, create_chat_store())
+
+# Jobs go through a shared queue (VIDIWISE_QUEUE_URL) so separate worker
+# processes (run_worker.py) can process them. Inline workers keep single-process
+# deployments working; set VIDIWISE_INLINE_WORKERS=0 on API-only nodes.
+job_queue = create_job_queue()
+# Folders whose video is queued again are kept intact until the job runs
+retention_manager = RetentionManager(OUTPUT_DIR, job_status=lambda video_id: (job_queue.get(video_id) or {}).get('status'))
+inline_workers = []
+search_index = SearchIndex(os.path.join(OUTPUT_DIR, "search.db"))
+MAX_BATCH_SIZE = 5000
+YOUTUBE_URL_REGEX = r'^(https?\:\/\/)?(www\.youtube\.com|youtu\.?be)\/.+$'
+# Content-addressed frame and thumbnail files, plus the per-video sprite sheet
+FRAME_FILE_REGEX = r'^([0-9a-f]+|sprite)\.(webp|jpg)$'
 
 app.add_middleware(
     CORSMiddleware,
@@ -47,12 +76,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-video_processing_status = {}
-video_folders = {}  # Track folder paths for each video
-video_metadata = {}  # Track title and summary for each video
+def job_status(job):
+    """Map queue states onto the statuses the frontend polls for."""
+    if not job:
+        return "not_found"
+    if job["status"] in ("queued", "leased"):
+        return "processing"
+    return job["status"]
 
 class VideoURL(BaseModel):
     url: HttpUrl
+    profile: bool = False  # Honored only when VIDIWISE_ENABLE_PROFILING is set
+    tenant: str = DEFAULT_TENANT
 
     @classmethod
     def __get_validators__(cls):
@@ -63,15 +98,21 @@ class VideoURL(BaseModel):
         if not isinstance(v, str):
             raise ValueError('URL must be a string')
         
-        youtube_regex = r'^(https?\:\/\/)?(www\.youtube\.com|youtu\.?be)\/.+$'
-        if not re.match(youtube_regex, v):
+        if not re.match(YOUTUBE_URL_REGEX, v):
             raise ValueError('Invalid YouTube URL')
         
         return v
 
+class BatchRequest(BaseModel):
+    urls: List[str] = []
+    playlistUrl: Optional[str] = None
+    tenant: str = DEFAULT_TENANT
+    priority: int = PRIORITY_BATCH  # Capped below single-video requests
+
 class ChatRequest(BaseModel):
     message: str
     videoId: str
+    sessionId: Optional[str] = None  # Omit to start a new conversation
 
 class VideoTitleRequest(BaseModel):
     videoId: str
@@ -84,19 +125,32 @@ async def validation_exception_handler(request: Request, exc: ValidationError):
         content={"message": "Invalid input", "details": exc.errors()},
     )
 
+@app.exception_handler(UpstreamError)
+async def upstream_exception_handler(request: Request, exc: UpstreamError):
+    # Quota exhaustion is the client's cue to retry later; anything else is a bad gateway
+    if isinstance(exc, RateLimitedError):
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "The AI service is busy, please retry shortly."},
+            headers={"Retry-After": str(math.ceil(exc.retry_after or 5))},
+        )
+    return JSONResponse(status_code=502, content={"detail": f"AI service error: {str(exc)}"})
+
 @app.post("/process-video")
-async def process_video(video: VideoURL, background_tasks: BackgroundTasks):
+def process_video(video: VideoURL):
+    # Plain def, like every endpoint that touches the job queue: SQLite transactions and
+    # Redis round trips block, so they run in the threadpool instead of the event loop
     try:
         logger.info(f"Received request to process video: {video.url}")
         
         url_str = str(video.url)
-        video_id = video_service.get_video_id(url_str)
+        video_id = get_video_id(url_str)
         
         if not video_id:
             raise HTTPException(status_code=400, detail="Could not extract video ID from URL")
             
-        video_processing_status[video_id] = "processing"
-        background_tasks.add_task(process_video_task, url_str, video_id)
+        job_queue.enqueue(video_id, url_str, priority=PRIORITY_INTERACTIVE,
+                          payload={"profile": video.profile}, tenant=video.tenant)
         
         return {"message": "Video processing started", "video_id": video_id}
         
@@ -104,43 +158,127 @@ async def process_video(video: VideoURL, background_tasks: BackgroundTasks):
         logger.exception(f"Error processing video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while processing the video: {str(e)}")
 
-async def process_video_task(url: str, video_id: str):
+@app.post("/process-batch")
+def process_batch(batch: BatchRequest):
+    """Queue a list of URLs and/or a whole playlist or channel as one batch."""
+    # Plain def: playlist expansion blocks on yt-dlp, so it runs in the threadpool
     try:
-        result = video_service.process_video(url)
-        video_processing_status[video_id] = "completed"
-        video_folders[video_id] = result.get("video_folder")
+        entries = []
+        for url in batch.urls:
+            if not re.match(YOUTUBE_URL_REGEX, url):
+                raise HTTPException(status_code=400, detail=f"Invalid YouTube URL: {url}")
+            entries.append((get_video_id(url), url))
+        if batch.playlistUrl:
+            if not re.match(YOUTUBE_URL_REGEX, batch.playlistUrl):
+                raise HTTPException(status_code=400, detail="Invalid YouTube playlist URL")
+            entries.extend(expand_playlist(batch.playlistUrl))
+        
+        # Same video listed twice (or in the playlist and the list) is queued once
+        urls = {}
+        for video_id, url in entries:
+            if video_id:
+                urls.setdefault(video_id, url)
+        if not urls:
+            raise HTTPException(status_code=400, detail="No videos found in batch")
+        if len(urls) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_SIZE} videos")
+        
+        batch_id = uuid.uuid4().hex[:12]
+        priority = min(batch.priority, PRIORITY_INTERACTIVE - 1)
+        existing = job_queue.get_many(urls.keys())
+        counts = {"queued": 0, "already_processed": 0, "already_queued": 0}
+        for video_id, url in urls.items():
+            job = existing.get(video_id)
+            if job and job["status"] == "completed":
+                counts["already_processed"] += 1
+                continue
+            if job and job["status"] in ("queued", "leased"):
+                counts["already_queued"] += 1
+            else:
+                counts["queued"] += 1
+            job_queue.enqueue(video_id, url, priority=priority, tenant=batch.tenant, batch_id=batch_id)
+        job_queue.create_batch(batch_id, batch.tenant, list(urls), source=batch.playlistUrl)
+        logger.info(f"Batch {batch_id} for tenant {batch.tenant}: {len(urls)} videos, {counts}")
         
-        # Generate title and summary automatically
-        transcript_path = os.path.join(result.get("video_folder"), "video_transcript.txt")
-        if os.path.exists(transcript_path):
-            if gemini_chatbot.read_transcript(transcript_path):
-                # Generate title
-                title_prompt = "Based on this video transcript, generate a concise, descriptive title (maximum 80 characters) that captures the main topic. Return only the title, nothing else."
-                title = gemini_chatbot.send_message(title_prompt)
-                
-                # Generate summary
-                summary_prompt = "Generate a summary in 1 short paragraphs. DO NOT include any output like 'here is the summary', 'here's a summary', 'this video', 'the video shows', or any introductory text. Just give me the summary content directly, no extra trash text."
-                summary = gemini_chatbot.send_message(summary_prompt)
-                
-                video_metadata[video_id] = {
-                    "title": title.strip(),
-                    "summary": summary.strip(),
-                    "auto_generated": True
-                }
-                logger.info(f"Generated metadata for video {video_id}")
+        return {"message": "Batch processing started", "batch_id": batch_id, "total": len(urls), **counts}
         
-        logger.info(f"Video {video_id} processed successfully in folder: {result.get('video_folder')}")
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in background video processing: {str(e)}")
-        video_processing_status[video_id] = "failed"
+        logger.exception(f"Error processing batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"An error occurred while processing the batch: {str(e)}")
+
+@app.get("/batch-status/{batch_id}")
+def get_batch_status(batch_id: str):
+    """Aggregate progress of every video in a batch."""
+    progress = job_queue.batch_progress(batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return progress
+
+def get_video_service():
+    """Import the media pipeline and build the VideoService on first use."""
+    global video_service
+    with video_service_lock:
+        if video_service is None:
+            from services.video_service import VideoService
+            video_service = VideoService(queue_depth=lambda: job_queue.depth().get('queued', 0))
+    return video_service
+
+@app.on_event("startup")
+async def start_background_workers():
+    """Import videos known only from checkpoint manifests, then start workers."""
+    imported = 0
+    for manifest_job in load_job_manifests(OUTPUT_DIR):
+        video_id = manifest_job["video_id"]
+        if job_queue.get(video_id):
+            continue
+        # Interrupted jobs are queued again; finished ones are recorded as-is
+        job_queue.enqueue(video_id, manifest_job["url"])
+        if manifest_job.get("status") != "processing":
+            job_queue.update(video_id, status=manifest_job.get("status", "completed"),
+                             video_folder=manifest_job["video_folder"], metadata=manifest_job.get("metadata"))
+        imported += 1
+    logger.info(f"Imported {imported} jobs from checkpoint manifests")
+    threading.Thread(target=index_unindexed_videos, name="search-backfill", daemon=True).start()
+    
+    for _ in range(int(os.getenv("VIDIWISE_INLINE_WORKERS", "1"))):
+        inline_workers.append(Worker(job_queue, get_video_service, search_index=search_index).start())
+    retention_manager.start()
+
+def index_unindexed_videos():
+    """Add completed videos missing from the persisted search index (e.g. processed before it existed)."""
+    indexed = search_index.indexed_videos()
+    added = 0
+    for job in job_queue.list_jobs():
+        folder = job.get("video_folder")
+        if job["status"] != "completed" or job["id"] in indexed or not folder:
+            continue
+        transcript_path = os.path.join(folder, "video_transcript.txt")
+        if not os.path.exists(transcript_path):
+            continue
+        try:
+            search_index.index_transcript(job["id"], transcript_path)
+            added += 1
+        except Exception as e:
+            logger.error(f"Error indexing video {job['id']} for search: {str(e)}")
+    if added:
+        logger.info(f"Added {added} videos to the search index")
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    for worker in inline_workers:
+        worker.stop()
+    retention_manager.stop()
 
 @app.get("/video-status/{video_id}")
-async def get_video_status(video_id: str):
-    status = video_processing_status.get(video_id, "not_found")
-    folder = video_folders.get(video_id)
-    metadata = video_metadata.get(video_id, {})
+def get_video_status(video_id: str):
+    job = job_queue.get(video_id)
+    folder = job.get("video_folder") if job else None
+    retention_manager.touch(folder)
+    metadata = (job.get("metadata") if job else None) or {}
     return {
-        "status": status,
+        "status": job_status(job),
         "folder": folder,
         "video_id": video_id,
         "title": metadata.get("title"),
@@ -148,13 +286,54 @@ async def get_video_status(video_id: str):
         "auto_generated": metadata.get("auto_generated", False)
     }
 
+@app.get("/video-frames/{video_id}")
+def get_video_frames(video_id: str):
+    """Keyframe timestamps with thumbnail and sprite URLs, so previews don't fetch full frames."""
+    job = job_queue.get(video_id)
+    folder = job.get("video_folder") if job else None
+    if not folder or not os.path.exists(folder):
+        raise HTTPException(status_code=404, detail="Video folder not found. Please process the video first.")
+    retention_manager.touch(folder)
+
+    outputs = (CheckpointManager(folder).manifest['stages'].get('keyframes') or {}).get('outputs') or {}
+    base = f"/video-frames/{video_id}"
+    frames = []
+    for record in outputs.get('frames', []):
+        thumbnail = record.get('thumbnail')
+        frames.append({
+            "timestamp": record['timestamp'],
+            # Full frames are evicted first when the disk budget is tight
+            "frame": f"{base}/frames/{os.path.basename(record['path'])}" if os.path.exists(record['path']) else None,
+            "thumbnail": f"{base}/thumbnails/{os.path.basename(thumbnail)}" if thumbnail else None,
+            "sprite": record.get('sprite')
+        })
+    sprite = None
+    if frames and frames[0]["sprite"]:
+        sprite = f"{base}/thumbnails/sprite{os.path.splitext(outputs['frames'][0]['thumbnail'])[1]}"
+    return {"video_id": video_id, "frames": frames, "sprite": sprite, "storage": outputs.get('storage')}
+
+@app.get("/video-frames/{video_id}/{kind}/{name}")
+def get_video_frame_file(video_id: str, kind: str, name: str):
+    job = job_queue.get(video_id)
+    folder = job.get("video_folder") if job else None
+    if not folder or kind not in ("frames", "thumbnails") or not re.match(FRAME_FILE_REGEX, name):
+        raise HTTPException(status_code=404, detail="Frame not found")
+    path = os.path.join(folder, kind, name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Frame not found")
+    # Frames and thumbnails are named by content; the sprite sheet is rewritten on reprocessing
+    cache_control = "no-cache" if name.startswith("sprite") else "public, max-age=31536000, immutable"
+    return FileResponse(path, headers={"Cache-Control": cache_control})
+
 @app.get("/list-videos")
-async def list_processed_videos():
+def list_processed_videos():
     """List all processed videos with their folders."""
     videos = []
-    for video_id, folder in video_folders.items():
-        status = video_processing_status.get(video_id, "unknown")
-        metadata = video_metadata.get(video_id, {})
+    for job in job_queue.list_jobs():
+        video_id = job["id"]
+        folder = job.get("video_folder")
+        status = job_status(job)
+        metadata = job.get("metadata") or {}
         if folder and os.path.exists(folder):
             transcript_exists = os.path.exists(os.path.join(folder, "video_transcript.txt"))
             videos.append({
@@ -169,10 +348,11 @@ async def list_processed_videos():
     return {"videos": videos}
 
 @app.delete("/delete-video/{video_id}")
-async def delete_video(video_id: str):
+def delete_video(video_id: str):
     """Delete a video's folder and all its files."""
     try:
-        folder = video_folders.get(video_id)
+        job = job_queue.get(video_id)
+        folder = job.get("video_folder") if job else None
         if not folder:
             raise HTTPException(status_code=404, detail="Video not found")
         
@@ -180,10 +360,9 @@ async def delete_video(video_id: str):
             shutil.rmtree(folder)
             logger.info(f"Deleted folder: {folder}")
         
-        # Clean up tracking dictionaries
-        video_folders.pop(video_id, None)
-        video_processing_status.pop(video_id, None)
-        video_metadata.pop(video_id, None)
+        job_queue.delete(video_id)
+        search_index.remove_video(video_id)
+        chat_service.delete_video(video_id)
         
         return {"message": f"Video {video_id} deleted successfully"}
         
@@ -192,17 +371,18 @@ async def delete_video(video_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/update-video-title/{video_id}")
-async def update_video_title(video_id: str, request: VideoTitleRequest):
+def update_video_title(video_id: str, request: VideoTitleRequest):
     """Update the title of a video."""
     try:
-        if video_id not in video_folders:
+        job = job_queue.get(video_id)
+        if not job or not job.get("video_folder"):
             raise HTTPException(status_code=404, detail="Video not found")
         
-        if video_id not in video_metadata:
-            video_metadata[video_id] = {}
-        
-        video_metadata[video_id]["title"] = request.title.strip()
-        video_metadata[video_id]["auto_generated"] = False
+        metadata = job.get("metadata") or {}
+        metadata["title"] = request.title.strip()
+        metadata["auto_generated"] = False
+        job_queue.update(video_id, metadata=metadata)
+        CheckpointManager(job["video_folder"]).update_job(metadata=metadata)
         
         return {"message": "Title updated successfully", "title": request.title.strip()}
         
@@ -211,29 +391,61 @@ async def update_video_title(video_id: str, request: VideoTitleRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/start-chat")
-async def start_chat(request: ChatRequest):
+def start_chat(request: ChatRequest):
+    # Plain def: the Gemini call blocks, so it runs in the threadpool instead of the event loop
     try:
         # Get the video folder for this video ID
-        video_folder = video_folders.get(request.videoId)
+        job = job_queue.get(request.videoId)
+        video_folder = job.get("video_folder") if job else None
         if not video_folder:
             raise HTTPException(status_code=404, detail="Video folder not found. Please process the video first.")
         
+        retention_manager.touch(video_folder)
         transcript_path = os.path.join(video_folder, "video_transcript.txt")
         
         if not os.path.exists(transcript_path):
             raise HTTPException(status_code=404, detail="Transcript not found")
         
-        if not gemini_chatbot.read_transcript(transcript_path):
-            raise HTTPException(status_code=500, detail="Failed to read transcript")
+        try:
+            reply = chat_service.send(request.videoId, transcript_path, request.message, session_id=request.sessionId)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Chat session not found or expired")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        response = gemini_chatbot.send_message(request.message)
-        
-        return {"message": response}
+        return {"message": reply["message"], "sessionId": reply["session_id"], "usage": reply["usage"]}
         
+    except (HTTPException, UpstreamError):
+        raise
     except Exception as e:
         logger.error(f"Error in chat process: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search")
+def search_videos(q: str, limit: int = 10):
+    """Rank processed videos by BM25 relevance of their transcript and OCR segments."""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    results = search_index.search(q, limit=max(1, min(limit, 100)))
+    jobs = job_queue.get_many([result["video_id"] for result in results])
+    for result in results:
+        metadata = (jobs.get(result["video_id"]) or {}).get("metadata") or {}
+        result["title"] = metadata.get("title", f"Video {result['video_id']}")
+    return {"query": q, "results": results}
+
+@app.get("/storage-stats")
+async def storage_stats():
+    """Per-tier disk usage of video_findings from the last retention pass."""
+    return retention_manager.stats
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics for pipeline stages, jobs, upstream calls and caches."""
+    depth = job_queue.depth()
+    for status in ("queued", "leased", "completed", "failed"):
+        QUEUE_JOBS.set(depth.get(status, 0), status=status)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "OK"}
@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from services.job_queue import SQLiteTransaction, REDIS_URL_SCHEMES
+from services.upstream import RateLimitedError
+
+logger = logging.getLogger(__name__)
+
+CHAT_INSTRUCTIONS = "You answer questions about one video using its transcript, which includes on-screen text (Frame OCR) with timestamps. Provide a detailed answer based only on the information in the transcript, and mention timestamps when they help."
+SUMMARY_INSTRUCTIONS = "Summarize this conversation about a video so it can continue without the full history. Keep the questions asked, the facts and timestamps given in answers, and any preferences the user stated. Reply with the summary only, in at most {words} words."
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token) for budgeting before a request is sent."""
+    return len(text) // 4 + 1
+
+
+class ChatSessionStore:
+    """Chat sessions and per-video context caches in SQLite, shared by the API processes on one host."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.local = threading.local()
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    summary TEXT,
+                    history TEXT NOT NULL,
+                    usage TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0
+                )""")
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(sessions)")}
+            if 'version' not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_video ON sessions (video_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS context_caches (
+                    video_id TEXT PRIMARY KEY,
+                    transcript_hash TEXT NOT NULL,
+                    name TEXT,
+                    expires_at REAL NOT NULL
+                )""")
+
+    @property
+    def conn(self):
+        if not hasattr(self.local, 'conn'):
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return self.local.conn
+
+    def transaction(self):
+        return SQLiteTransaction(self.conn)
+
+    def get(self, session_id):
+        row = self.conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), 'history': json.loads(row['history']), 'usage': json.loads(row['usage'])}
+
+    def save(self, session):
+        """Write a session; returns False if another writer saved it since it was read (or created)."""
+        session['updated_at'] = time.time()
+        version = session.get('version')
+        with self.transaction() as conn:
+            if version is None:
+                cursor = conn.execute("""
+                    INSERT INTO sessions (id, video_id, summary, history, usage, created_at, updated_at, version)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 1) ON CONFLICT(id) DO NOTHING""",
+                    (session['id'], session['video_id'], session['summary'], json.dumps(session['history']),
+                     json.dumps(session['usage']), session['created_at'], session['updated_at']))
+            else:
+                cursor = conn.execute("""
+                    UPDATE sessions SET summary = ?, history = ?, usage = ?, updated_at = ?, version = version + 1
+                    WHERE id = ? AND version = ?""",
+                    (session['summary'], json.dumps(session['history']), json.dumps(session['usage']),
+                     session['updated_at'], session['id'], version))
+        if cursor.rowcount != 1:
+            return False
+        session['version'] = (version or 0) + 1
+        return True
+
+    def expire(self, max_age):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age,))
+
+    def get_cache(self, video_id):
+        row = self.conn.execute("SELECT * FROM context_caches WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row) if row else None
+
+    def save_cache(self, video_id, transcript_hash, name, expires_at):
+        with self.transaction() as conn:
+            conn.execute("""
+                INSERT INTO context_caches (video_id, transcript_hash, name, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    transcript_hash = excluded.transcript_hash, name = excluded.name, expires_at = excluded.expires_at""",
+                (video_id, transcript_hash, name, expires_at))
+
+    def delete_video(self, video_id):
+        """Drop a video's sessions and cache record; returns the cache record, if any."""
+        cache = self.get_cache(video_id)
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM context_caches WHERE video_id = ?", (video_id,))
+        return cache
+
+
+class RedisChatSessionStore:
+    """ChatSessionStore on Redis, for API processes on several hosts."""
+
+    def __init__(self, url, prefix='vidiwise'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RedisChatSessionStore requires the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.session_prefix = f"{prefix}:chat:session:"
+        self.video_prefix = f"{prefix}:chat:video:"
+        self.cache_prefix = f"{prefix}:chat:cache:"
+        # Session IDs scored by updated_at, for expiry
+        self.sessions_key = f"{prefix}:chat:sessions"
+
+    def watch(self, key, apply):
+        """Run apply(pipe) in an optimistic WATCH/MULTI transaction; apply calls pipe.multi() before writing."""
+        import redis
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    result = apply(pipe)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+    def get(self, session_id):
+        data = self.client.hgetall(self.session_prefix + session_id)
+        if not data:
+            return None
+        return {'id': data['id'], 'video_id': data['video_id'], 'summary': data['summary'] or None,
+                'history': json.loads(data['history']), 'usage': json.loads(data['usage']),
+                'created_at': float(data['created_at']), 'updated_at': float(data['updated_at']),
+                'version': int(data['version'])}
+
+    def save(self, session):
+        session['updated_at'] = time.time()
+        version = session.get('version')
+        key = self.session_prefix + session['id']
+
+        def apply(pipe):
+            current = pipe.hget(key, 'version')
+            if (int(current) if current is not None else None) != version:
+                return False
+            pipe.multi()
+            pipe.hset(key, mapping={
+                'id': session['id'], 'video_id': session['video_id'], 'summary': session['summary'] or '',
+                'history': json.dumps(session['history']), 'usage': json.dumps(session['usage']),
+                'created_at': session['created_at'], 'updated_at': session['updated_at'],
+                'version': (version or 0) + 1})
+            pipe.zadd(self.sessions_key, {session['id']: session['updated_at']})
+            pipe.sadd(self.video_prefix + session['video_id'], session['id'])
+            return True
+        if not self.watch(key, apply):
+            return False
+        session['version'] = (version or 0) + 1
+        return True
+
+    def expire(self, max_age):
+        cutoff = time.time() - max_age
+        for session_id in self.client.zrangebyscore(self.sessions_key, '-inf', cutoff):
+            key = self.session_prefix + session_id
+
+            def apply(pipe):
+                updated_at, video_id = pipe.hmget(key, 'updated_at', 'video_id')
+                if updated_at is not None and float(updated_at) >= cutoff:
+                    # Saved again since the scan
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.zrem(self.sessions_key, session_id)
+                if video_id:
+                    pipe.srem(self.video_prefix + video_id, session_id)
+            self.watch(key, apply)
+
+    def get_cache(self, video_id):
+        data = self.client.hgetall(self.cache_prefix + video_id)
+        if not data:
+            return None
+        return {'video_id': video_id, 'transcript_hash': data['transcript_hash'], 'name': data['name'] or None,
+                'expires_at': float(data['expires_at'])}
+
+    def save_cache(self, video_id, transcript_hash, name, expires_at):
+        self.client.hset(self.cache_prefix + video_id, mapping={
+            'transcript_hash': transcript_hash, 'name': name or '', 'expires_at': expires_at})
+
+    def delete_video(self, video_id):
+        cache = self.get_cache(video_id)
+        session_ids = self.client.smembers(self.video_prefix + video_id)
+        with self.client.pipeline() as pipe:
+            for session_id in session_ids:
+                pipe.delete(self.session_prefix + session_id)
+                pipe.zrem(self.sessions_key, session_id)
+            pipe.delete(self.video_prefix + video_id, self.cache_prefix + video_id)
+            pipe.execute()
+        return cache
+
+
+def create_chat_store(url=None):
+    """Session store on Redis when VIDIWISE_QUEUE_URL points at one, else OUTPUT_DIR/chat_sessions.db."""
+    url = url or os.getenv("VIDIWISE_QUEUE_URL") or ''
+    if url.startswith(REDIS_URL_SCHEMES):
+        return RedisChatSessionStore(url)
+    from services.video_utils import OUTPUT_DIR
+    return ChatSessionStore(os.path.join(OUTPUT_DIR, "chat_sessions.db"))
+
+
+class ChatService:
+    """Multi-turn chat about a video.
+
+    The transcript is a fixed prefix shared by every session on the video, so it
+    goes into a Gemini context cache when it is big enough to be cacheable and
+    each turn only sends the conversation. Sessions keep the last keep_turns
+    messages verbatim; when the history outgrows history_token_budget the older
+    messages are folded into a running summary.
+    """
+
+    def __init__(self, chatbot, store, history_token_budget=2000, keep_turns=4, summary_words=200,
+                 cache_ttl=3600, min_cache_tokens=4096, session_max_age=7 * 86400):
+        self.chatbot = chatbot
+        self.store = store
+        self.history_token_budget = history_token_budget
+        self.keep_turns = keep_turns
+        self.summary_words = summary_words
+        self.cache_ttl = cache_ttl
+        self.min_cache_tokens = min_cache_tokens
+        self.session_max_age = session_max_age
+        # Striped so the lock table stays bounded. Only cache creation takes one,
+        # and never while holding another, so stripes cannot deadlock
+        self.locks = [threading.Lock() for _ in range(64)]
+
+    def lock_for(self, key):
+        return self.locks[hash(key) % len(self.locks)]
+
+    def transcript_turn(self, transcript):
+        return {"role": "user", "text": f"Video transcript:\n\n{transcript}"}
+
+    def context_cache(self, video_id, transcript):
+        """Name of a live context cache holding this transcript, or None to send it inline."""
+        transcript_hash = hashlib.sha256(transcript.encode('utf-8')).hexdigest()
+        cache = self.store.get_cache(video_id)
+        if cache and cache['transcript_hash'] == transcript_hash and cache['expires_at'] > time.time() + 60:
+            return cache['name']
+        if estimate_tokens(transcript) < self.min_cache_tokens:
+            # Below the API's minimum cacheable size
+            return None
+
+        with self.lock_for(f"cache:{video_id}"):
+            cache = self.store.get_cache(video_id)
+            if cache and cache['transcript_hash'] == transcript_hash and cache['expires_at'] > time.time() + 60:
+                return cache['name']
+            try:
+                name = self.chatbot.create_cache([self.transcript_turn(transcript)], CHAT_INSTRUCTIONS, self.cache_ttl)
+                logger.info(f"Created context cache {name} for video {video_id}")
+            except RateLimitedError:
+                # Sending the transcript inline would hit the same quota
+                raise
+            except Exception as e:
+                # Remember the failure for a while instead of retrying on every turn
+                logger.warning(f"Context caching unavailable for video {video_id}, sending transcript inline: {str(e)}")
+                name = None
+            self.store.save_cache(video_id, transcript_hash, name,
+                                  time.time() + (self.cache_ttl if name else self.cache_ttl / 4))
+            return name
+
+    def history_tokens(self, session):
+        return estimate_tokens(session['summary'] or '') + sum(estimate_tokens(turn['text']) for turn in session['history'])
+
+    def compact(self, session):
+        """Fold all but the last keep_turns messages into the session summary."""
+        older, recent = session['history'][:-self.keep_turns], session['history'][-self.keep_turns:]
+        if not older:
+            return
+        lines = [f"Summary of earlier conversation: {session['summary']}"] if session['summary'] else []
+        for turn in older:
+            lines.append(f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['text']}")
+        try:
+            result = self.chatbot.generate([{"role": "user", "text": "\n\n".join(lines)}],
+                                           system_instruction=SUMMARY_INSTRUCTIONS.format(words=self.summary_words),
+                                           operation='summarize')
+            session['summary'] = result['text'].strip()
+            session['usage']['summary_request_bytes'] += result['request_bytes']
+        except RateLimitedError as e:
+            # Keep the history and try again on the next turn
+            logger.warning(f"Deferring summary of chat session {session['id']}: {str(e)}")
+            return
+        except Exception as e:
+            # Without a summary the older turns are dropped so requests stay within budget
+            logger.error(f"Error summarizing chat session {session['id']}: {str(e)}")
+        session['history'] = recent
+
+    def new_session(self, video_id):
+        self.store.expire(self.session_max_age)
+        now = time.time()
+        return {
+            'id': uuid.uuid4().hex, 'video_id': video_id, 'summary': None, 'history': [],
+            'usage': {'turns': 0, 'request_bytes': 0, 'prompt_tokens': 0, 'cached_tokens': 0,
+                      'output_tokens': 0, 'summary_request_bytes': 0},
+            'created_at': now, 'updated_at': now, 'version': None
+        }
+
+    def load(self, session_id, video_id):
+        session = self.store.get(session_id)
+        if session is None:
+            raise KeyError(f"Chat session {session_id} not found")
+        if session['video_id'] != video_id:
+            raise ValueError(f"Chat session {session_id} belongs to another video")
+        return session
+
+    def record_turn(self, session, video_id, turn, turn_usage):
+        """Add a turn to the session and save it; returns the saved session.
+
+        Saves are versioned: if another turn (from this or another API process)
+        saved the session meanwhile, the turn is added to that saved version
+        instead, so neither turn is lost.
+        """
+        while True:
+            session['usage']['turns'] += 1
+            for key in ('request_bytes', 'prompt_tokens', 'cached_tokens', 'output_tokens'):
+                session['usage'][key] += turn_usage[key]
+            session['history'].extend(turn)
+            if self.history_tokens(session) > self.history_token_budget:
+                self.compact(session)
+            if self.store.save(session):
+                return session
+            logger.info(f"Chat session {session['id']} was saved concurrently, adding the turn to the saved history")
+            session = self.load(session['id'], video_id)
+
+    def send(self, video_id, transcript_path, message, session_id=None):
+        """Answer one message in a session (a new one when session_id is None)."""
+        with open(transcript_path, 'r', encoding='utf-8') as f:
+            transcript = f.read()
+
+        # The session is not locked across the Gemini call; concurrent turns are reconciled when saved
+        session = self.load(session_id, video_id) if session_id else self.new_session(video_id)
+        cache_name = self.context_cache(video_id, transcript)
+        contents = [] if cache_name else [self.transcript_turn(transcript)]
+        if session['summary']:
+            contents.append({"role": "user", "text": f"Summary of our conversation so far:\n{session['summary']}"})
+        contents.extend(session['history'])
+        contents.append({"role": "user", "text": message})
+
+        result = self.chatbot.generate(contents, system_instruction=CHAT_INSTRUCTIONS,
+                                       cached_content=cache_name, operation='chat')
+        usage = result['usage']
+        turn_usage = {
+            'request_bytes': result['request_bytes'],
+            'prompt_tokens': usage.get('promptTokenCount', 0),
+            'cached_tokens': usage.get('cachedContentTokenCount', 0),
+            'output_tokens': usage.get('candidatesTokenCount', 0),
+            'context_cached': cache_name is not None
+        }
+        turn = [{"role": "user", "text": message}, {"role": "model", "text": result['text']}]
+        session = self.record_turn(session, video_id, turn, turn_usage)
+        turn_usage['history_tokens'] = self.history_tokens(session)
+
+        return {"session_id": session['id'], "message": result['text'], "usage": turn_usage}
+
+    def delete_video(self, video_id):
+        cache = self.store.delete_video(video_id)
+        if cache and cache['name']:
+            self.chatbot.delete_cache(cache['name'])
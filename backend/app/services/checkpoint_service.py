@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from services.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'checkpoints.json'
+
+
+class CheckpointManager:
+    """Per-video manifest of completed pipeline stages and job state."""
+
+    def __init__(self, video_dir):
+        self.video_dir = video_dir
+        self.manifest_path = os.path.join(video_dir, MANIFEST_NAME)
+        self.manifest = self.load()
+
+    def load(self):
+        """Load manifest from disk, starting fresh if missing or corrupt."""
+        try:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                manifest.setdefault('job', {})
+                manifest.setdefault('stages', {})
+                return manifest
+        except Exception as e:
+            logger.error(f"Error reading checkpoint manifest {self.manifest_path}: {str(e)}")
+        return {'job': {}, 'stages': {}}
+
+    def save(self):
+        """Atomically write manifest to disk."""
+        os.makedirs(self.video_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def job(self):
+        return self.manifest['job']
+
+    def update_job(self, **fields):
+        """Update job-level fields (url, video_id, status, metadata...)."""
+        self.manifest['job'].update(fields)
+        self.manifest['job']['updated_at'] = time.time()
+        self.save()
+
+    @staticmethod
+    def compute_hash(*parts):
+        """Stable hash of JSON-serializable stage inputs."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def fingerprint_file(path):
+        """Cheap file identity based on path, size and modification time."""
+        try:
+            stat = os.stat(path)
+            return f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        except OSError:
+            return None
+
+    @staticmethod
+    def hash_file(path, chunk_size=1024 * 1024):
+        """Content hash of a stage input file, so regenerated identical files stay valid."""
+        try:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    digest.update(chunk)
+            return digest.hexdigest()
+        except OSError:
+            return None
+
+    def get_stage(self, name, input_hash):
+        """Return stage outputs if the checkpoint matches the inputs and its files still exist."""
+        stage = self.manifest['stages'].get(name)
+        if not stage or stage.get('input_hash') != input_hash:
+            CACHE_REQUESTS.inc(cache=f'checkpoint_{name}', result='miss')
+            return None
+
+        for path, fingerprint in stage.get('files', {}).items():
+            if self.fingerprint_file(path) != fingerprint:
+                logger.info(f"Checkpoint '{name}' invalidated: {path} changed or missing")
+                CACHE_REQUESTS.inc(cache=f'checkpoint_{name}', result='miss')
+                return None
+
+        CACHE_REQUESTS.inc(cache=f'checkpoint_{name}', result='hit')
+        logger.info(f"Reusing checkpoint for stage '{name}'")
+        return stage.get('outputs')
+
+    def record_stage(self, name, input_hash, outputs, files=None):
+        """Record a completed stage with its input hash and produced files."""
+        self.manifest['stages'][name] = {
+            'input_hash': input_hash,
+            'outputs': outputs,
+            'files': {path: self.fingerprint_file(path) for path in (files or [])},
+            'completed_at': time.time()
+        }
+        self.save()
+
+
+def load_job_manifests(base_dir):
+    """Load job state from every video folder under base_dir."""
+    jobs = []
+    if not os.path.isdir(base_dir):
+        return jobs
+
+    for folder_name in os.listdir(base_dir):
+        video_dir = os.path.join(base_dir, folder_name)
+        if not os.path.exists(os.path.join(video_dir, MANIFEST_NAME)):
+            continue
+        job = CheckpointManager(video_dir).job
+        if job.get('video_id') and job.get('url'):
+            jobs.append(dict(job, video_folder=video_dir))
+    return jobs
@@ -0,0 +1,175 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from services.metrics import FRAME_STORE_BYTES, FRAME_SAVE_SECONDS
+from services.profiler import PIPELINE_THREAD_PREFIX
+
+logger = logging.getLogger(__name__)
+
+FRAMES_DIR = 'frames'
+THUMBNAILS_DIR = 'thumbnails'
+# File extension and cv2.imencode parameters per format, given a quality
+ENCODINGS = {
+    'webp': ('.webp', lambda quality: [cv2.IMWRITE_WEBP_QUALITY, quality]),
+    'jpg': ('.jpg', lambda quality: [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1,
+                                     cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420]),
+}
+
+
+def frame_digest(frame):
+    """128-bit BLAKE2b digest of a frame's shape and pixels, as hex.
+
+    Files are shared by every frame with the same name, so the name must be
+    exact: a perceptual hash gives slides that differ only in a digit (a page
+    number, a changed figure) the same file. Near-duplicates are filtered
+    earlier, by the 8x8 pHash in VideoService. Hashing a 1080p frame takes
+    ~15ms, little next to the OCR run on it.
+    """
+    frame = np.ascontiguousarray(frame)
+    digest = hashlib.blake2b(repr(frame.shape).encode(), digest_size=16)
+    digest.update(frame.data)
+    return digest.hexdigest()
+
+
+class FrameStore:
+    """Writes one video's keyframes and thumbnails in the background.
+
+    put() names a frame by a digest of its pixels and returns its record at
+    once; encoding and writing happen on the store's threads, so OCR can run
+    on the in-memory frames meanwhile. Full frames default to tuned JPEG,
+    which is half the size of cv2's default and cheap to encode (WebP halves
+    it again for ~25x the CPU); thumbnails are small, so they use WebP. A frame whose file already exists
+    (an identical repeated frame, or a reprocessed video) is not written again. close()
+    waits for the writes, writes the optional sprite sheet of all thumbnails,
+    removes files no longer referenced and returns what was written.
+    """
+
+    def __init__(self, video_dir, format='jpg', quality=85, thumbnail_format='webp', thumbnail_width=320,
+                 thumbnail_quality=70, sprite=False, sprite_columns=5, workers=2):
+        for name in (format, thumbnail_format):
+            if name not in ENCODINGS:
+                raise ValueError(f"Unsupported frame format: {name}")
+        self.format = format
+        self.thumbnail_format = thumbnail_format
+        self.quality = quality
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_quality = thumbnail_quality
+        self.sprite = sprite
+        self.sprite_columns = sprite_columns
+        self.frames_dir = os.path.join(video_dir, FRAMES_DIR)
+        self.thumbnails_dir = os.path.join(video_dir, THUMBNAILS_DIR)
+        self.sprite_path = os.path.join(self.thumbnails_dir, f"sprite{ENCODINGS[thumbnail_format][0]}")
+        os.makedirs(self.frames_dir, exist_ok=True)
+        os.makedirs(self.thumbnails_dir, exist_ok=True)
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{PIPELINE_THREAD_PREFIX}frames")
+        self.futures = {}
+        self.records = []
+        self.cell = None
+        self.started = None
+        self.last_write = None
+        self.lock = threading.Lock()
+        self.stats = {'frames': 0, 'files_written': 0, 'bytes_written': 0,
+                      'bytes': {'frame': 0, 'thumbnail': 0, 'sprite': 0}}
+
+    def put(self, frame, timestamp):
+        """Queue one frame for writing and return its record."""
+        self.started = self.started or time.perf_counter()
+        digest = frame_digest(frame)
+        height, width = frame.shape[:2]
+        size = (self.thumbnail_width, max(1, round(height * self.thumbnail_width / width)))
+        record = {
+            'path': os.path.join(self.frames_dir, digest + ENCODINGS[self.format][0]),
+            'thumbnail': os.path.join(self.thumbnails_dir, digest + ENCODINGS[self.thumbnail_format][0]),
+            'hash': digest,
+            'timestamp': timestamp
+        }
+        if self.sprite:
+            # Every cell has the first thumbnail's size; keyframes of one video share a resolution
+            self.cell = self.cell or size
+            row, column = divmod(len(self.records), self.sprite_columns)
+            record['sprite'] = [column * self.cell[0], row * self.cell[1], self.cell[0], self.cell[1]]
+        self.records.append(record)
+        self.stats['frames'] += 1
+        if digest not in self.futures:
+            self.futures[digest] = self.executor.submit(self.write_frame, frame, record, size)
+        return record
+
+    def write_image(self, path, image, format, quality, kind):
+        """Encode and atomically write one image unless the file already exists."""
+        if kind != 'sprite' and os.path.exists(path):
+            return
+        extension, params = ENCODINGS[format]
+        ok, buffer = cv2.imencode(extension, image, params(quality))
+        if not ok:
+            raise RuntimeError(f"Could not encode {path} as {format}")
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(buffer.tobytes())
+        os.replace(temp_path, path)
+        FRAME_STORE_BYTES.inc(len(buffer), kind=kind)
+        with self.lock:
+            if kind != 'sprite':
+                self.last_write = time.perf_counter()
+            self.stats['files_written'] += 1
+            self.stats['bytes_written'] += len(buffer)
+            self.stats['bytes'][kind] += len(buffer)
+
+    def write_frame(self, frame, record, size):
+        thumbnail = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        self.write_image(record['path'], frame, self.format, self.quality, 'frame')
+        self.write_image(record['thumbnail'], thumbnail, self.thumbnail_format, self.thumbnail_quality, 'thumbnail')
+        return thumbnail
+
+    def write_sprite(self, thumbnails):
+        rows = -(-len(self.records) // self.sprite_columns)
+        columns = min(len(self.records), self.sprite_columns)
+        sheet = np.zeros((rows * self.cell[1], columns * self.cell[0], 3), dtype=np.uint8)
+        for record in self.records:
+            x, y, width, height = record['sprite']
+            sheet[y:y + height, x:x + width] = cv2.resize(thumbnails[record['hash']], (width, height))
+        self.write_image(self.sprite_path, sheet, self.thumbnail_format, self.thumbnail_quality, 'sprite')
+
+    def prune(self):
+        """Delete frames and thumbnails this video no longer references (earlier runs, old frame_N.jpg files)."""
+        keep = {path for record in self.records for path in (record['path'], record['thumbnail'])}
+        if self.sprite and self.records:
+            keep.add(self.sprite_path)
+        for directory in (self.frames_dir, self.thumbnails_dir):
+            for entry in os.scandir(directory):
+                if entry.is_file() and entry.path not in keep:
+                    os.remove(entry.path)
+
+    def files(self):
+        """Paths of everything the records point at, for checkpoint fingerprints."""
+        paths = [path for record in self.records for path in (record['path'], record['thumbnail'])]
+        return list(dict.fromkeys(paths + ([self.sprite_path] if self.sprite and self.records else [])))
+
+    def close(self):
+        """Wait for pending writes and return the storage stats for this video."""
+        waited = time.perf_counter()
+        try:
+            thumbnails = {digest: future.result() for digest, future in self.futures.items()}
+        finally:
+            self.executor.shutdown()
+        if self.sprite and self.records:
+            self.write_sprite(thumbnails)
+        self.prune()
+        finished = time.perf_counter()
+
+        # save_seconds runs from the first put() to the last frame on disk, not to close();
+        # the sprite sheet can only be written in close(), so it counts as blocked time
+        stats = dict(self.stats, format=self.format, unique_frames=len(self.futures),
+                     blocked_seconds=finished - waited,
+                     save_seconds=(self.last_write or waited) - self.started if self.started else 0.0)
+        FRAME_SAVE_SECONDS.observe(stats['save_seconds'], phase='total')
+        FRAME_SAVE_SECONDS.observe(stats['blocked_seconds'], phase='blocked')
+        logger.info(f"Stored {stats['frames']} frames ({stats['unique_frames']} unique): "
+                    f"{stats['bytes_written']} bytes in {stats['files_written']} files, "
+                    f"{stats['save_seconds']:.2f}s total, {stats['blocked_seconds']:.2f}s blocking")
+        return stats
@@ -1,11 +1,35 @@
 import requests
 import json
 import os
+import logging
+from services.metrics import UPSTREAM_SECONDS, UPSTREAM_ERRORS, UPSTREAM_REQUEST_BYTES, UPSTREAM_TOKENS
+from services.upstream import (INTERACTIVE, UpstreamError, UpstreamUnavailableError, error_from_status,
+                               get_upstream_scheduler)
+
+logger = logging.getLogger(__name__)
+
+def retry_delay(response) -> float:
+    """Seconds to wait from a 429's Retry-After header or google.rpc.RetryInfo detail."""
+    if response.headers.get('Retry-After'):
+        try:
+            return float(response.headers['Retry-After'])
+        except ValueError:
+            pass
+    try:
+        for detail in response.json().get('error', {}).get('details', []):
+            if str(detail.get('retryDelay', '')).endswith('s'):
+                return float(detail['retryDelay'][:-1])
+    except ValueError:
+        pass
+    return None
 
 class GeminiChatbot:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, model: str = "gemini-2.0-flash", scheduler=None):
         self.api_key = api_key
-        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+        self.model = model
+        self.scheduler = scheduler
+        self.api_base = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+        self.api_url = f"{self.api_base}/v1beta/models/{model}:generateContent?key={api_key}"
         self.transcript_content = None
 
     def read_transcript(self, file_path: str) -> bool:
@@ -18,10 +42,77 @@ class GeminiChatbot:
             print(f"Error reading transcript file: {str(e)}")
             return False
 
-    def send_message(self, query: str) -> str:
-        """Send message to Gemini API with transcript context."""
+    def post(self, url: str, data: dict, operation: str, lane: str = INTERACTIVE) -> dict:
+        """POST a JSON body to Gemini within the shared quota, recording latency, bytes sent and token usage."""
+        body = json.dumps(data).encode('utf-8')
+
+        def send():
+            UPSTREAM_REQUEST_BYTES.inc(len(body), provider='gemini', operation=operation)
+            try:
+                with UPSTREAM_SECONDS.time(provider='gemini', operation=operation):
+                    response = requests.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=120)
+            except requests.RequestException as e:
+                UPSTREAM_ERRORS.inc(provider='gemini', operation=operation)
+                raise UpstreamUnavailableError('gemini', str(e))
+            if response.status_code != 200:
+                UPSTREAM_ERRORS.inc(provider='gemini', operation=operation)
+                raise error_from_status('gemini', response.status_code,
+                                        f"API returned status code {response.status_code}: {response.text[:200]}",
+                                        retry_delay(response) if response.status_code == 429 else None)
+            return response.json()
+
+        # Charge the estimated prompt up front and settle with the reported usage
+        scheduler = self.scheduler or get_upstream_scheduler()
+        result = scheduler.call('gemini', self.model, send, cost={'tokens': len(body) // 4}, lane=lane,
+                                actual_cost=lambda r: {'tokens': (r.get('usageMetadata') or {}).get('totalTokenCount')})
+        usage = result.get('usageMetadata') or {}
+        for kind, field in (('prompt', 'promptTokenCount'), ('cached', 'cachedContentTokenCount'),
+                            ('output', 'candidatesTokenCount')):
+            if usage.get(field):
+                UPSTREAM_TOKENS.inc(usage[field], provider='gemini', operation=operation, kind=kind)
+        result['requestBytes'] = len(body)
+        return result
+
+    def generate(self, contents: list, system_instruction: str = None, cached_content: str = None,
+                 operation: str = 'generate', lane: str = INTERACTIVE) -> dict:
+        """Run generateContent on role/text turns; returns text, usageMetadata and requestBytes."""
+        data = {"contents": [{"role": turn["role"], "parts": [{"text": turn["text"]}]} for turn in contents]}
+        # A request that uses cachedContent must not set its own system instruction
+        if cached_content:
+            data["cachedContent"] = cached_content
+        elif system_instruction:
+            data["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+
+        result = self.post(self.api_url, data, operation, lane)
+        if not result.get('candidates') or 'content' not in result['candidates'][0]:
+            # No candidates usually means the prompt or answer was blocked
+            raise UpstreamError('gemini', f"Unexpected response format from API: {json.dumps(result)[:200]}")
+        return {
+            "text": result['candidates'][0]['content']['parts'][0]['text'],
+            "usage": result.get('usageMetadata') or {},
+            "request_bytes": result['requestBytes']
+        }
+
+    def create_cache(self, contents: list, system_instruction: str, ttl_seconds: int) -> str:
+        """Store a prompt prefix with the context caching API and return its name (cachedContents/...)."""
+        data = {
+            "model": f"models/{self.model}",
+            "contents": [{"role": turn["role"], "parts": [{"text": turn["text"]}]} for turn in contents],
+            "systemInstruction": {"parts": [{"text": system_instruction}]},
+            "ttl": f"{int(ttl_seconds)}s"
+        }
+        result = self.post(f"{self.api_base}/v1beta/cachedContents?key={self.api_key}", data, 'cache')
+        return result['name']
+
+    def delete_cache(self, name: str) -> None:
         try:
-            prompt = f"""Based on this video transcript:
+            requests.delete(f"{self.api_base}/v1beta/{name}?key={self.api_key}", timeout=10)
+        except Exception as e:
+            logger.warning(f"Error deleting cached content {name}: {str(e)}")
+
+    def send_message(self, query: str, lane: str = INTERACTIVE) -> str:
+        """Send message to Gemini API with transcript context; raises UpstreamError on failure."""
+        prompt = f"""Based on this video transcript:
 
 {self.transcript_content}
 
@@ -29,28 +120,4 @@ Question: {query}
 
 Please provide a detailed answer based only on the information in the transcript."""
 
-            data = {
-                "contents": [{
-                    "parts": [{
-                        "text": prompt
-                    }]
-                }]
-            }
-
-            headers = {
-                "Content-Type": "application/json"
-            }
-
-            response = requests.post(self.api_url, json=data, headers=headers)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result:
-                    return result['candidates'][0]['content']['parts'][0]['text']
-                else:
-                    return "Error: Unexpected response format from API"
-            else:
-                return f"Error: API returned status code {response.status_code}"
-
-        except Exception as e:
-            return f"Error sending message: {str(e)}"
\ No newline at end of file
+        return self.generate([{"role": "user", "text": prompt}], lane=lane)["text"]
@@ -0,0 +1,667 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# queued -> leased -> completed | failed (after max_attempts); expired leases go back to queued
+ACTIVE_STATUSES = ('queued', 'leased')
+JOB_FIELDS = ('id', 'url', 'status', 'priority', 'attempts', 'max_attempts', 'lease_owner',
+              'lease_expires_at', 'available_at', 'video_folder', 'metadata', 'payload', 'error',
+              'tenant', 'batch_id', 'created_at', 'updated_at')
+JSON_FIELDS = ('metadata', 'payload')
+
+# Single-video requests outrank backfills; within a priority, tenants take turns
+PRIORITY_INTERACTIVE = 100
+PRIORITY_BATCH = 0
+DEFAULT_TENANT = 'default'
+# URLs that select the Redis-backed stores
+REDIS_URL_SCHEMES = ('redis://', 'rediss://', 'unix://')
+
+
+class JobCancelled(Exception):
+    """A leased job was stopped before finishing, e.g. because its worker lost the lease."""
+
+
+class JobQueue:
+    """Broker interface between the API and pipeline workers.
+
+    Jobs are keyed by video ID, so enqueueing a video that is already queued
+    or running returns the existing job. Delivery is at-least-once: a worker
+    holds a lease that it extends with heartbeats, and a job whose lease
+    expires is handed to another worker. Pipeline stages are checkpointed,
+    so a redelivered job resumes instead of starting over.
+
+    Leases go to the highest priority first; among equal priorities the
+    tenant that was served least recently wins, then the oldest job.
+    """
+
+    retry_backoff = 30
+
+    def enqueue(self, video_id, url, priority=0, payload=None, max_attempts=3,
+                tenant=DEFAULT_TENANT, batch_id=None):
+        raise NotImplementedError
+
+    def lease(self, worker_id, lease_seconds):
+        """Claim the next runnable job, or return None."""
+        raise NotImplementedError
+
+    def heartbeat(self, video_id, worker_id, lease_seconds):
+        """Extend a lease; returns False if the worker no longer owns the job."""
+        raise NotImplementedError
+
+    def complete(self, video_id, worker_id, video_folder=None, metadata=None):
+        raise NotImplementedError
+
+    def fail(self, video_id, worker_id, error):
+        """Requeue with backoff, or mark failed once attempts are exhausted."""
+        raise NotImplementedError
+
+    def defer(self, video_id, worker_id, delay, error=None):
+        """Requeue after delay seconds without using up an attempt (e.g. upstream quota exhausted)."""
+        raise NotImplementedError
+
+    def get(self, video_id):
+        raise NotImplementedError
+
+    def get_many(self, video_ids):
+        """Jobs by video ID; unknown IDs are left out."""
+        raise NotImplementedError
+
+    def list_jobs(self):
+        raise NotImplementedError
+
+    def update(self, video_id, **fields):
+        """Update stored fields such as video_folder or metadata."""
+        raise NotImplementedError
+
+    def delete(self, video_id):
+        raise NotImplementedError
+
+    def depth(self):
+        """Number of jobs by status."""
+        raise NotImplementedError
+
+    def create_batch(self, batch_id, tenant, video_ids, source=None):
+        raise NotImplementedError
+
+    def get_batch(self, batch_id):
+        raise NotImplementedError
+
+    def batch_progress(self, batch_id):
+        """Aggregate status of every video in a batch, or None if the batch is unknown."""
+        batch = self.get_batch(batch_id)
+        if batch is None:
+            return None
+        jobs = self.get_many(batch['video_ids'])
+        counts = {'queued': 0, 'leased': 0, 'completed': 0, 'failed': 0}
+        for job in jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        total = len(batch['video_ids'])
+        finished = counts['completed'] + counts['failed']
+        return {
+            **batch,
+            'total': total,
+            'counts': counts,
+            'missing': total - len(jobs),
+            'progress': finished / total if total else 1.0,
+            'done': finished + (total - len(jobs)) == total,
+            'errors': {video_id: job['error'] for video_id, job in jobs.items() if job['status'] == 'failed'}
+        }
+
+    def backoff_delay(self, attempts):
+        return self.retry_backoff * (2 ** max(0, attempts - 1))
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in a SQLite file, shareable by processes on one host or a shared volume."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.local = threading.local()
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    available_at REAL NOT NULL,
+                    video_folder TEXT,
+                    metadata TEXT,
+                    payload TEXT,
+                    error TEXT,
+                    tenant TEXT NOT NULL DEFAULT 'default',
+                    batch_id TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            # Queues created before tenants and batches existed
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'tenant' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+            if 'batch_id' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, priority, created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS tenants (tenant TEXT PRIMARY KEY, last_leased_at REAL NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    id TEXT PRIMARY KEY,
+                    tenant TEXT NOT NULL,
+                    source TEXT,
+                    video_ids TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+
+    @property
+    def conn(self):
+        # One connection per thread; WAL lets readers proceed while a worker writes
+        if not hasattr(self.local, 'conn'):
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return self.local.conn
+
+    def transaction(self):
+        return SQLiteTransaction(self.conn)
+
+    def to_job(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job.get(field) else None
+        return job
+
+    def enqueue(self, video_id, url, priority=0, payload=None, max_attempts=3,
+                tenant=DEFAULT_TENANT, batch_id=None):
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (video_id,)).fetchone()
+            if row and row['status'] in ACTIVE_STATUSES:
+                if priority > row['priority']:
+                    conn.execute("UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?",
+                                 (priority, now, video_id))
+                return self.to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (video_id,)).fetchone())
+
+            conn.execute("""
+                INSERT INTO jobs (id, url, status, priority, attempts, max_attempts, available_at,
+                                  video_folder, metadata, payload, tenant, batch_id, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    url = excluded.url, status = 'queued', priority = excluded.priority, attempts = 0,
+                    max_attempts = excluded.max_attempts, lease_owner = NULL, lease_expires_at = NULL,
+                    available_at = excluded.available_at, payload = excluded.payload, error = NULL,
+                    tenant = excluded.tenant, batch_id = excluded.batch_id, updated_at = excluded.updated_at""",
+                (video_id, url, priority, max_attempts, now, None, None, json.dumps(payload or {}),
+                 tenant, batch_id, now, now))
+            return self.to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (video_id,)).fetchone())
+
+    def lease(self, worker_id, lease_seconds):
+        now = time.time()
+        with self.transaction() as conn:
+            # A job whose worker keeps dying (e.g. OOM) must not be redelivered forever
+            conn.execute("""
+                UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL,
+                    error = 'Lease expired on final attempt', updated_at = ?
+                WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= max_attempts""", (now, now))
+            row = conn.execute("""
+                SELECT jobs.* FROM jobs LEFT JOIN tenants ON tenants.tenant = jobs.tenant
+                WHERE (status = 'queued' AND available_at <= ?) OR (status = 'leased' AND lease_expires_at < ?)
+                ORDER BY priority DESC, COALESCE(tenants.last_leased_at, 0), created_at
+                LIMIT 1""", (now, now)).fetchone()
+            if row is None:
+                return None
+            if row['status'] == 'leased':
+                logger.warning(f"Lease on job {row['id']} held by {row['lease_owner']} expired, redelivering")
+            conn.execute("""
+                UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE id = ?""", (worker_id, now + lease_seconds, now, row['id']))
+            conn.execute("""
+                INSERT INTO tenants (tenant, last_leased_at) VALUES (?, ?)
+                ON CONFLICT(tenant) DO UPDATE SET last_leased_at = excluded.last_leased_at""",
+                (row['tenant'], now))
+            return self.to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+
+    def heartbeat(self, video_id, worker_id, lease_seconds):
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+                (now + lease_seconds, now, video_id, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, video_id, worker_id, video_folder=None, metadata=None):
+        with self.transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = 'completed', lease_owner = NULL, lease_expires_at = NULL,
+                    video_folder = COALESCE(?, video_folder), metadata = COALESCE(?, metadata),
+                    error = NULL, updated_at = ?
+                WHERE id = ? AND lease_owner = ?""",
+                (video_folder, json.dumps(metadata) if metadata else None, time.time(), video_id, worker_id))
+            if cursor.rowcount == 0:
+                logger.warning(f"Worker {worker_id} completed job {video_id} it no longer owns")
+            return cursor.rowcount == 1
+
+    def fail(self, video_id, worker_id, error):
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ? AND lease_owner = ?",
+                               (video_id, worker_id)).fetchone()
+            if row is None:
+                logger.warning(f"Worker {worker_id} failed job {video_id} it no longer owns")
+                return False
+            if row['attempts'] < row['max_attempts']:
+                status, available_at = 'queued', now + self.backoff_delay(row['attempts'])
+            else:
+                status, available_at = 'failed', row['available_at']
+            conn.execute("""
+                UPDATE jobs SET status = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    error = ?, updated_at = ?
+                WHERE id = ?""", (status, available_at, str(error), now, video_id))
+            return True
+
+    def defer(self, video_id, worker_id, delay, error=None):
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = 'queued', available_at = ?, attempts = MAX(attempts - 1, 0),
+                    lease_owner = NULL, lease_expires_at = NULL, error = ?, updated_at = ?
+                WHERE id = ? AND lease_owner = ?""",
+                (now + (delay if delay is not None else self.retry_backoff), error, now, video_id, worker_id))
+            if cursor.rowcount == 0:
+                logger.warning(f"Worker {worker_id} deferred job {video_id} it no longer owns")
+            return cursor.rowcount == 1
+
+    def get(self, video_id):
+        return self.to_job(self.conn.execute("SELECT * FROM jobs WHERE id = ?", (video_id,)).fetchone())
+
+    def get_many(self, video_ids):
+        jobs = {}
+        video_ids = list(video_ids)
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(video_ids), 500):
+            chunk = video_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in self.conn.execute(f"SELECT * FROM jobs WHERE id IN ({placeholders})", chunk):
+                jobs[row['id']] = self.to_job(row)
+        return jobs
+
+    def list_jobs(self):
+        return [self.to_job(row) for row in self.conn.execute("SELECT * FROM jobs ORDER BY created_at")]
+
+    def update(self, video_id, **fields):
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        values = [json.dumps(v) if k in JSON_FIELDS and v is not None else v for k, v in fields.items()]
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        with self.transaction() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                         values + [time.time(), video_id])
+
+    def delete(self, video_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (video_id,))
+
+    def depth(self):
+        rows = self.conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status")
+        return {row['status']: row['count'] for row in rows}
+
+    def create_batch(self, batch_id, tenant, video_ids, source=None):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO batches (id, tenant, source, video_ids, created_at) VALUES (?, ?, ?, ?, ?)",
+                         (batch_id, tenant, source, json.dumps(list(video_ids)), time.time()))
+
+    def get_batch(self, batch_id):
+        row = self.conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), 'video_ids': json.loads(row['video_ids'])}
+
+
+class SQLiteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent leases never claim the same job."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# Requeue expired leases, move jobs whose retry delay has passed from KEYS[5]
+# (scored by available_at) into their tenant's queue, then lease the best
+# runnable job atomically. Each tenant has its own queue of runnable jobs scored
+# -priority * 1e10 + created_at (higher priority first, then FIFO), so its head
+# is its next job however many jobs are waiting out a backoff. KEYS[1] scores
+# tenants by when they were last served, so at equal priority the tenant that
+# waited longest goes next.
+REDIS_LEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local due = redis.call('ZRANGEBYSCORE', KEYS[5], '-inf', now)
+for _, id in ipairs(due) do
+    redis.call('ZREM', KEYS[5], id)
+    local job_key = KEYS[3] .. id
+    if redis.call('HGET', job_key, 'status') == 'queued' then
+        local tenant = redis.call('HGET', job_key, 'tenant')
+        if not tenant or tenant == '' then tenant = 'default' end
+        redis.call('ZADD', KEYS[4] .. tenant, tonumber(redis.call('HGET', job_key, 'score')), id)
+        redis.call('ZADD', KEYS[1], 'NX', 0, tenant)
+    end
+end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    local job_key = KEYS[3] .. id
+    if tonumber(redis.call('HGET', job_key, 'attempts')) >= tonumber(redis.call('HGET', job_key, 'max_attempts')) then
+        redis.call('HSET', job_key, 'status', 'failed', 'lease_owner', '', 'lease_expires_at', '',
+                   'error', 'Lease expired on final attempt', 'updated_at', now)
+    else
+        local tenant = redis.call('HGET', job_key, 'tenant')
+        if not tenant or tenant == '' then tenant = 'default' end
+        redis.call('HSET', job_key, 'status', 'queued', 'lease_owner', '', 'lease_expires_at', '')
+        redis.call('ZADD', KEYS[4] .. tenant, tonumber(redis.call('HGET', job_key, 'score')), id)
+        redis.call('ZADD', KEYS[1], 'NX', 0, tenant)
+    end
+end
+local best, best_tenant, best_priority, best_served, best_score
+local tenants = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+for i = 1, #tenants, 2 do
+    local tenant, served = tenants[i], tonumber(tenants[i + 1])
+    while true do
+        local head = redis.call('ZRANGE', KEYS[4] .. tenant, 0, 0, 'WITHSCORES')
+        if #head == 0 then
+            break
+        end
+        local id, score = head[1], tonumber(head[2])
+        local job_key = KEYS[3] .. id
+        local available_at = tonumber(redis.call('HGET', job_key, 'available_at'))
+        if available_at <= now then
+            local priority = tonumber(redis.call('HGET', job_key, 'priority'))
+            if not best or priority > best_priority
+                    or (priority == best_priority and (served < best_served
+                        or (served == best_served and score < best_score))) then
+                best, best_tenant, best_priority, best_served, best_score = id, tenant, priority, served, score
+            end
+            break
+        end
+        -- Not due yet (queued before delayed jobs had their own set); park it until it is
+        redis.call('ZREM', KEYS[4] .. tenant, id)
+        redis.call('ZADD', KEYS[5], available_at, id)
+    end
+end
+if not best then
+    return false
+end
+local job_key = KEYS[3] .. best
+redis.call('ZREM', KEYS[4] .. best_tenant, best)
+redis.call('ZADD', KEYS[1], now, best_tenant)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), best)
+redis.call('HSET', job_key, 'status', 'leased', 'lease_owner', ARGV[2],
+           'lease_expires_at', now + tonumber(ARGV[3]), 'updated_at', now)
+redis.call('HINCRBY', job_key, 'attempts', 1)
+return best
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """Job queue on Redis (or any Redis-protocol server) for multi-node deployments."""
+
+    def __init__(self, url, prefix='vidiwise'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RedisJobQueue requires the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.queue_prefix = f"{prefix}:queue:"
+        self.tenants_key = f"{prefix}:tenants"
+        self.leases_key = f"{prefix}:leases"
+        self.delayed_key = f"{prefix}:delayed"
+        self.job_prefix = f"{prefix}:job:"
+        self.jobs_key = f"{prefix}:jobs"
+        self.batch_prefix = f"{prefix}:batch:"
+        self.lease_script = self.client.register_script(REDIS_LEASE_SCRIPT)
+
+    def job_key(self, video_id):
+        return f"{self.job_prefix}{video_id}"
+
+    def queue_key(self, tenant):
+        return f"{self.queue_prefix}{tenant or DEFAULT_TENANT}"
+
+    def push(self, pipe, video_id, tenant, score, available_at=None):
+        """Queue a job, or hold it in the delayed set until available_at when that is still ahead."""
+        if available_at and available_at > time.time():
+            pipe.zrem(self.queue_key(tenant), video_id)
+            pipe.zadd(self.delayed_key, {video_id: available_at})
+            return
+        pipe.zrem(self.delayed_key, video_id)
+        pipe.zadd(self.queue_key(tenant), {video_id: score})
+        pipe.zadd(self.tenants_key, {tenant or DEFAULT_TENANT: 0}, nx=True)
+
+    def to_job(self, data):
+        if not data:
+            return None
+        job = {field: data.get(field) or None for field in JOB_FIELDS}
+        for field in ('priority', 'attempts', 'max_attempts'):
+            job[field] = int(job[field] or 0)
+        for field in ('lease_expires_at', 'available_at', 'created_at', 'updated_at'):
+            job[field] = float(job[field]) if job[field] else None
+        for field in JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job[field] else None
+        job['tenant'] = job['tenant'] or DEFAULT_TENANT
+        return job
+
+    def encode(self, fields):
+        encoded = {}
+        for key, value in fields.items():
+            if key in JSON_FIELDS:
+                value = json.dumps(value) if value is not None else ''
+            encoded[key] = '' if value is None else value
+        return encoded
+
+    def watch_job(self, video_id, apply):
+        """Run apply(pipe, job) in an optimistic WATCH/MULTI transaction on one job."""
+        import redis
+        key = self.job_key(video_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    job = self.to_job(pipe.hgetall(key))
+                    pipe.multi()
+                    result = apply(pipe, job)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+    def enqueue(self, video_id, url, priority=0, payload=None, max_attempts=3,
+                tenant=DEFAULT_TENANT, batch_id=None):
+        def apply(pipe, job):
+            now = time.time()
+            if job and job['status'] in ACTIVE_STATUSES:
+                if priority > job['priority']:
+                    score = -priority * 1e10 + job['created_at']
+                    pipe.hset(self.job_key(video_id), mapping={'priority': priority, 'score': score})
+                    if job['status'] == 'queued':
+                        self.push(pipe, video_id, job['tenant'], score, job['available_at'])
+                return
+            created_at = job['created_at'] if job else now
+            score = -priority * 1e10 + created_at
+            pipe.hset(self.job_key(video_id), mapping=self.encode({
+                'id': video_id, 'url': url, 'status': 'queued', 'priority': priority, 'score': score,
+                'attempts': 0, 'max_attempts': max_attempts, 'lease_owner': None, 'lease_expires_at': None,
+                'available_at': now, 'payload': payload or {}, 'error': None,
+                'tenant': tenant, 'batch_id': batch_id, 'created_at': created_at, 'updated_at': now
+            }))
+            if job and job['tenant'] != tenant:
+                pipe.zrem(self.queue_key(job['tenant']), video_id)
+            self.push(pipe, video_id, tenant, score)
+            pipe.sadd(self.jobs_key, video_id)
+
+        self.watch_job(video_id, apply)
+        return self.get(video_id)
+
+    def lease(self, worker_id, lease_seconds):
+        video_id = self.lease_script(keys=[self.tenants_key, self.leases_key, self.job_prefix, self.queue_prefix,
+                                           self.delayed_key],
+                                     args=[time.time(), worker_id, lease_seconds])
+        return self.get(video_id) if video_id else None
+
+    def heartbeat(self, video_id, worker_id, lease_seconds):
+        def apply(pipe, job):
+            if not job or job['status'] != 'leased' or job['lease_owner'] != worker_id:
+                return False
+            expires = time.time() + lease_seconds
+            pipe.hset(self.job_key(video_id), mapping={'lease_expires_at': expires, 'updated_at': time.time()})
+            pipe.zadd(self.leases_key, {video_id: expires})
+            return True
+        return self.watch_job(video_id, apply)
+
+    def complete(self, video_id, worker_id, video_folder=None, metadata=None):
+        def apply(pipe, job):
+            if not job or job['lease_owner'] != worker_id:
+                logger.warning(f"Worker {worker_id} completed job {video_id} it no longer owns")
+                return False
+            fields = {'status': 'completed', 'lease_owner': None, 'lease_expires_at': None,
+                      'error': None, 'updated_at': time.time()}
+            if video_folder:
+                fields['video_folder'] = video_folder
+            if metadata:
+                fields['metadata'] = metadata
+            pipe.hset(self.job_key(video_id), mapping=self.encode(fields))
+            pipe.zrem(self.leases_key, video_id)
+            return True
+        return self.watch_job(video_id, apply)
+
+    def fail(self, video_id, worker_id, error):
+        def apply(pipe, job):
+            if not job or job['lease_owner'] != worker_id:
+                logger.warning(f"Worker {worker_id} failed job {video_id} it no longer owns")
+                return False
+            now = time.time()
+            fields = {'lease_owner': None, 'lease_expires_at': None, 'error': str(error), 'updated_at': now}
+            if job['attempts'] < job['max_attempts']:
+                fields.update(status='queued', available_at=now + self.backoff_delay(job['attempts']))
+                self.push(pipe, video_id, job['tenant'], -job['priority'] * 1e10 + job['created_at'],
+                          fields['available_at'])
+            else:
+                fields['status'] = 'failed'
+            pipe.hset(self.job_key(video_id), mapping=self.encode(fields))
+            pipe.zrem(self.leases_key, video_id)
+            return True
+        return self.watch_job(video_id, apply)
+
+    def defer(self, video_id, worker_id, delay, error=None):
+        def apply(pipe, job):
+            if not job or job['lease_owner'] != worker_id:
+                logger.warning(f"Worker {worker_id} deferred job {video_id} it no longer owns")
+                return False
+            now = time.time()
+            available_at = now + (delay if delay is not None else self.retry_backoff)
+            pipe.hset(self.job_key(video_id), mapping=self.encode({
+                'status': 'queued', 'available_at': available_at,
+                'attempts': max(job['attempts'] - 1, 0), 'lease_owner': None, 'lease_expires_at': None,
+                'error': error, 'updated_at': now}))
+            self.push(pipe, video_id, job['tenant'], -job['priority'] * 1e10 + job['created_at'], available_at)
+            pipe.zrem(self.leases_key, video_id)
+            return True
+        return self.watch_job(video_id, apply)
+
+    def get(self, video_id):
+        return self.to_job(self.client.hgetall(self.job_key(video_id)))
+
+    def get_many(self, video_ids):
+        with self.client.pipeline(transaction=False) as pipe:
+            for video_id in video_ids:
+                pipe.hgetall(self.job_key(video_id))
+            jobs = [self.to_job(data) for data in pipe.execute()]
+        return {job['id']: job for job in jobs if job}
+
+    def list_jobs(self):
+        jobs = self.get_many(sorted(self.client.smembers(self.jobs_key))).values()
+        return sorted(jobs, key=lambda job: job['created_at'] or 0)
+
+    def update(self, video_id, **fields):
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        fields['updated_at'] = time.time()
+
+        def apply(pipe, job):
+            pipe.hset(self.job_key(video_id), mapping=self.encode(fields))
+            if not job or 'status' not in fields:
+                return
+            # Keep the queue and lease sets in step with the status, as the SQLite broker's queries are
+            pipe.zrem(self.queue_key(job['tenant']), video_id)
+            pipe.zrem(self.leases_key, video_id)
+            pipe.zrem(self.delayed_key, video_id)
+            if fields['status'] == 'queued':
+                priority = int(fields.get('priority', job['priority']))
+                self.push(pipe, video_id, fields.get('tenant') or job['tenant'],
+                          -priority * 1e10 + job['created_at'],
+                          float(fields.get('available_at') or job['available_at'] or 0))
+            elif fields['status'] == 'leased' and job['lease_expires_at']:
+                pipe.zadd(self.leases_key, {video_id: job['lease_expires_at']})
+        self.watch_job(video_id, apply)
+
+    def delete(self, video_id):
+        job = self.get(video_id)
+        with self.client.pipeline() as pipe:
+            pipe.delete(self.job_key(video_id))
+            if job:
+                pipe.zrem(self.queue_key(job['tenant']), video_id)
+            pipe.zrem(self.leases_key, video_id)
+            pipe.zrem(self.delayed_key, video_id)
+            pipe.srem(self.jobs_key, video_id)
+            pipe.execute()
+
+    def depth(self):
+        counts = {}
+        for job in self.list_jobs():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+    def create_batch(self, batch_id, tenant, video_ids, source=None):
+        self.client.hset(f"{self.batch_prefix}{batch_id}", mapping={
+            'id': batch_id, 'tenant': tenant, 'source': source or '',
+            'video_ids': json.dumps(list(video_ids)), 'created_at': time.time()
+        })
+
+    def get_batch(self, batch_id):
+        data = self.client.hgetall(f"{self.batch_prefix}{batch_id}")
+        if not data:
+            return None
+        return {'id': data['id'], 'tenant': data['tenant'], 'source': data['source'] or None,
+                'video_ids': json.loads(data['video_ids']), 'created_at': float(data['created_at'])}
+
+
+def create_job_queue(url=None):
+    """Build the broker from VIDIWISE_QUEUE_URL (sqlite:///path or redis://host:port/db)."""
+    from services.video_utils import OUTPUT_DIR
+    url = url or os.getenv("VIDIWISE_QUEUE_URL") or f"sqlite:///{os.path.join(OUTPUT_DIR, 'jobs.db')}"
+    if url.startswith('sqlite:///'):
+        return SQLiteJobQueue(url[len('sqlite:///'):])
+    if url.startswith(REDIS_URL_SCHEMES):
+        return RedisJobQueue(url)
+    raise ValueError(f"Unsupported queue URL: {url}")
@@ -0,0 +1,203 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Metric:
+    """Base for labelled metrics rendered in Prometheus text format."""
+
+    metric_type = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def label_key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def format_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key)) + list(extra or [])
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{self.escape(value)}"' for name, value in pairs) + '}'
+
+    @staticmethod
+    def escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{self.format_labels(key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self.label_key(labels), 0)
+
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        with self.lock:
+            for key, state in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, state['counts']):
+                    lines.append(f"{self.name}_bucket{self.format_labels(key, [('le', str(bound))])} {count}")
+                lines.append(f"{self.name}_bucket{self.format_labels(key, [('le', '+Inf')])} {state['count']}")
+                lines.append(f"{self.name}_sum{self.format_labels(key)} {state['sum']}")
+                lines.append(f"{self.name}_count{self.format_labels(key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_metrics_server(port, host='0.0.0.0', registry=None):
+    """Serve GET /metrics from a daemon thread, for processes without the API (run_worker.py)."""
+    registry = registry or REGISTRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would drown the worker's log
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"Serving metrics on {host}:{server.server_address[1]}/metrics")
+    return server
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'vidiwise_stage_duration_seconds', 'Duration of VideoService pipeline stages.', ['stage']))
+JOBS = REGISTRY.register(Gauge(
+    'vidiwise_jobs', 'Pipeline jobs by state (queued jobs are waiting for the pipeline).', ['state']))
+QUEUE_JOBS = REGISTRY.register(Gauge(
+    'vidiwise_queue_jobs', 'Jobs in the shared work queue by status.', ['status']))
+JOB_RESULTS = REGISTRY.register(Counter(
+    'vidiwise_jobs_total', 'Finished pipeline jobs by result.', ['result']))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    'vidiwise_upstream_request_duration_seconds', 'Latency of Groq and Gemini API calls.',
+    ['provider', 'operation']))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    'vidiwise_upstream_errors_total', 'Failed Groq and Gemini API calls.', ['provider', 'operation']))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'vidiwise_cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ['cache', 'result']))
+FRAMES = REGISTRY.register(Counter(
+    'vidiwise_frames_total', 'Frames seen by keyframe extraction by outcome.', ['outcome']))
+OCR_CALLS = REGISTRY.register(Counter(
+    'vidiwise_ocr_calls_total', 'Tesseract OCR invocations.'))
+STORAGE_BYTES = REGISTRY.register(Gauge(
+    'vidiwise_storage_bytes', 'Disk usage of video_findings by retention tier.', ['tier']))
+SEARCH_SECONDS = REGISTRY.register(Histogram(
+    'vidiwise_search_duration_seconds', 'Latency of full-text search queries.',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)))
+UPSTREAM_REQUEST_BYTES = REGISTRY.register(Counter(
+    'vidiwise_upstream_request_bytes_total', 'Request body bytes sent to Gemini.', ['provider', 'operation']))
+UPSTREAM_TOKENS = REGISTRY.register(Counter(
+    'vidiwise_upstream_tokens_total', 'Tokens reported by Gemini by kind (prompt, cached, output).',
+    ['provider', 'operation', 'kind']))
+UPSTREAM_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'vidiwise_upstream_wait_seconds', 'Time calls waited for upstream quota by lane.', ['provider', 'lane']))
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    'vidiwise_upstream_retries_total', 'Upstream calls retried by reason (rate_limited or unavailable).',
+    ['provider', 'reason']))
+TRANSCRIPTIONS = REGISTRY.register(Counter(
+    'vidiwise_transcriptions_total', 'Transcriptions by ASR backend and routing reason.', ['backend', 'reason']))
+TRANSCRIPTION_SECONDS = REGISTRY.register(Histogram(
+    'vidiwise_transcription_duration_seconds', 'Wall time of transcriptions by ASR backend.', ['backend']))
+TRANSCRIBED_AUDIO_SECONDS = REGISTRY.register(Counter(
+    'vidiwise_transcribed_audio_seconds_total', 'Seconds of audio transcribed by ASR backend.', ['backend']))
+FRAME_STORE_BYTES = REGISTRY.register(Counter(
+    'vidiwise_frame_store_bytes_total', 'Bytes written by the frame store by kind (frame, thumbnail, sprite).',
+    ['kind']))
+FRAME_SAVE_SECONDS = REGISTRY.register(Histogram(
+    'vidiwise_frame_save_seconds', 'Per-video keyframe saving time: total, and the part the pipeline waited for.',
+    ['phase']))
@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Thread pools doing a job's pipeline work are named with this prefix, so a
+# job's profile can include them and leave out unrelated threads
+PIPELINE_THREAD_PREFIX = 'pipeline-'
+
+
+class SamplingProfiler:
+    """Samples thread stacks at a fixed interval and writes folded stacks.
+
+    Output is one "thread;frame;frame count" line per unique stack, which
+    flamegraph.pl and speedscope read directly. With thread_id set, only that
+    thread and the pipeline-* pool workers (OCR, feature extraction, frame
+    writes, local ASR) are sampled, so API requests and other workers' threads
+    in the same process stay out of the job's profile.
+    """
+
+    def __init__(self, interval=0.01, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def enabled():
+        """Profiling is opt-in per deployment and then requested per job."""
+        return os.getenv("VIDIWISE_ENABLE_PROFILING", "").lower() in ("1", "true", "yes")
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            if (self.thread_id is not None and thread_id != self.thread_id
+                    and not names.get(thread_id, '').startswith(PIPELINE_THREAD_PREFIX)):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            # Group pool workers together ("ThreadPoolExecutor-0_3" -> "ThreadPoolExecutor")
+            thread_name = re.sub(r'[-_]\d+.*$', '', names.get(thread_id, 'thread'))
+            stack.append(thread_name)
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def write(self, path):
+        """Write folded stacks to path."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Wrote {sum(self.samples.values())} profile samples to {path}")
@@ -0,0 +1,250 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from services.checkpoint_service import CheckpointManager
+from services.job_queue import ACTIVE_STATUSES
+from services.metrics import STORAGE_BYTES
+
+logger = logging.getLogger(__name__)
+
+ACCESS_MARKER = '.last_access'
+
+# Eviction order: bulky intermediates first. Anything not listed here
+# (transcripts, thumbnails, manifests) is retained until the video is deleted.
+EVICTION_TIERS = ['media', 'audio', 'frames']
+MEDIA_EXTENSIONS = ('.mp4', '.webm', '.mkv', '.avi', '.mov')
+# SQLite files (queue, chat sessions, quotas, search index) at the top of base_dir;
+# counted against the budget but never evicted
+DATABASE_SUFFIXES = ('.db', '.db-wal', '.db-shm', '.db-journal')
+
+
+class RetentionManager:
+    """Keeps video_findings under a disk budget by evicting intermediates in LRU order.
+
+    Per-folder file lists are cached between passes. A pass lists the video
+    folders and walks only those whose mtime changed (new files, rewritten
+    checkpoints, evictions) or that are still processing, at most
+    max_rescans_per_pass of them after the first pass; sweep_per_pass of the
+    longest-unscanned folders are re-walked as well, to pick up changes deeper
+    in a folder that left its mtime alone. Cached state can be a pass old, so
+    a folder's job status is read again right before anything in it is evicted.
+    """
+
+    def __init__(self, base_dir, budget_mb=None, interval=60, max_evictions_per_cycle=20,
+                 max_rescans_per_pass=200, sweep_per_pass=20, job_status=None):
+        self.base_dir = base_dir
+        # Callable returning a video's status in the job queue, or None if it has no job
+        self.job_status = job_status
+        budget_mb = budget_mb or float(os.getenv("VIDIWISE_DISK_BUDGET_MB", "800"))
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.interval = interval
+        self.max_evictions_per_cycle = max_evictions_per_cycle
+        self.max_rescans_per_pass = max_rescans_per_pass
+        self.sweep_per_pass = sweep_per_pass
+        self.folders = {}
+        self.last_rescanned = 0
+        self.touch_interval = 60
+        self.last_touch = {}
+        self.stats = {'budget_bytes': self.budget_bytes, 'total_bytes': 0, 'tiers': {}, 'evicted_bytes': 0}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def classify(self, rel_path):
+        """Map a path relative to a video folder to its retention tier."""
+        name = os.path.basename(rel_path)
+        if rel_path.startswith('frames' + os.sep):
+            return 'frames'
+        if name == 'video.mp3':
+            return 'audio'
+        if name.startswith('video.') and name.endswith(MEDIA_EXTENSIONS):
+            return 'media'
+        return 'retained'
+
+    def touch(self, video_dir):
+        """Record an access to a video folder for LRU ordering (throttled, cheap)."""
+        if not video_dir:
+            return
+        now = time.time()
+        if now - self.last_touch.get(video_dir, 0) < self.touch_interval:
+            return
+        self.last_touch[video_dir] = now
+        folder = self.folders.get(video_dir)
+        if folder:
+            folder['last_access'] = now
+        try:
+            marker = os.path.join(video_dir, ACCESS_MARKER)
+            with open(marker, 'a'):
+                os.utime(marker, None)
+        except OSError as e:
+            logger.debug(f"Could not record access for {video_dir}: {str(e)}")
+
+    def last_access(self, video_dir):
+        """Last chat/status access, falling back to folder modification time."""
+        for path in (os.path.join(video_dir, ACCESS_MARKER), video_dir):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                continue
+        return 0
+
+    def scan_folder(self, video_dir):
+        """Return {tier: [(path, size), ...]} for one video folder."""
+        files = {}
+        for root, _, names in os.walk(video_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                tier = self.classify(os.path.relpath(path, video_dir))
+                files.setdefault(tier, []).append((path, size))
+        return files
+
+    def is_active(self, video_dir):
+        """Whether a job for this folder's video is queued or running, so its files are still needed."""
+        job = CheckpointManager(video_dir).job
+        if job.get('status') in ('processing', 'queued'):
+            return True
+        if self.job_status and job.get('video_id'):
+            try:
+                return self.job_status(job['video_id']) in ACTIVE_STATUSES
+            except Exception as e:
+                logger.warning(f"Could not read job status for {video_dir}, not evicting it: {str(e)}")
+                return True
+        return False
+
+    def scan_state(self, video_dir, mtime):
+        """Walk one video folder and return its cached state."""
+        files = self.scan_folder(video_dir)
+        return {
+            'path': video_dir,
+            'mtime': mtime,
+            'files': files,
+            'tiers': {tier: (sum(size for _, size in items), len(items)) for tier, items in files.items()},
+            'last_access': self.last_access(video_dir),
+            'active': self.is_active(video_dir),
+            'scanned_at': time.time()
+        }
+
+    def scan(self):
+        """Refresh the cached folder states and build per-tier space accounting."""
+        listed = {}
+        databases = {'bytes': 0, 'files': 0}
+        if os.path.isdir(self.base_dir):
+            for entry in os.scandir(self.base_dir):
+                try:
+                    if entry.is_dir():
+                        listed[entry.path] = entry.stat().st_mtime_ns
+                    elif entry.name.endswith(DATABASE_SUFFIXES):
+                        databases['bytes'] += entry.stat().st_size
+                        databases['files'] += 1
+                except OSError:
+                    continue
+        for path in set(self.folders) - set(listed):
+            del self.folders[path]
+
+        changed = [path for path, mtime in listed.items()
+                   if path not in self.folders or self.folders[path]['mtime'] != mtime or self.folders[path]['active']]
+        # The first pass has to see everything; later ones are bounded
+        limit = len(changed) if not self.stats.get('last_run') else self.max_rescans_per_pass
+        if len(changed) > limit:
+            logger.info(f"{len(changed)} video folders changed, rescanning {limit} this pass")
+        # Folders never scanned come first, then the ones scanned longest ago
+        changed.sort(key=lambda path: self.folders[path]['scanned_at'] if path in self.folders else 0)
+        rescan = changed[:limit]
+        rescanned = set(rescan)
+        rescan += heapq.nsmallest(self.sweep_per_pass, (path for path in self.folders if path not in rescanned),
+                                  key=lambda path: self.folders[path]['scanned_at'])
+        for path in rescan:
+            self.folders[path] = self.scan_state(path, listed[path])
+        self.last_rescanned = len(rescan)
+
+        folders = list(self.folders.values())
+        tiers = {'databases': databases} if databases['files'] else {}
+        for folder in folders:
+            for tier, (size, count) in folder['tiers'].items():
+                tier_stats = tiers.setdefault(tier, {'bytes': 0, 'files': 0})
+                tier_stats['bytes'] += size
+                tier_stats['files'] += count
+        total = sum(tier['bytes'] for tier in tiers.values())
+        return folders, tiers, total
+
+    def collect_once(self):
+        """Run one incremental GC pass: evict at most max_evictions_per_cycle folder tiers."""
+        folders, tiers, total = self.scan()
+        evicted = 0
+        evicted_bytes = 0
+
+        if total > self.budget_bytes:
+            logger.info(f"Disk usage {total} bytes over budget {self.budget_bytes}, evicting intermediates")
+            candidates = sorted((f for f in folders if not f['active']), key=lambda f: f['last_access'])
+            for tier in EVICTION_TIERS:
+                for folder in candidates:
+                    if total <= self.budget_bytes or evicted >= self.max_evictions_per_cycle:
+                        break
+                    if tier not in folder['files'] or folder['active']:
+                        continue
+                    # The video may have been resubmitted since the folder was scanned
+                    if self.is_active(folder['path']):
+                        folder['active'] = True
+                        logger.info(f"Not evicting from {folder['path']}: its video is queued or processing")
+                        continue
+                    files = folder['files'].pop(tier, [])
+                    folder['tiers'].pop(tier, None)
+                    freed = self.evict(files)
+                    if freed:
+                        total -= freed
+                        evicted_bytes += freed
+                        tiers[tier]['bytes'] -= freed
+                        tiers[tier]['files'] -= len(files)
+                        evicted += 1
+                        logger.info(f"Evicted {tier} from {folder['path']} ({freed} bytes)")
+
+            if total > self.budget_bytes and evicted < self.max_evictions_per_cycle:
+                logger.warning(f"Disk usage still {total} bytes after evicting all intermediates")
+
+        for tier, tier_stats in tiers.items():
+            STORAGE_BYTES.set(tier_stats['bytes'], tier=tier)
+        self.stats = {
+            'budget_bytes': self.budget_bytes,
+            'total_bytes': total,
+            'tiers': tiers,
+            'videos': len(folders),
+            'rescanned_folders': self.last_rescanned,
+            'evicted_bytes': self.stats.get('evicted_bytes', 0) + evicted_bytes,
+            'last_run': time.time()
+        }
+        return self.stats
+
+    def evict(self, files):
+        """Delete the given files and return bytes freed."""
+        freed = 0
+        for path, size in files:
+            try:
+                os.remove(path)
+                freed += size
+            except OSError as e:
+                logger.error(f"Error evicting {path}: {str(e)}")
+        return freed
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.collect_once()
+            except Exception as e:
+                logger.error(f"Error in retention pass: {str(e)}")
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        """Start the background GC thread."""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="retention-gc", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
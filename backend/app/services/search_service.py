@@ -0,0 +1,221 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from services.job_queue import SQLiteTransaction
+from services.metrics import SEARCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Lines written by VideoService.prepare_combined_transcript; OCR text may continue on following lines
+SEGMENT_LINE = re.compile(r'^\[([^\]]+)\] (Transcript|Frame OCR): ?(.*)$')
+SEGMENT_KINDS = {'Transcript': 'transcript', 'Frame OCR': 'ocr'}
+# A slide shown more than once lists its ranges comma-separated; "1 day, 0:00:00" is one timestamp
+RANGE_SEPARATOR = re.compile(r'(?<!day)(?<!days), ')
+SNIPPET_CHARS = 300
+# FTS5's bm25() defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def parse_timestamp(value):
+    """Seconds from a str(timedelta) such as 0:01:02.500000."""
+    days = 0
+    if 'day' in value:
+        day_part, value = value.split(',', 1)
+        days = int(day_part.split()[0])
+    hours, minutes, seconds = value.strip().split(':')
+    return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_ranges(stamp):
+    """[(start, end)] in seconds from a stamp such as "0:00:00 - 0:00:02, 0:00:06"."""
+    ranges = []
+    for part in RANGE_SEPARATOR.split(stamp):
+        start, _, end = part.partition(' - ')
+        start = parse_timestamp(start)
+        ranges.append((start, parse_timestamp(end) if end else start))
+    return ranges
+
+
+def parse_transcript(path):
+    """Split a combined video_transcript.txt into timestamped transcript and OCR segments.
+
+    A slide shown at several times becomes one segment per range.
+    """
+    segments = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            match = SEGMENT_LINE.match(line)
+            if match:
+                stamp, kind, text = match.groups()
+                try:
+                    ranges = parse_ranges(stamp)
+                except ValueError:
+                    logger.warning(f"Unparseable timestamp in {path}: {stamp}")
+                    ranges = [(None, None)]
+                # Continuation lines are added to every range's segment
+                line_segments = [{'kind': SEGMENT_KINDS[kind], 'start': start, 'end': end, 'text': text}
+                                 for start, end in ranges]
+                segments.extend(line_segments)
+            elif segments and line.strip():
+                for segment in line_segments:
+                    segment['text'] += '\n' + line
+    return [segment for segment in segments if segment['text'].strip()]
+
+
+class SearchIndex:
+    """Persistent BM25 full-text index over transcript and OCR segments of all videos.
+
+    Segments live in a plain table keyed by video so a video can be replaced or
+    removed through an index lookup; an external-content FTS5 table kept in
+    sync by triggers holds the inverted index and does the BM25 ranking.
+    """
+
+    def __init__(self, path, candidate_segments=200, matches_per_video=5,
+                 max_exact_matches=1000, common_window=500):
+        self.path = path
+        self.candidate_segments = candidate_segments
+        self.max_exact_matches = max_exact_matches
+        self.common_window = common_window
+        self.matches_per_video = matches_per_video
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.local = threading.local()
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    id INTEGER PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    start REAL,
+                    end REAL,
+                    text TEXT NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS segments_video ON segments (video_id)")
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+                    text, content='segments', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+                )""")
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS segments_insert AFTER INSERT ON segments BEGIN
+                    INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+                END""")
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS segments_delete AFTER DELETE ON segments BEGIN
+                    INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    video_id TEXT PRIMARY KEY,
+                    segment_count INTEGER NOT NULL,
+                    indexed_at REAL NOT NULL
+                )""")
+
+    @property
+    def conn(self):
+        if not hasattr(self.local, 'conn'):
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return self.local.conn
+
+    def transaction(self):
+        return SQLiteTransaction(self.conn)
+
+    def index_video(self, video_id, segments):
+        """Replace everything indexed for a video with the given segments."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM segments WHERE video_id = ?", (video_id,))
+            conn.executemany(
+                "INSERT INTO segments (video_id, kind, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                [(video_id, s['kind'], s.get('start'), s.get('end'), s['text']) for s in segments])
+            conn.execute("""
+                INSERT INTO videos (video_id, segment_count, indexed_at) VALUES (?, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    segment_count = excluded.segment_count, indexed_at = excluded.indexed_at""",
+                (video_id, len(segments), time.time()))
+        logger.info(f"Indexed {len(segments)} segments for video {video_id}")
+
+    def index_transcript(self, video_id, transcript_path):
+        self.index_video(video_id, parse_transcript(transcript_path))
+
+    def remove_video(self, video_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM segments WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+
+    def indexed_videos(self):
+        return {row['video_id'] for row in self.conn.execute("SELECT video_id FROM videos")}
+
+    def count_matches(self, term, cap):
+        """Segments containing term, counted no further than cap."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM (SELECT rowid FROM segments_fts WHERE segments_fts MATCH ? LIMIT ?)",
+            (self.quote(term), cap + 1)).fetchone()[0]
+
+    def quote(self, term):
+        # Quoted terms can't be parsed as FTS5 operators or column filters
+        return f'"{term}"'
+
+    def rank_segments(self, query):
+        """(segment id, bm25 score) of the best-matching segments, lower score is better."""
+        terms = list(dict.fromkeys(re.findall(r'\w+', query.lower())))
+        counts = {term: self.count_matches(term, self.max_exact_matches) for term in terms}
+        terms = [term for term in terms if counts[term]]
+        if not terms:
+            return []
+        # Ranking cost grows with every matching segment. The words that match
+        # the most segments also have the lowest IDF, so rank on the rarer
+        # words alone when there are any.
+        rare = [term for term in terms if counts[term] <= self.max_exact_matches]
+        if rare:
+            return self.conn.execute("""
+                SELECT rowid, rank FROM segments_fts WHERE segments_fts MATCH ?
+                ORDER BY rank LIMIT ?""", (' OR '.join(map(self.quote, rare)), self.candidate_segments)).fetchall()
+        # Only very common words. bm25() reads each word's whole posting list to
+        # get its IDF, so score the most recent matches here instead, with BM25's
+        # term frequency and length normalization (IDF is near zero for these words).
+        rows = self.conn.execute("""
+            SELECT rowid, highlight(segments_fts, 0, char(1), char(2)) FROM segments_fts
+            WHERE segments_fts MATCH ? ORDER BY rowid DESC LIMIT ?""",
+            (' OR '.join(map(self.quote, terms)), self.common_window)).fetchall()
+        lengths = [len(text.split()) for _, text in rows]
+        average_length = sum(lengths) / len(lengths)
+        scored = []
+        for (rowid, text), length in zip(rows, lengths):
+            hits = text.count('\x01')
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            scored.append((rowid, -hits * (BM25_K1 + 1) / (hits + norm)))
+        return sorted(scored, key=lambda row: row[1])[:self.candidate_segments]
+
+    def search(self, query, limit=10):
+        """Videos ranked by their best-matching segments, each with matching timestamps."""
+        with SEARCH_SECONDS.time():
+            ranked_segments = self.rank_segments(query)
+            if not ranked_segments:
+                return []
+            scores = dict(ranked_segments)
+            placeholders = ', '.join('?' * len(scores))
+            segments = self.conn.execute(
+                f"SELECT id, video_id, kind, start, end, text FROM segments WHERE id IN ({placeholders})",
+                list(scores)).fetchall()
+
+            videos = {}
+            for row in sorted(segments, key=lambda row: scores[row['id']]):
+                video = videos.setdefault(row['video_id'], {'video_id': row['video_id'], 'score': 0.0, 'matches': []})
+                # bm25 is lower-is-better; a video scores by its top few segments
+                if len(video['matches']) < self.matches_per_video:
+                    video['score'] -= scores[row['id']]
+                    video['matches'].append({'kind': row['kind'], 'start': row['start'], 'end': row['end'],
+                                             'text': row['text'][:SNIPPET_CHARS], 'score': -scores[row['id']]})
+            ranked = sorted(videos.values(), key=lambda video: video['score'], reverse=True)[:limit]
+            for video in ranked:
+                video['matches'].sort(key=lambda match: match['start'] if match['start'] is not None else 0)
+        return ranked
@@ -0,0 +1,329 @@
+import os
+import re
+import math
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from services.metrics import (UPSTREAM_SECONDS, UPSTREAM_ERRORS, TRANSCRIPTIONS, TRANSCRIPTION_SECONDS,
+                              TRANSCRIBED_AUDIO_SECONDS)
+from services.upstream import BACKGROUND, get_upstream_scheduler
+from services.profiler import PIPELINE_THREAD_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Groq rejects uploads above this on the free tier (100MB on paid plans)
+GROQ_MAX_FILE_BYTES = 25 * 1024 * 1024
+# extract_audio writes VBR MP3 at -q:a 0, roughly 30KB per second
+MP3_BYTES_PER_SECOND = 30000
+SAMPLE_RATE = 16000
+# Audio too big for a Groq upload is re-encoded as 16kHz mono MP3 at this bitrate
+UPLOAD_BITRATE = 32000
+
+
+def audio_duration(audio_file, ffmpeg_path=None):
+    """Duration in seconds from ffmpeg's probe output, or estimated from the file size."""
+    try:
+        result = subprocess.run([ffmpeg_path or os.getenv("FFMPEG_PATH", "ffmpeg"), "-i", audio_file],
+                                capture_output=True, text=True, timeout=30)
+        match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+        if match:
+            hours, minutes, seconds = match.groups()
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not probe duration of {audio_file}: {str(e)}")
+    return os.path.getsize(audio_file) / MP3_BYTES_PER_SECOND
+
+
+def split_audio(audio, chunk_seconds, search_seconds=2.0, sample_rate=SAMPLE_RATE):
+    """Cut 16kHz samples into (start_seconds, samples) chunks of about chunk_seconds.
+
+    Each cut is moved to the quietest 20ms within search_seconds of the nominal
+    boundary, so chunks rarely split a word.
+    """
+    import numpy as np
+    frame = sample_rate // 50
+    chunk = int(chunk_seconds * sample_rate)
+    search = int(search_seconds * sample_rate)
+    chunks, start = [], 0
+    while len(audio) - start > chunk + search:
+        window = audio[start + chunk - search:start + chunk + search]
+        usable = len(window) // frame * frame
+        energy = np.square(window[:usable]).reshape(-1, frame).mean(axis=1)
+        cut = start + chunk - search + int(np.argmin(energy)) * frame + frame // 2
+        chunks.append((start / sample_rate, audio[start:cut]))
+        start = cut
+    chunks.append((start / sample_rate, audio[start:]))
+    return chunks
+
+
+class TranscriptionBackend:
+    """Speech-to-text for one audio file, as [{'start', 'end', 'text'}] segments in seconds."""
+
+    name = None
+
+    def available(self):
+        return True
+
+    def transcribe(self, audio_file, duration):
+        raise NotImplementedError
+
+
+class GroqBackend(TranscriptionBackend):
+    """Groq's hosted Whisper, called within the shared upstream quota."""
+
+    name = 'groq'
+
+    def __init__(self, model="distil-whisper-large-v3-en", api_key=None, max_file_bytes=GROQ_MAX_FILE_BYTES,
+                 scheduler=None, ffmpeg_path=None):
+        self.model = model
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.max_file_bytes = max_file_bytes
+        self.scheduler = scheduler
+        self.ffmpeg_path = ffmpeg_path
+        self._client = None
+
+    @property
+    def client(self):
+        """Groq client, created on first transcription."""
+        if self._client is None:
+            from groq import Groq
+            # Retries and backoff are left to the upstream scheduler
+            self._client = Groq(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    def available(self):
+        return bool(self.api_key)
+
+    def accepts(self, audio_file):
+        """Whether the file can be uploaded as it is, without re-encoding and splitting it."""
+        return os.path.getsize(audio_file) <= self.max_file_bytes
+
+    def split_for_upload(self, audio_file, duration, directory):
+        """Re-encode audio over the upload limit as 16kHz mono pieces that fit; returns [(start, path, seconds)].
+
+        Whisper resamples to 16kHz mono anyway, so nothing it would hear is
+        lost. Audio longer than one upload's worth at UPLOAD_BITRATE (about
+        1.5 hours at 25MB) is cut into consecutive pieces.
+        """
+        chunk_seconds = self.max_file_bytes * 0.9 / (UPLOAD_BITRATE / 8)
+        pieces = []
+        for i in range(max(1, math.ceil(duration / chunk_seconds))):
+            start = i * chunk_seconds
+            path = os.path.join(directory, f"upload_{i}.mp3")
+            subprocess.run([self.ffmpeg_path or os.getenv("FFMPEG_PATH", "ffmpeg"), "-y", "-v", "error",
+                            "-ss", str(start), "-t", str(chunk_seconds), "-i", audio_file,
+                            "-ac", "1", "-ar", str(SAMPLE_RATE), "-b:a", str(UPLOAD_BITRATE), path],
+                           check=True, capture_output=True, timeout=600)
+            pieces.append((start, path, min(chunk_seconds, duration - start)))
+        return pieces
+
+    def quota_wait(self, duration):
+        """Seconds a transcription of this length would wait for Groq quota right now."""
+        return (self.scheduler or get_upstream_scheduler()).estimate_wait(
+            'groq', self.model, {'audio_seconds': duration}, BACKGROUND)
+
+    def transcribe(self, audio_file, duration):
+        if self.accepts(audio_file):
+            return self.transcribe_file(audio_file, duration)
+        with tempfile.TemporaryDirectory() as directory:
+            pieces = self.split_for_upload(audio_file, duration, directory)
+            logger.info(f"{os.path.getsize(audio_file)} bytes of audio is over Groq's upload limit, "
+                        f"sending it as {len(pieces)} re-encoded piece(s)")
+            segments = []
+            for start, path, seconds in pieces:
+                for segment in self.transcribe_file(path, seconds):
+                    segments.append(dict(segment, start=start + segment['start'], end=start + segment['end']))
+            return segments
+
+    def transcribe_file(self, audio_file, duration):
+        def transcribe():
+            try:
+                with open(audio_file, "rb") as file, \
+                        UPSTREAM_SECONDS.time(provider='groq', operation='transcription'):
+                    return self.client.audio.transcriptions.create(
+                        file=file,
+                        model=self.model,
+                        response_format="verbose_json",  # Get timestamps
+                        temperature=0.0
+                    )
+            except Exception:
+                UPSTREAM_ERRORS.inc(provider='groq', operation='transcription')
+                raise
+
+        # Groq meters audio seconds; settle the probed duration with the one it reports
+        transcription = (self.scheduler or get_upstream_scheduler()).call(
+            'groq', self.model, transcribe, cost={'audio_seconds': duration},
+            lane=BACKGROUND, actual_cost=lambda t: {'audio_seconds': getattr(t, 'duration', None)})
+
+        # Convert Groq response to match existing code format
+        segments = []
+        if hasattr(transcription, 'segments') and transcription.segments:
+            for segment in transcription.segments:
+                segments.append({
+                    'start': segment.get('start', 0),
+                    'end': segment.get('end', 0),
+                    'text': segment.get('text', '')
+                })
+        else:
+            # Fallback: create a single segment with full text
+            segments.append({
+                'start': 0,
+                'end': 0,
+                'text': transcription.text if hasattr(transcription, 'text') else ''
+            })
+        return segments
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """Whisper on the CPU with faster-whisper (CTranslate2, int8 weights).
+
+    The audio is cut into chunks at quiet points and the chunks are
+    transcribed in parallel. CTranslate2 releases the GIL, so each of the
+    `workers` threads runs its own model replica with cpu_count / workers
+    threads. Requires the optional faster-whisper package.
+    """
+
+    name = 'local'
+
+    def __init__(self, model="distil-small.en", compute_type="int8", workers=None, chunk_seconds=60,
+                 language="en", beam_size=1, vad_filter=True):
+        cores = os.cpu_count() or 1
+        self.model_name = model
+        self.compute_type = compute_type
+        self.workers = workers or max(1, cores // 2)
+        self.cpu_threads = max(1, cores // self.workers)
+        self.chunk_seconds = chunk_seconds
+        self.language = language
+        self.beam_size = beam_size
+        self.vad_filter = vad_filter
+        self._model = None
+        self.model_lock = threading.Lock()
+
+    def available(self):
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    @property
+    def model(self):
+        """WhisperModel, loaded (and downloaded on first use) when the first file is transcribed."""
+        with self.model_lock:
+            if self._model is None:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError:
+                    raise RuntimeError("LocalWhisperBackend requires the faster-whisper package: pip install faster-whisper")
+                started = time.time()
+                self._model = WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type,
+                                           cpu_threads=self.cpu_threads, num_workers=self.workers)
+                logger.info(f"Loaded {self.model_name} ({self.compute_type}) in {time.time() - started:.1f}s")
+            return self._model
+
+    def transcribe_chunk(self, chunk):
+        start, samples = chunk
+        # Not conditioning on earlier text keeps one misheard phrase from repeating through the chunk
+        segments, _ = self.model.transcribe(samples, language=self.language, beam_size=self.beam_size,
+                                            vad_filter=self.vad_filter, condition_on_previous_text=False)
+        return [{'start': start + segment.start, 'end': start + segment.end, 'text': segment.text}
+                for segment in segments]
+
+    def transcribe(self, audio_file, duration):
+        from faster_whisper import decode_audio
+        chunks = split_audio(decode_audio(audio_file, sampling_rate=SAMPLE_RATE), self.chunk_seconds)
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks)),
+                                thread_name_prefix=f"{PIPELINE_THREAD_PREFIX}asr") as executor:
+            results = list(executor.map(self.transcribe_chunk, chunks))
+        return [segment for segments in results for segment in segments]
+
+
+class TranscriptionRouter:
+    """Picks a transcription backend per file and falls back to the other on failure.
+
+    mode 'groq' or 'local' always prefers that backend. In 'auto' mode:
+      - audio over the remote backend's upload limit goes local, since the
+        remote one would have to re-encode and split it first;
+      - when the remote quota would make the file wait longer than the local
+        backend needs to transcribe it, it goes local;
+      - when the work queue is backed up (queue_depth() >= local_queue_depth),
+        files up to local_max_seconds go local so the backlog is worked off on
+        both; longer ones stay remote, where they finish far sooner;
+      - everything else goes remote, which is fastest when quota is free.
+    The local speed estimate starts at local_speed (times real time) and
+    follows measured runs.
+    """
+
+    def __init__(self, remote=None, local=None, mode='auto', queue_depth=None, local_queue_depth=4,
+                 local_max_seconds=900, local_speed=8.0, ffmpeg_path=None):
+        self.remote = remote
+        self.local = local
+        self.mode = mode
+        self.queue_depth = queue_depth
+        self.local_queue_depth = local_queue_depth
+        self.local_max_seconds = local_max_seconds
+        self.local_speed = local_speed
+        self.ffmpeg_path = ffmpeg_path
+
+    def choose(self, audio_file, duration):
+        """Return ([backends in order of preference], reason)."""
+        remote = self.remote if self.remote and self.remote.available() else None
+        local = self.local if self.local and self.local.available() else None
+        if self.mode == 'local':
+            return [backend for backend in (local, remote) if backend], 'configured'
+        if self.mode == 'groq':
+            return [backend for backend in (remote, local) if backend], 'configured'
+        if not (remote and local):
+            return [backend for backend in (remote, local) if backend], 'only_backend'
+
+        if not remote.accepts(audio_file):
+            return [local, remote], 'too_large'
+        if remote.quota_wait(duration) > duration / self.local_speed:
+            return [local, remote], 'quota'
+        if self.queue_depth and duration <= self.local_max_seconds:
+            try:
+                depth = self.queue_depth()
+            except Exception as e:
+                logger.warning(f"Could not read queue depth for ASR routing: {str(e)}")
+                depth = 0
+            if depth >= self.local_queue_depth:
+                return [local, remote], 'backlog'
+        return [remote, local], 'default'
+
+    def transcribe(self, audio_file):
+        duration = audio_duration(audio_file, self.ffmpeg_path)
+        backends, reason = self.choose(audio_file, duration)
+        if not backends:
+            raise RuntimeError("No transcription backend available: set GROQ_API_KEY or pip install faster-whisper")
+
+        for i, backend in enumerate(backends):
+            logger.info(f"Transcribing {duration:.0f}s of audio with {backend.name} ({reason})")
+            started = time.time()
+            try:
+                segments = backend.transcribe(audio_file, duration)
+            except Exception as e:
+                if i == len(backends) - 1:
+                    raise
+                logger.warning(f"{backend.name} transcription failed, falling back to {backends[i + 1].name}: {str(e)}")
+                reason = 'fallback'
+                continue
+            elapsed = time.time() - started
+            TRANSCRIPTIONS.inc(backend=backend.name, reason=reason)
+            TRANSCRIPTION_SECONDS.observe(elapsed, backend=backend.name)
+            TRANSCRIBED_AUDIO_SECONDS.inc(duration, backend=backend.name)
+            if backend is self.local and elapsed > 0:
+                self.local_speed = 0.7 * self.local_speed + 0.3 * duration / elapsed
+            return segments
+
+
+def create_transcription_router(queue_depth=None, ffmpeg_path=None):
+    """Router over Groq and, when faster-whisper is installed, a local model; configured from the environment."""
+    mode = os.getenv("VIDIWISE_ASR_BACKEND", "auto")
+    if mode not in ('auto', 'groq', 'local'):
+        raise ValueError(f"Unsupported VIDIWISE_ASR_BACKEND: {mode}")
+    local = LocalWhisperBackend(
+        model=os.getenv("VIDIWISE_LOCAL_ASR_MODEL", "distil-small.en"),
+        workers=int(os.getenv("VIDIWISE_LOCAL_ASR_WORKERS", "0")) or None)
+    remote = GroqBackend(max_file_bytes=int(float(os.getenv("VIDIWISE_GROQ_MAX_FILE_MB", "25")) * 1024 * 1024),
+                         ffmpeg_path=ffmpeg_path)
+    return TranscriptionRouter(remote, local, mode=mode, queue_depth=queue_depth, ffmpeg_path=ffmpeg_path)
@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from services.job_queue import SQLiteTransaction, REDIS_URL_SCHEMES
+from services.metrics import UPSTREAM_WAIT_SECONDS, UPSTREAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Interactive calls (chat) may use the whole quota; background calls
+# (transcription, titles and summaries) leave a reserve for them
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Quota name -> (unit charged per call, refill period in seconds)
+QUOTA_UNITS = {
+    'rpm': ('requests', 60),
+    'tpm': ('tokens', 60),
+    'ash': ('audio_seconds', 3600),
+}
+# Free-tier limits; override per provider or provider:model with VIDIWISE_UPSTREAM_LIMITS
+DEFAULT_LIMITS = {
+    'gemini': {'rpm': 15, 'tpm': 1000000},
+    'groq': {'rpm': 20, 'ash': 7200},
+}
+
+
+class UpstreamError(Exception):
+    """A Groq or Gemini call failed."""
+
+    def __init__(self, provider, message, status_code=None, retry_after=None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitedError(UpstreamError):
+    """The provider answered 429; retry_after is its hint in seconds, if any."""
+
+
+class QuotaExceededError(RateLimitedError):
+    """The local quota would not admit the call before its deadline."""
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """5xx, timeout or connection failure; worth retrying."""
+
+
+def error_from_status(provider, status_code, message, retry_after=None):
+    if status_code == 429:
+        return RateLimitedError(provider, message, status_code, retry_after)
+    if status_code is not None and status_code >= 500:
+        return UpstreamUnavailableError(provider, message, status_code, retry_after)
+    return UpstreamError(provider, message, status_code, retry_after)
+
+
+def error_from_exception(provider, exc):
+    """Map an SDK or HTTP client exception onto the typed errors."""
+    if isinstance(exc, UpstreamError):
+        return exc
+    status_code = getattr(exc, 'status_code', None)
+    response = getattr(exc, 'response', None)
+    retry_after = None
+    headers = getattr(response, 'headers', None)
+    if headers and headers.get('retry-after'):
+        try:
+            retry_after = float(headers.get('retry-after'))
+        except ValueError:
+            pass
+    if status_code is None and any(word in type(exc).__name__ for word in ('Connection', 'Timeout')):
+        return UpstreamUnavailableError(provider, str(exc))
+    return error_from_status(provider, status_code, str(exc), retry_after)
+
+
+class UpstreamScheduler:
+    """Token buckets and adaptive backoff for upstream APIs, shared through SQLite on one host.
+
+    Every process that calls Groq or Gemini (API and workers) goes through the
+    same buckets, so together they stay under the account's quotas. A 429 puts
+    the provider:model in backoff and halves its effective rate; successes
+    bring the rate back up gradually.
+    """
+
+    def __init__(self, path, limits=None, background_reserve=0.25, max_retries=3,
+                 max_wait=None, max_backoff=60, min_rate_factor=0.1):
+        self.path = path
+        self.limits = limits if limits is not None else DEFAULT_LIMITS
+        self.background_reserve = background_reserve
+        self.max_retries = max_retries
+        self.max_wait = max_wait or {INTERACTIVE: 30, BACKGROUND: 600}
+        self.max_backoff = max_backoff
+        self.min_rate_factor = min_rate_factor
+        self.local = threading.local()
+        self.create_tables()
+
+    def create_tables(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS backoff (
+                    key TEXT PRIMARY KEY,
+                    until REAL NOT NULL,
+                    failures INTEGER NOT NULL,
+                    rate_factor REAL NOT NULL
+                )""")
+
+    @property
+    def conn(self):
+        if not hasattr(self.local, 'conn'):
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return self.local.conn
+
+    def transaction(self):
+        return SQLiteTransaction(self.conn)
+
+    def limits_for(self, provider, model):
+        limits = self.limits.get(f"{provider}:{model}")
+        if limits is None:
+            limits = self.limits.get(provider) or {}
+        return limits
+
+    def take(self, key, limits, cost, lane, factor, now, read_bucket):
+        """Bucket levels after charging cost, and the seconds to wait before the charge fits.
+
+        read_bucket(bucket_key) returns the stored (level, updated_at), or None for a full bucket.
+        """
+        wait, levels = 0.0, []
+        for quota, capacity in limits.items():
+            unit, period = QUOTA_UNITS[quota]
+            amount = cost.get(unit, 0)
+            if not amount:
+                continue
+            bucket_key = f"{key}:{quota}"
+            rate = capacity * factor / period
+            row = read_bucket(bucket_key)
+            level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            floor = capacity * self.background_reserve if lane == BACKGROUND else 0.0
+            # A call bigger than the bucket can still run once the bucket is full
+            amount = min(amount, capacity - floor)
+            if level - amount < floor:
+                wait = max(wait, (floor + amount - level) / rate)
+            levels.append((bucket_key, level - amount))
+        return wait, levels
+
+    def try_acquire(self, key, limits, cost, lane, dry_run=False):
+        """Take cost from every bucket, or return the seconds to wait before it could succeed.
+
+        With dry_run the buckets are left untouched, so callers can ask how long a call would wait.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            state = conn.execute("SELECT * FROM backoff WHERE key = ?", (key,)).fetchone()
+            if state and state['until'] > now:
+                return state['until'] - now
+            factor = state['rate_factor'] if state else 1.0
+
+            def read_bucket(bucket_key):
+                row = conn.execute("SELECT level, updated_at FROM buckets WHERE key = ?", (bucket_key,)).fetchone()
+                return (row['level'], row['updated_at']) if row else None
+            wait, levels = self.take(key, limits, cost, lane, factor, now, read_bucket)
+            if wait or dry_run:
+                return wait
+            conn.executemany("""
+                INSERT INTO buckets (key, level, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET level = excluded.level, updated_at = excluded.updated_at""",
+                [(bucket_key, level, now) for bucket_key, level in levels])
+            return 0.0
+
+    def acquire(self, provider, model, cost, lane, deadline):
+        key = f"{provider}:{model}"
+        limits = self.limits_for(provider, model)
+        started = time.time()
+        while True:
+            wait = self.try_acquire(key, limits, cost, lane)
+            if not wait:
+                break
+            if time.time() + wait > deadline:
+                raise QuotaExceededError(provider, f"{model} quota exhausted for {lane} calls", retry_after=wait)
+            # Jitter so waiting workers don't retry in lockstep
+            time.sleep(min(wait, 5) * random.uniform(1.0, 1.2))
+        UPSTREAM_WAIT_SECONDS.observe(time.time() - started, provider=provider, lane=lane)
+
+    def estimate_wait(self, provider, model, cost, lane=BACKGROUND):
+        """Seconds a call costing cost would currently wait for quota (0 when it could run now)."""
+        cost = {'requests': 1, **(cost or {})}
+        return self.try_acquire(f"{provider}:{model}", self.limits_for(provider, model), cost, lane, dry_run=True)
+
+    def adjust(self, provider, model, cost):
+        """Charge (or refund, when negative) the difference between estimated and actual cost."""
+        limits = self.limits_for(provider, model)
+        with self.transaction() as conn:
+            for quota in limits:
+                unit, _ = QUOTA_UNITS[quota]
+                if cost.get(unit):
+                    conn.execute("UPDATE buckets SET level = level - ? WHERE key = ?",
+                                 (cost[unit], f"{provider}:{model}:{quota}"))
+
+    def next_backoff(self, state, retry_after):
+        """(failures, rate_factor, delay) after another 429, given the current backoff state, if any."""
+        failures = (state['failures'] if state else 0) + 1
+        factor = max(self.min_rate_factor, (state['rate_factor'] if state else 1.0) / 2)
+        return failures, factor, max(retry_after or 0, min(self.max_backoff, 2 ** (failures - 1)))
+
+    def record_rate_limited(self, provider, model, retry_after=None):
+        key = f"{provider}:{model}"
+        with self.transaction() as conn:
+            state = conn.execute("SELECT * FROM backoff WHERE key = ?", (key,)).fetchone()
+            failures, factor, delay = self.next_backoff(state, retry_after)
+            conn.execute("""
+                INSERT INTO backoff (key, until, failures, rate_factor) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    until = excluded.until, failures = excluded.failures, rate_factor = excluded.rate_factor""",
+                (key, time.time() + delay, failures, factor))
+        logger.warning(f"{key} rate limited, backing off {delay:.1f}s at {factor:.0%} of the configured rate")
+
+    def record_success(self, provider, model):
+        key = f"{provider}:{model}"
+        state = self.conn.execute("SELECT * FROM backoff WHERE key = ?", (key,)).fetchone()
+        if state is None:
+            return
+        with self.transaction() as conn:
+            factor = min(1.0, state['rate_factor'] + 0.05)
+            if factor >= 1.0:
+                conn.execute("DELETE FROM backoff WHERE key = ?", (key,))
+            else:
+                conn.execute("UPDATE backoff SET failures = 0, rate_factor = ? WHERE key = ?", (factor, key))
+
+    def call(self, provider, model, fn, cost=None, lane=INTERACTIVE, actual_cost=None):
+        """Run fn() within the provider's quota, retrying rate limits and transient failures.
+
+        cost is the estimated charge, e.g. {'requests': 1, 'tokens': 1200};
+        actual_cost(result) may return the real one to settle the difference.
+        """
+        cost = {'requests': 1, **(cost or {})}
+        deadline = time.time() + self.max_wait[lane]
+        attempt = 0
+        while True:
+            self.acquire(provider, model, cost, lane, deadline)
+            try:
+                result = fn()
+            except Exception as e:
+                error = error_from_exception(provider, e)
+                if not isinstance(error, (RateLimitedError, UpstreamUnavailableError)) or attempt >= self.max_retries:
+                    raise error from e
+                attempt += 1
+                UPSTREAM_RETRIES.inc(provider=provider, reason='rate_limited' if isinstance(error, RateLimitedError) else 'unavailable')
+                if isinstance(error, RateLimitedError):
+                    self.record_rate_limited(provider, model, error.retry_after)
+                else:
+                    time.sleep(min(self.max_backoff, 2 ** attempt) * random.uniform(0.5, 1.0))
+                continue
+
+            self.record_success(provider, model)
+            if actual_cost:
+                actual = actual_cost(result) or {}
+                difference = {unit: actual[unit] - cost.get(unit, 0) for unit in actual if actual[unit] is not None}
+                if any(difference.values()):
+                    self.adjust(provider, model, difference)
+            return result
+
+
+# Subtract from a bucket only if it exists, like the UPDATE in UpstreamScheduler.adjust
+REDIS_ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBYFLOAT', KEYS[1], 'level', -tonumber(ARGV[1]))
+end
+"""
+
+
+class RedisUpstreamScheduler(UpstreamScheduler):
+    """UpstreamScheduler with its buckets in Redis, for API and worker processes on several hosts."""
+
+    def __init__(self, url, limits=None, prefix='vidiwise', **settings):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RedisUpstreamScheduler requires the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.bucket_prefix = f"{prefix}:upstream:bucket:"
+        self.backoff_prefix = f"{prefix}:upstream:backoff:"
+        self.adjust_script = self.client.register_script(REDIS_ADJUST_SCRIPT)
+        super().__init__(None, limits, **settings)
+
+    def create_tables(self):
+        pass
+
+    def watch(self, keys, apply):
+        """Run apply(pipe) in an optimistic WATCH/MULTI transaction; apply calls pipe.multi() before writing."""
+        import redis
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*keys)
+                    result = apply(pipe)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+    def get_backoff(self, pipe, key):
+        data = pipe.hgetall(self.backoff_prefix + key)
+        if not data:
+            return None
+        return {'until': float(data['until']), 'failures': int(data['failures']),
+                'rate_factor': float(data['rate_factor'])}
+
+    def try_acquire(self, key, limits, cost, lane, dry_run=False):
+        bucket_keys = [f"{self.bucket_prefix}{key}:{quota}" for quota in limits]
+
+        def apply(pipe):
+            now = time.time()
+            state = self.get_backoff(pipe, key)
+            if state and state['until'] > now:
+                return state['until'] - now
+            factor = state['rate_factor'] if state else 1.0
+
+            def read_bucket(bucket_key):
+                data = pipe.hgetall(self.bucket_prefix + bucket_key)
+                return (float(data['level']), float(data['updated_at'])) if data else None
+            wait, levels = self.take(key, limits, cost, lane, factor, now, read_bucket)
+            if wait or dry_run:
+                return wait
+            pipe.multi()
+            for bucket_key, level in levels:
+                pipe.hset(self.bucket_prefix + bucket_key, mapping={'level': level, 'updated_at': now})
+            return 0.0
+        return self.watch([self.backoff_prefix + key, *bucket_keys], apply)
+
+    def adjust(self, provider, model, cost):
+        for quota in self.limits_for(provider, model):
+            unit, _ = QUOTA_UNITS[quota]
+            if cost.get(unit):
+                self.adjust_script(keys=[f"{self.bucket_prefix}{provider}:{model}:{quota}"], args=[cost[unit]])
+
+    def record_rate_limited(self, provider, model, retry_after=None):
+        key = f"{provider}:{model}"
+
+        def apply(pipe):
+            failures, factor, delay = self.next_backoff(self.get_backoff(pipe, key), retry_after)
+            pipe.multi()
+            pipe.hset(self.backoff_prefix + key, mapping={
+                'until': time.time() + delay, 'failures': failures, 'rate_factor': factor})
+            return factor, delay
+        factor, delay = self.watch([self.backoff_prefix + key], apply)
+        logger.warning(f"{key} rate limited, backing off {delay:.1f}s at {factor:.0%} of the configured rate")
+
+    def record_success(self, provider, model):
+        key = f"{provider}:{model}"
+        if not self.client.exists(self.backoff_prefix + key):
+            return
+
+        def apply(pipe):
+            state = self.get_backoff(pipe, key)
+            if state is None:
+                return
+            factor = min(1.0, state['rate_factor'] + 0.05)
+            pipe.multi()
+            if factor >= 1.0:
+                pipe.delete(self.backoff_prefix + key)
+            else:
+                pipe.hset(self.backoff_prefix + key, mapping={'failures': 0, 'rate_factor': factor})
+        self.watch([self.backoff_prefix + key], apply)
+
+
+scheduler = None
+scheduler_lock = threading.Lock()
+
+
+def get_upstream_scheduler():
+    """Process-wide scheduler, limits from VIDIWISE_UPSTREAM_LIMITS.
+
+    Buckets live in Redis when VIDIWISE_QUEUE_URL points at one, so processes on
+    several hosts share them; otherwise in OUTPUT_DIR/upstream.db, which is only
+    safe for processes on one host.
+    """
+    global scheduler
+    with scheduler_lock:
+        if scheduler is None:
+            from services.video_utils import OUTPUT_DIR
+            limits = dict(DEFAULT_LIMITS)
+            if os.getenv("VIDIWISE_UPSTREAM_LIMITS"):
+                limits.update(json.loads(os.getenv("VIDIWISE_UPSTREAM_LIMITS")))
+            url = os.getenv("VIDIWISE_QUEUE_URL") or ''
+            if url.startswith(REDIS_URL_SCHEMES):
+                scheduler = RedisUpstreamScheduler(url, limits)
+            else:
+                scheduler = UpstreamScheduler(os.path.join(OUTPUT_DIR, 'upstream.db'), limits)
+    return scheduler
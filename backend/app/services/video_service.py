@@ -1,9 +1,6 @@
-import yt_dlp
 import os
-from groq import Groq
 import cv2
 import numpy as np
-import pytesseract
 from datetime import timedelta
 import logging
 import subprocess
@@ -14,24 +11,47 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections import defaultdict
 import hashlib
 import re
+import difflib
+import threading
+from services.checkpoint_service import CheckpointManager
+from services.frame_store import FrameStore
+from services.job_queue import JobCancelled
+from services.upstream import RateLimitedError
+from services.video_utils import OUTPUT_DIR, get_video_id
+from services.profiler import SamplingProfiler, PIPELINE_THREAD_PREFIX
+from services.metrics import STAGE_SECONDS, JOBS, JOB_RESULTS, FRAMES, OCR_CALLS
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
 class VideoService:
-    def __init__(self):
-        self.ffmpeg_path = r'C:/ffmpeg/bin/ffmpeg.exe'
-        self.base_output_dir = 'video_findings'
+    def __init__(self, queue_depth=None):
+        self.ffmpeg_path = os.getenv("FFMPEG_PATH", r'C:/ffmpeg/bin/ffmpeg.exe')
+        self.base_output_dir = OUTPUT_DIR
         self.current_video_dir = None
-        
-        # Initialize Groq client for speech-to-text
-        self.groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.process_lock = threading.Lock()
+        # Callable returning the number of queued jobs, used to route transcription
+        self.queue_depth = queue_depth
+        self._transcriber = None
         
         self.max_frames = 50
         self.similarity_threshold = 0.80
         self.scene_threshold = 30.0
         self.hash_threshold = 10
         self.final_max_frames = 15
+        self.ocr_line_similarity = 0.85
+        self.ocr_similarity_threshold = 0.85
+        self.ocr_dedup_window = 3
+        self.frame_format = os.getenv("VIDIWISE_FRAME_FORMAT", "jpg")
+        self.frame_sprite = os.getenv("VIDIWISE_FRAME_SPRITE", "false").lower() in ("1", "true", "yes")
+
+    @property
+    def transcriber(self):
+        """Speech-to-text router (Groq and optional local Whisper), created on first transcription."""
+        if self._transcriber is None:
+            from services.transcription import create_transcription_router
+            self._transcriber = create_transcription_router(self.queue_depth, self.ffmpeg_path)
+        return self._transcriber
 
     def create_unique_folder(self, url):
         """Create unique folder name based on video URL."""
@@ -130,6 +150,8 @@ class VideoService:
         scene_frames = []
         prev_hist = None
         frame_count = 0
+        sampled_count = 0
+        scene_change_count = 0
         
         fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -159,6 +181,7 @@ class VideoService:
                 frame_count += 1
                 continue
                 
+            sampled_count += 1
             hist = cv2.calcHist([frame], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
             hist = cv2.normalize(hist, hist).flatten()
             
@@ -168,7 +191,7 @@ class VideoService:
                 correlation = cv2.compareHist(hist, prev_hist, cv2.HISTCMP_CORREL)
                 if correlation < (1.0 - self.scene_threshold / 100.0):
                     scene_frames.append((frame.copy(), timestamp))
-                    logger.info(f"Scene change detected at {timestamp/1000:.2f}s")
+                    scene_change_count += 1
             else:
                 scene_frames.append((frame.copy(), timestamp))
                 
@@ -180,6 +203,13 @@ class VideoService:
                 
         cap.release()
         
+        # Aggregate per-frame outcomes instead of logging each frame
+        FRAMES.inc(frame_count, outcome='decoded')
+        FRAMES.inc(sampled_count, outcome='sampled')
+        FRAMES.inc(scene_change_count, outcome='scene_change')
+        logger.info(f"Scene detection: {frame_count} frames decoded, {sampled_count} sampled, "
+                    f"{scene_change_count} scene changes")
+        
         if len(scene_frames) < 10:
             logger.info("Few scene changes detected, adding interval-based frames")
             additional_frames = self.get_interval_frames(video_path, 10 - len(scene_frames))
@@ -249,12 +279,13 @@ class VideoService:
             for existing_frame in unique_frames:
                 if self.are_frames_similar_fast(frame_data, existing_frame):
                     is_unique = False
-                    logger.debug(f"Frame at {frame_data['timestamp']/1000:.2f}s rejected as similar")
                     break
             
             if is_unique:
                 unique_frames.append(frame_data)
-                logger.info(f"Frame at {frame_data['timestamp']/1000:.2f}s accepted as unique")
+        
+        FRAMES.inc(len(unique_frames), outcome='accepted')
+        FRAMES.inc(len(processed_frames) - len(unique_frames), outcome='rejected_similar')
         
         if len(unique_frames) > self.final_max_frames:
             logger.info(f"Still {len(unique_frames)} frames, applying final clustering to get {self.final_max_frames}")
@@ -300,7 +331,7 @@ class VideoService:
         logger.info(f"Processing {len(scene_frames)} frames in parallel")
         processed_frames = []
         
-        with ThreadPoolExecutor(max_workers=4) as executor:
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"{PIPELINE_THREAD_PREFIX}features") as executor:
             future_to_frame = {executor.submit(self.process_frame_parallel, frame_data): frame_data 
                              for frame_data in scene_frames}
             
@@ -357,6 +388,7 @@ class VideoService:
             'no_warnings': True,
         }
         try:
+            import yt_dlp
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 logger.info("Attempting to extract video info and download...")
                 info = ydl.extract_info(url, download=True)
@@ -412,71 +444,132 @@ class VideoService:
                 raise Exception(f"Video download failed: {error_msg}")
 
     def perform_ocr(self, frame):
+        import pytesseract
+        OCR_CALLS.inc()
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         text = pytesseract.image_to_string(gray)
         return text.strip()
 
-    def save_keyframes(self, frames, timestamps):
-        """Save keyframes to unique video folder."""
-        frames_dir = os.path.join(self.current_video_dir, 'frames')
-        os.makedirs(frames_dir, exist_ok=True)
-        frame_data = []
-        
+    def write_keyframes(self, frames, timestamps):
+        """Queue keyframes for writing to the unique video folder; returns (store, frame records).
+
+        The files are written in the background; store.close() waits for them.
+        """
+        store = FrameStore(self.current_video_dir, format=self.frame_format, sprite=self.frame_sprite)
+        return store, [store.put(frame, timestamp) for frame, timestamp in zip(frames, timestamps)]
+
+    def ocr_keyframes(self, frame_records, frames=None):
+        """Run OCR on keyframes, reading them back from disk when not in memory."""
         def process_frame_ocr(args):
-            i, frame, timestamp = args
-            path = os.path.join(frames_dir, f'frame_{i}.jpg')
-            cv2.imwrite(path, frame)
-            ocr_text = self.perform_ocr(frame)
+            record, frame = args
+            if frame is None:
+                frame = cv2.imread(record['path'])
+            ocr_text = self.perform_ocr(frame) if frame is not None else ''
             return {
-                'path': path,
-                'timestamp': timestamp,
+                'path': record['path'],
+                'timestamp': record['timestamp'],
                 'ocr_text': ocr_text
             }
         
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            args_list = [(i, frame, timestamp) for i, (frame, timestamp) in enumerate(zip(frames, timestamps))]
-            results = list(executor.map(process_frame_ocr, args_list))
-            frame_data = results
-        
-        return frame_data
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"{PIPELINE_THREAD_PREFIX}ocr") as executor:
+            args_list = list(zip(frame_records, frames or [None] * len(frame_records)))
+            return list(executor.map(process_frame_ocr, args_list))
 
-    def transcribe_audio(self, audio_file):
-        """Transcribe audio using Groq's distil-whisper-large-v3-en"""
+    def save_keyframes(self, frames, timestamps):
+        """Save keyframes to unique video folder and OCR them while they are written."""
+        store, frame_records = self.write_keyframes(frames, timestamps)
         try:
-            logger.info(f"Starting Groq transcription for: {audio_file}")
-            
-            with open(audio_file, "rb") as file:
-                transcription = self.groq_client.audio.transcriptions.create(
-                    file=file,
-                    model="distil-whisper-large-v3-en",
-                    response_format="verbose_json",  # Get timestamps
-                    temperature=0.0
-                )
-            
-            # Convert Groq response to match existing code format
-            segments = []
-            if hasattr(transcription, 'segments') and transcription.segments:
-                for segment in transcription.segments:
-                    segments.append({
-                        'start': segment.get('start', 0),
-                        'end': segment.get('end', 0), 
-                        'text': segment.get('text', '')
-                    })
+            return self.ocr_keyframes(frame_records, frames)
+        finally:
+            store.close()
+
+    def transcribe_audio(self, audio_file):
+        """Transcribe audio with the routed ASR backend; raises when every backend fails."""
+        logger.info(f"Starting transcription for: {audio_file}")
+        segments = self.transcriber.transcribe(audio_file)
+        logger.info(f"Transcription completed successfully. {len(segments)} segments found.")
+        return segments
+
+    def normalize_ocr_line(self, line):
+        """Normalize an OCR line for comparison (case, punctuation, whitespace)."""
+        return ' '.join(re.findall(r'\w+', line.lower()))
+
+    def ocr_line_matches(self, line, lines):
+        """Whether a normalized line matches any of lines, allowing for OCR character errors."""
+        if line in lines:
+            return True
+        for other in lines:
+            matcher = difflib.SequenceMatcher(None, line, other, autojunk=False)
+            if matcher.real_quick_ratio() >= self.ocr_line_similarity and \
+                    matcher.quick_ratio() >= self.ocr_line_similarity and \
+                    matcher.ratio() >= self.ocr_line_similarity:
+                return True
+        return False
+
+    def deduplicate_ocr_frames(self, frame_data):
+        """Merge repeated OCR text across frames and keep only the new lines of build-up slides.
+
+        Lines are compared fuzzily (difflib ratio >= ocr_line_similarity), so
+        a noisy re-read of a slide still counts as the same lines. A frame
+        matches a recent entry when most lines of either one match the other.
+        Lines with no match in the matched entry always become a new entry, so
+        no text is lost to a merge. Only the entry still on screen has its time
+        range extended; a slide shown again after another one gets an extra
+        range instead of one spanning the slides between.
+        """
+        entries = []
+        current = None
+        for frame in sorted(frame_data, key=lambda x: x.get('timestamp') or 0):
+            raw_lines = [line.strip() for line in frame.get('ocr_text', '').splitlines() if line.strip()]
+            lines = [(line, self.normalize_ocr_line(line)) for line in raw_lines]
+            lines = [(line, norm) for line, norm in lines if norm]
+            if not lines:
+                continue
+
+            normalized = [norm for _, norm in lines]
+            timestamp = frame.get('timestamp') or 0
+
+            match, new_lines = None, lines
+            for entry in reversed(entries[-self.ocr_dedup_window:]):
+                unseen = [(line, norm) for line, norm in lines if not self.ocr_line_matches(norm, entry['lines'])]
+                covered = sum(self.ocr_line_matches(norm, normalized) for norm in entry['lines'])
+                if 1 - len(unseen) / len(lines) >= self.ocr_similarity_threshold or \
+                        covered / len(entry['lines']) >= self.ocr_similarity_threshold:
+                    match, new_lines = entry, unseen
+                    break
+
+            if match is None:
+                seen_lines = set(normalized)
             else:
-                # Fallback: create a single segment with full text
-                segments.append({
-                    'start': 0,
-                    'end': 0,
-                    'text': transcription.text if hasattr(transcription, 'text') else ''
-                })
-            
-            logger.info(f"Groq transcription completed successfully. {len(segments)} segments found.")
-            return segments
-            
-        except Exception as e:
-            logger.error(f"Groq transcription failed: {str(e)}")
-            # Return empty segments to prevent crashes
-            return []
+                # Noisy variants are kept too, so later re-reads match them exactly
+                match['lines'].update(normalized)
+                seen_lines = match['lines']
+                if not new_lines:
+                    if match is current:
+                        # Same slide still on screen
+                        match['ranges'][-1][1] = max(match['ranges'][-1][1], timestamp)
+                    else:
+                        match['ranges'].append([timestamp, timestamp])
+                        current = match
+                    continue
+
+            # A new slide, or the lines a build-up slide added; shares the seen lines with the slide it builds on
+            current = {
+                'ranges': [[timestamp, timestamp]],
+                'ocr_text': '\n'.join(dict.fromkeys(line for line, _ in new_lines)),
+                'path': frame.get('path', ''),
+                'lines': seen_lines
+            }
+            entries.append(current)
+
+        logger.info(f"OCR deduplication: {len(frame_data)} frames reduced to {len(entries)} entries")
+        return [{
+            'timestamp': entry['ranges'][0][0],
+            'end_timestamp': entry['ranges'][0][1],
+            'ranges': entry['ranges'],
+            'ocr_text': entry['ocr_text'],
+            'path': entry['path']
+        } for entry in entries]
 
     def combine_data(self, transcript, frame_data):
         logger.info(f"Combining data: {len(transcript)} transcript segments and {len(frame_data)} frames")
@@ -489,12 +582,19 @@ class VideoService:
                 'text': segment.get('text', '')
             })
         
-        for frame in frame_data:
+        raw_ocr_size = sum(len(frame.get('ocr_text', '')) for frame in frame_data)
+        ocr_entries = self.deduplicate_ocr_frames(frame_data)
+        dedup_ocr_size = sum(len(entry['ocr_text']) for entry in ocr_entries)
+        logger.info(f"OCR text size: {raw_ocr_size} chars before dedup, {dedup_ocr_size} chars after")
+
+        for entry in ocr_entries:
             combined_data.append({
                 'type': 'frame',
-                'timestamp': frame.get('timestamp'),
-                'ocr_text': frame.get('ocr_text', ''),
-                'path': frame.get('path', '')
+                'timestamp': entry.get('timestamp'),
+                'end_timestamp': entry.get('end_timestamp'),
+                'ranges': entry.get('ranges'),
+                'ocr_text': entry.get('ocr_text', ''),
+                'path': entry.get('path', '')
             })
         
         combined_data.sort(key=lambda x: x.get('start') or x.get('timestamp') or 0)
@@ -507,64 +607,177 @@ class VideoService:
                 timestamp = timedelta(seconds=item['start'])
                 formatted_data += f"[{timestamp}] Transcript: {item['text']}\n"
             else:
-                timestamp = timedelta(milliseconds=item['timestamp'])
+                ranges = item.get('ranges') or [[item['timestamp'], item.get('end_timestamp') or item['timestamp']]]
+                timestamp = ', '.join(
+                    f"{timedelta(milliseconds=start)} - {timedelta(milliseconds=end)}" if end > start
+                    else f"{timedelta(milliseconds=start)}" for start, end in ranges)
                 formatted_data += f"[{timestamp}] Frame OCR: {item['ocr_text']}\n"
         return formatted_data
 
-    def process_video(self, url):
+    def extract_audio(self, video_file):
+        """Extract audio track from the downloaded video with FFmpeg."""
+        logger.info(f"Extracting audio from {video_file}")
+        audio_file = os.path.join(self.current_video_dir, 'video.mp3')
+        ffmpeg_command = [self.ffmpeg_path, "-i", video_file, "-q:a", "0", "-map", "a", audio_file, "-y"]
+        logger.info(f"Running FFmpeg command: {' '.join(ffmpeg_command)}")
+    
+        result = subprocess.run(ffmpeg_command, capture_output=True, text=True)
+        if result.returncode != 0:
+            logger.error(f"FFmpeg error: {result.stderr}")
+            raise RuntimeError(f"FFmpeg failed to extract audio: {result.stderr}")
+
+        if not os.path.exists(audio_file):
+            raise FileNotFoundError(f"Audio file was not created: {audio_file}")
+
+        logger.info(f"Audio extracted successfully: {audio_file}")
+        return audio_file
+
+    def check_cancelled(self, cancel, stage):
+        if cancel is not None and cancel.is_set():
+            raise JobCancelled(f"Job cancelled before the {stage} stage")
+
+    def process_video(self, url, profile=False, cancel=None):
+        """Run the pipeline for one URL; setting the `cancel` event stops it at the next stage boundary."""
+        # Stages share self.current_video_dir, so runs are serialized
+        JOBS.inc(state='queued')
+        with self.process_lock:
+            JOBS.dec(state='queued')
+            JOBS.inc(state='running')
+            # Set again by create_unique_folder, so the profile never lands in an earlier run's folder
+            self.current_video_dir = None
+            profiler = None
+            if profile and SamplingProfiler.enabled():
+                profiler = SamplingProfiler(thread_id=threading.get_ident()).start()
+            try:
+                result = self._process_video(url, cancel)
+                JOB_RESULTS.inc(result='completed')
+                return result
+            except JobCancelled:
+                JOB_RESULTS.inc(result='cancelled')
+                raise
+            except Exception:
+                JOB_RESULTS.inc(result='failed')
+                raise
+            finally:
+                JOBS.dec(state='running')
+                if profiler:
+                    profiler.stop()
+                    video_dir = self.current_video_dir
+                    if video_dir:
+                        profiler.write(os.path.join(video_dir, 'profile.folded'))
+                    else:
+                        logger.warning(f"Not writing profile for {url}: the job stopped before its folder was created")
+
+    def _process_video(self, url, cancel=None):
+        checkpoints = None
         try:
             logger.info(f"Processing video from URL: {url}")
+            self.check_cancelled(cancel, 'download')
             
             # Create unique folder for this video
             self.create_unique_folder(url)
             logger.info(f"Using folder: {self.current_video_dir}")
             
-            logger.info(f"Downloading video from URL: {url}")
-            video_file = self.download_video(url)
+            checkpoints = CheckpointManager(self.current_video_dir)
+            checkpoints.update_job(url=url, video_id=self.get_video_id(url), status='processing', error=None)
             
-            if not os.path.exists(video_file):
-                raise FileNotFoundError(f"Downloaded video file not found: {video_file}")
-
-            logger.info(f"Extracting audio from {video_file}")
-            audio_file = os.path.join(self.current_video_dir, 'video.mp3')
-            ffmpeg_command = [self.ffmpeg_path, "-i", video_file, "-q:a", "0", "-map", "a", audio_file, "-y"]
-            logger.info(f"Running FFmpeg command: {' '.join(ffmpeg_command)}")
-        
-            result = subprocess.run(ffmpeg_command, capture_output=True, text=True)
-            if result.returncode != 0:
-                logger.error(f"FFmpeg error: {result.stderr}")
-                raise RuntimeError(f"FFmpeg failed to extract audio: {result.stderr}")
-
-            if not os.path.exists(audio_file):
-                raise FileNotFoundError(f"Audio file was not created: {audio_file}")
+            input_hash = checkpoints.compute_hash(url)
+            outputs = checkpoints.get_stage('download', input_hash)
+            if outputs:
+                video_file = outputs['video_file']
+            else:
+                logger.info(f"Downloading video from URL: {url}")
+                with STAGE_SECONDS.time(stage='download'):
+                    video_file = self.download_video(url)
+                
+                if not os.path.exists(video_file):
+                    raise FileNotFoundError(f"Downloaded video file not found: {video_file}")
+                checkpoints.record_stage('download', input_hash, {'video_file': video_file}, files=[video_file])
 
-            logger.info(f"Audio extracted successfully: {audio_file}")
+            self.check_cancelled(cancel, 'audio')
+            input_hash = checkpoints.compute_hash(checkpoints.hash_file(video_file))
+            outputs = checkpoints.get_stage('audio', input_hash)
+            if outputs:
+                audio_file = outputs['audio_file']
+            else:
+                with STAGE_SECONDS.time(stage='audio'):
+                    audio_file = self.extract_audio(video_file)
+                checkpoints.record_stage('audio', input_hash, {'audio_file': audio_file}, files=[audio_file])
 
-            logger.info("Transcribing audio")
-            transcript = self.transcribe_audio(audio_file)
+            self.check_cancelled(cancel, 'transcript')
+            input_hash = checkpoints.compute_hash(checkpoints.hash_file(audio_file))
+            outputs = checkpoints.get_stage('transcript', input_hash)
+            if outputs:
+                transcript = outputs['segments']
+            else:
+                logger.info("Transcribing audio")
+                with STAGE_SECONDS.time(stage='transcript'):
+                    transcript = self.transcribe_audio(audio_file)
+                # Transcription is the longest stage; check again before writing its checkpoint
+                self.check_cancelled(cancel, 'transcript checkpoint')
+                # Upstream failures raise, so whatever came back is a real transcript
+                checkpoints.record_stage('transcript', input_hash, {'segments': transcript})
             logger.info(f"Transcription complete. {len(transcript)} segments found.")
 
-            logger.info("Extracting and saving key frames with optimized method")
-            frames, timestamps = self.extract_keyframes(video_file)
-            if not frames:
-                logger.warning("No frames were extracted from the video. Skipping frame processing.")
-                frame_data = []
+            self.check_cancelled(cancel, 'keyframes')
+            keyframes_hash = checkpoints.compute_hash(
+                checkpoints.hash_file(video_file), self.max_frames, self.final_max_frames,
+                self.similarity_threshold, self.scene_threshold, self.hash_threshold,
+                self.frame_format, self.frame_sprite
+            )
+            outputs = checkpoints.get_stage('keyframes', keyframes_hash)
+            frames = None
+            store = None
+            if outputs:
+                frame_records = outputs['frames']
             else:
-                frame_data = self.save_keyframes(frames, timestamps)
+                logger.info("Extracting and saving key frames with optimized method")
+                with STAGE_SECONDS.time(stage='keyframes'):
+                    frames, timestamps = self.extract_keyframes(video_file)
+                if not frames:
+                    logger.warning("No frames were extracted from the video. Skipping frame processing.")
+                self.check_cancelled(cancel, 'write_frames')
+                with STAGE_SECONDS.time(stage='write_frames'):
+                    store, frame_records = self.write_keyframes(frames, timestamps)
+
+            # Frames are still being written while OCR reads the in-memory copies
+            input_hash = checkpoints.compute_hash(keyframes_hash, frame_records)
+            try:
+                self.check_cancelled(cancel, 'ocr')
+                ocr_outputs = checkpoints.get_stage('ocr', input_hash)
+                if ocr_outputs:
+                    frame_data = ocr_outputs['frame_data']
+                else:
+                    with STAGE_SECONDS.time(stage='ocr'):
+                        frame_data = self.ocr_keyframes(frame_records, frames) if frame_records else []
+            finally:
+                if store:
+                    with STAGE_SECONDS.time(stage='write_frames_wait'):
+                        storage = store.close()
+            self.check_cancelled(cancel, 'combine')
+            if store:
+                # Recorded only now that the files it fingerprints are on disk
+                checkpoints.record_stage('keyframes', keyframes_hash, {'frames': frame_records, 'storage': storage},
+                                         files=store.files())
+            if not ocr_outputs:
+                checkpoints.record_stage('ocr', input_hash, {'frame_data': frame_data})
             logger.info(f"Optimized frame extraction complete. {len(frame_data)} frames processed.")
 
             logger.info("Combining data")
-            combined_data = self.combine_data(transcript, frame_data)
-            logger.info(f"Data combination complete. {len(combined_data)} total items.")
-            
-            logger.info("Preparing combined transcript")
-            combined_transcript = self.prepare_combined_transcript(combined_data)
+            with STAGE_SECONDS.time(stage='combine'):
+                combined_data = self.combine_data(transcript, frame_data)
+                logger.info(f"Data combination complete. {len(combined_data)} total items.")
+                
+                logger.info("Preparing combined transcript")
+                combined_transcript = self.prepare_combined_transcript(combined_data)
             
+            self.check_cancelled(cancel, 'save')
             logger.info("Saving combined transcript")
             transcript_file = os.path.join(self.current_video_dir, 'video_transcript.txt')
             with open(transcript_file, 'w', encoding='utf-8') as f:
                 f.write(combined_transcript)
 
+            checkpoints.update_job(status='completed')
             logger.info("Optimized video processing completed successfully")
             return {
                 "video_file": video_file,
@@ -572,23 +785,17 @@ class VideoService:
                 "transcript_file": transcript_file,
                 "video_folder": self.current_video_dir
             }
+        except JobCancelled:
+            # The job may already belong to another worker, so its status is left to that one
+            logger.warning(f"Stopped processing {url}: job cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error processing video: {str(e)}", exc_info=True)
+            if checkpoints:
+                # A rate-limited job is requeued, so it is not recorded as failed
+                checkpoints.update_job(status='queued' if isinstance(e, RateLimitedError) else 'failed', error=str(e))
             raise
             
     def get_video_id(self, url):
         """Extract video ID from YouTube URL."""
-        try:
-            if 'youtu.be' in url:
-                return url.split('/')[-1]
-            elif 'watch?v=' in url:
-                return url.split('watch?v=')[-1].split('&')[0]
-            elif 'shorts' in url:
-                return url.split('/')[-1]
-            else:
-                return url.split('/')[-1]
-        except Exception as e:
-            logger.error(f"Error extracting video ID: {e}")
-            raise
-
-video_service = VideoService()
\ No newline at end of file
+        return get_video_id(url)
@@ -0,0 +1,48 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Kept free of media libraries so the API can use it without loading the pipeline.
+# Point VIDIWISE_DATA_DIR at shared storage when API and workers run on separate nodes.
+OUTPUT_DIR = os.getenv("VIDIWISE_DATA_DIR", 'video_findings')
+
+
+def get_video_id(url):
+    """Extract video ID from YouTube URL."""
+    try:
+        if 'youtu.be' in url:
+            return url.split('/')[-1]
+        elif 'watch?v=' in url:
+            return url.split('watch?v=')[-1].split('&')[0]
+        elif 'shorts' in url:
+            return url.split('/')[-1]
+        else:
+            return url.split('/')[-1]
+    except Exception as e:
+        logger.error(f"Error extracting video ID: {e}")
+        raise
+
+
+def expand_playlist(url):
+    """List (video_id, url) for every video in a playlist or channel without downloading them."""
+    import yt_dlp
+
+    ydl_opts = {'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist', 'skip_download': True}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    videos = []
+    pending = [info]
+    while pending:
+        entry = pending.pop(0)
+        if not entry:
+            continue
+        # Channels nest one playlist per tab (Videos, Shorts, ...)
+        if entry.get('_type') in ('playlist', 'multi_video') or entry.get('entries') is not None:
+            pending.extend(entry.get('entries') or [])
+        elif entry.get('_type') == 'url' and entry.get('ie_key') in ('YoutubeTab', 'YoutubePlaylist'):
+            videos.extend(expand_playlist(entry['url']))
+        elif entry.get('id'):
+            videos.append((entry['id'], entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}"))
+    return videos
@@ -0,0 +1,146 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from services.gemini_service import GeminiChatbot
+from services.checkpoint_service import CheckpointManager
+from services.upstream import BACKGROUND, UpstreamError, RateLimitedError
+from services.job_queue import JobCancelled
+
+logger = logging.getLogger(__name__)
+
+TITLE_PROMPT = "Based on this video transcript, generate a concise, descriptive title (maximum 80 characters) that captures the main topic. Return only the title, nothing else."
+SUMMARY_PROMPT = "Generate a summary in 1 short paragraphs. DO NOT include any output like 'here is the summary', 'here's a summary', 'this video', 'the video shows', or any introductory text. Just give me the summary content directly, no extra trash text."
+
+
+class Worker:
+    """Leases jobs from the queue and runs them through the video pipeline."""
+
+    def __init__(self, job_queue, video_service_factory, worker_id=None,
+                 lease_seconds=300, heartbeat_interval=30, poll_interval=2, search_index=None):
+        self.job_queue = job_queue
+        self.video_service_factory = video_service_factory
+        self.search_index = search_index
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def generate_metadata(self, video_folder):
+        """Generate title and summary from the transcript."""
+        transcript_path = os.path.join(video_folder, "video_transcript.txt")
+        if not os.path.exists(transcript_path):
+            return None
+        # Own instance so concurrent chats keep their own transcript
+        chatbot = GeminiChatbot(os.getenv("GEMINI_API_KEY", "dummy_key"))
+        if not chatbot.read_transcript(transcript_path):
+            return None
+        try:
+            title = chatbot.send_message(TITLE_PROMPT, lane=BACKGROUND)
+            summary = chatbot.send_message(SUMMARY_PROMPT, lane=BACKGROUND)
+        except UpstreamError as e:
+            # The video is still usable; it keeps the default title until metadata is regenerated
+            logger.error(f"Error generating metadata for {video_folder}: {str(e)}")
+            return None
+        return {
+            "title": title.strip(),
+            "summary": summary.strip(),
+            "auto_generated": True
+        }
+
+    def process_job(self, job, lost=None):
+        """Run one job; returns (video_folder, metadata). Raises JobCancelled once `lost` is set."""
+        payload = job.get("payload") or {}
+        result = self.video_service_factory().process_video(job["url"], profile=payload.get("profile", False),
+                                                            cancel=lost)
+        video_folder = result.get("video_folder")
+
+        metadata = None
+        if not job.get("metadata"):
+            metadata = self.generate_metadata(video_folder)
+            if lost is not None and lost.is_set():
+                raise JobCancelled(f"Lease on job {job['id']} lost before saving metadata")
+            if metadata:
+                CheckpointManager(video_folder).update_job(metadata=metadata)
+                logger.info(f"Generated metadata for video {job['id']}")
+
+        transcript_path = os.path.join(video_folder, "video_transcript.txt")
+        if self.search_index and os.path.exists(transcript_path):
+            # A stale search entry is not worth failing (and reprocessing) the video for
+            try:
+                self.search_index.index_transcript(job["id"], transcript_path)
+            except Exception as e:
+                logger.error(f"Error indexing video {job['id']} for search: {str(e)}")
+        return video_folder, metadata
+
+    def heartbeat(self, video_id, done, lost):
+        """Renew the lease until done; set `lost` once another worker may have taken the job."""
+        renewed = time.time()
+        while not done.wait(self.heartbeat_interval):
+            try:
+                if self.job_queue.heartbeat(video_id, self.worker_id, self.lease_seconds):
+                    renewed = time.time()
+                    continue
+                logger.warning(f"Worker {self.worker_id} lost lease on job {video_id}, stopping it")
+            except Exception as e:
+                # The broker may be briefly unreachable; give up only once the lease can have expired
+                logger.warning(f"Worker {self.worker_id} could not renew lease on job {video_id}: {str(e)}")
+                if time.time() - renewed + self.heartbeat_interval < self.lease_seconds:
+                    continue
+                logger.warning(f"Lease on job {video_id} may have expired, stopping it")
+            lost.set()
+            return
+
+    def run_once(self):
+        """Lease and run one job; returns False when the queue had nothing runnable."""
+        job = self.job_queue.lease(self.worker_id, self.lease_seconds)
+        if not job:
+            return False
+
+        video_id = job["id"]
+        logger.info(f"Worker {self.worker_id} processing video {video_id} (attempt {job['attempts']})")
+        done, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(video_id, done, lost), daemon=True)
+        heartbeat.start()
+        try:
+            video_folder, metadata = self.process_job(job, lost)
+            self.job_queue.complete(video_id, self.worker_id, video_folder=video_folder, metadata=metadata)
+            logger.info(f"Video {video_id} processed successfully in folder: {video_folder}")
+        except JobCancelled as e:
+            # The job is redelivered (or already running elsewhere); failing it would take it from the new owner
+            logger.warning(f"Worker {self.worker_id} abandoned job {video_id}: {str(e)}")
+        except RateLimitedError as e:
+            # Waiting for quota is not the video's fault, so it keeps its attempts
+            logger.warning(f"Deferring job {video_id} for {e.retry_after or self.job_queue.retry_backoff:.0f}s: {str(e)}")
+            self.job_queue.defer(video_id, self.worker_id, e.retry_after, str(e))
+        except Exception as e:
+            logger.error(f"Error processing job {video_id}: {str(e)}")
+            self.job_queue.fail(video_id, self.worker_id, str(e))
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def run(self):
+        logger.info(f"Worker {self.worker_id} started")
+        while not self.stop_event.is_set():
+            try:
+                if not self.run_once():
+                    self.stop_event.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} error: {str(e)}")
+                self.stop_event.wait(self.poll_interval)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def start(self):
+        """Run in a background thread (inline workers inside the API process)."""
+        self.thread = threading.Thread(target=self.run, name=f"worker-{self.worker_id}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,162 @@
+"""Load test for /process-video, /video-status and /start-chat.
+
+Usage:
+    python benchmarks/bench_api.py --concurrency 16 --videos 8 --requests 2000
+
+Runs the FastAPI app in-process under uvicorn with stub Groq/Gemini
+endpoints and a synthetic video in place of YouTube downloads, then
+drives each endpoint at the requested concurrency.
+"""
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import find_ffmpeg, install_unlimited_scheduler, percentiles, save_results
+from stub_servers import StubServer
+from synthetic_media import generate_video
+
+
+def start_app(source_video, port):
+    """Import main with a VideoService whose download copies the synthetic video.
+
+    Runs from a scratch directory so video_findings and restored jobs are isolated.
+    """
+    import uvicorn
+    os.chdir(tempfile.mkdtemp(prefix="vidiwise-api-bench-"))
+    import main
+    from services.video_service import VideoService
+
+    class BenchVideoService(VideoService):
+        def download_video(self, url):
+            target = os.path.join(self.current_video_dir, "video.mp4")
+            shutil.copyfile(source_video, target)
+            return target
+
+    main.video_service = BenchVideoService()
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, os.getcwd()
+
+
+def drive(name, request_fn, total, concurrency):
+    """Issue total requests with concurrency workers and collect latencies."""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        nonlocal errors
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = request_fn(local.session, i)
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - wall_start
+
+    result = {"latency": percentiles(latencies), "errors": errors, "wall_s": wall,
+              "throughput_rps": total / wall if wall else 0}
+    print(f"{name:<14} {total} requests, {result['throughput_rps']:.1f} req/s, "
+          f"p50 {result['latency'].get('p50_ms', 0):.1f}ms, p99 {result['latency'].get('p99_ms', 0):.1f}ms, "
+          f"{errors} errors")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the VidiWise API")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--videos", type=int, default=4, help="Distinct videos submitted to /process-video")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per status/chat phase")
+    parser.add_argument("--duration", type=float, default=30, help="Synthetic video length in seconds")
+    parser.add_argument("--stub-latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--job-timeout", type=float, default=600)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    work_dir = tempfile.mkdtemp(prefix="vidiwise-media-")
+    output_dir = None
+    try:
+        video = generate_video(os.path.join(work_dir, "synthetic.mp4"), duration=args.duration)
+
+        with StubServer(latency=args.stub_latency) as stub:
+            os.environ["GROQ_API_KEY"] = "stub-key"
+            os.environ["GEMINI_API_KEY"] = "stub-key"
+            os.environ["GROQ_BASE_URL"] = stub.base_url
+            os.environ["GEMINI_API_BASE"] = stub.base_url
+            os.environ["FFMPEG_PATH"] = find_ffmpeg()
+            install_unlimited_scheduler(work_dir)
+
+            server, output_dir = start_app(video["path"], args.port)
+            base = f"http://127.0.0.1:{args.port}"
+            video_ids = [f"load{i}" for i in range(args.videos)]
+            results = {}
+
+            results["process_video"] = drive(
+                "process-video",
+                lambda s, i: s.post(f"{base}/process-video",
+                                    json={"url": f"https://youtu.be/{video_ids[i]}"}).ok,
+                len(video_ids), args.concurrency)
+
+            # Jobs complete in the background; measure time until all are done
+            jobs_start = time.perf_counter()
+            pending = set(video_ids)
+            while pending and time.perf_counter() - jobs_start < args.job_timeout:
+                for video_id in list(pending):
+                    status = requests.get(f"{base}/video-status/{video_id}").json()["status"]
+                    if status in ("completed", "failed"):
+                        pending.discard(video_id)
+                time.sleep(0.5)
+            jobs_wall = time.perf_counter() - jobs_start
+            results["jobs"] = {"completed": len(video_ids) - len(pending), "timed_out": len(pending),
+                               "wall_s": jobs_wall, "jobs_per_minute": 60 * len(video_ids) / jobs_wall}
+            print(f"jobs           {results['jobs']['completed']} completed in {jobs_wall:.1f}s")
+
+            results["video_status"] = drive(
+                "video-status",
+                lambda s, i: s.get(f"{base}/video-status/{random.choice(video_ids)}").ok,
+                args.requests, args.concurrency)
+
+            stub.stats.reset()
+            results["start_chat"] = drive(
+                "start-chat",
+                lambda s, i: s.post(f"{base}/start-chat", json={"videoId": random.choice(video_ids),
+                                                               "message": f"Question {i} about caching?"}).ok,
+                args.requests, args.concurrency)
+            results["start_chat"]["upstream"] = stub.stats.snapshot()
+
+            server.should_exit = True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if output_dir:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    save_results("api", {"config": vars(args), "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
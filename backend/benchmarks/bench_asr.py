@@ -0,0 +1,88 @@
+"""Real-time factor of the local CPU transcription backend.
+
+Usage:
+    python benchmarks/bench_asr.py --audio lecture.mp3 --workers 1,2,4,8
+    python benchmarks/bench_asr.py --minutes 10 --model distil-small.en --compute-type int8 --groq
+
+Transcribes one file with LocalWhisperBackend (faster-whisper) at each
+worker count and reports wall time, real-time factor (wall / audio, lower is
+better), speed (audio / wall) and peak RSS; model load time is reported
+separately. Pass a real speech recording with --audio: without it a
+synthetic speech-like track is used, which exercises the decoder but
+produces no words. --groq also times the same file on Groq (needs
+GROQ_API_KEY and counts against its quota).
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from common import peak_rss_mb, save_results
+from synthetic_media import write_speechlike
+
+
+def measure(backend, audio_file, duration):
+    start = time.perf_counter()
+    segments = backend.transcribe(audio_file, duration)
+    wall = time.perf_counter() - start
+    return {
+        "wall_s": wall,
+        "rtf": wall / duration,
+        "speed_x": duration / wall,
+        "segments": len(segments),
+        "words": sum(len(segment["text"].split()) for segment in segments),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CPU transcription throughput as a real-time factor")
+    parser.add_argument("--audio", help="Speech recording to transcribe (default: synthetic)")
+    parser.add_argument("--minutes", type=float, default=5, help="Length of the synthetic track")
+    parser.add_argument("--model", default="distil-small.en")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated parallel chunk counts")
+    parser.add_argument("--chunk-seconds", type=float, default=60)
+    parser.add_argument("--groq", action="store_true", help="Also time the file on Groq")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    from services.transcription import LocalWhisperBackend, GroqBackend, audio_duration
+    if not LocalWhisperBackend().available():
+        sys.exit("faster-whisper is not installed: pip install faster-whisper")
+
+    audio_file = args.audio
+    if not audio_file:
+        audio_file = os.path.join(tempfile.mkdtemp(prefix="vidiwise-asr-bench-"), "speech.wav")
+        write_speechlike(audio_file, args.minutes * 60)
+    duration = audio_duration(audio_file)
+    print(f"Audio: {audio_file} ({duration:.0f}s), model {args.model} ({args.compute_type}), "
+          f"{os.cpu_count()} cores")
+
+    results = {}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        backend = LocalWhisperBackend(model=args.model, compute_type=args.compute_type, workers=workers,
+                                      chunk_seconds=args.chunk_seconds)
+        # Load (and on first use download) the model outside the timed run
+        start = time.perf_counter()
+        backend.model
+        load_s = time.perf_counter() - start
+        results[f"local_{workers}"] = {"workers": workers, "cpu_threads": backend.cpu_threads, "load_s": load_s,
+                                       **measure(backend, audio_file, duration)}
+    if args.groq:
+        results["groq"] = measure(GroqBackend(), audio_file, duration)
+
+    print(f"{'backend':<12}{'threads':>9}{'load':>8}{'wall':>9}{'RTF':>8}{'speed':>8}{'words':>8}{'RSS':>9}")
+    for name, r in results.items():
+        threads = f"{r['workers']}x{r['cpu_threads']}" if "workers" in r else "-"
+        load = f"{r['load_s']:.1f}s" if "load_s" in r else "-"
+        print(f"{name:<12}{threads:>9}{load:>8}{r['wall_s']:>8.1f}s{r['rtf']:>8.3f}{r['speed_x']:>7.1f}x"
+              f"{r['words']:>8}{r['peak_rss_mb']:>7.0f}MB")
+
+    save_results("asr", {"config": vars(args), "audio_seconds": duration, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
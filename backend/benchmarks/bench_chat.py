@@ -0,0 +1,146 @@
+"""Bytes and tokens sent to Gemini per turn over a multi-turn chat.
+
+Usage:
+    python benchmarks/bench_chat.py --turns 10 --minutes 30 --answer-words 120
+
+Runs the same conversation against the stub Gemini API three ways:
+  stateless       every turn re-sends the transcript and no history (the old /start-chat)
+  session_inline  ChatService sessions with the transcript sent inline each turn
+  session_cached  ChatService sessions with the transcript in a context cache
+and reports request bytes, prompt tokens and cached tokens per turn,
+including cache creation and history summarization requests.
+"""
+
+import os
+import random
+import argparse
+import tempfile
+from datetime import timedelta
+
+from common import install_unlimited_scheduler, save_results
+from stub_servers import StubServer
+
+QUESTIONS = [
+    "What is this video about?",
+    "Which caching strategies are compared?",
+    "What did the speaker say about queue latency?",
+    "Can you go into more detail on the second point?",
+    "What numbers were shown on the slides?",
+    "How does that relate to what was said at the start?",
+    "Were any trade-offs mentioned?",
+    "Summarize the part about retries.",
+    "What would you recommend based on the video?",
+    "What was the conclusion?",
+    "Which tools were named?",
+    "Anything about monitoring?",
+]
+WORDS = ("cache queue latency budget worker lease retry backoff throughput memory disk index "
+         "request token stream batch shard replica metric alert deploy rollout").split()
+
+
+def write_transcript(path, minutes, seed):
+    """Transcript in the video_transcript.txt format: a segment every 5s and slide OCR every 30s."""
+    rng = random.Random(seed)
+    lines = ["Video Content:", ""]
+    for second in range(0, minutes * 60, 5):
+        lines.append(f"[{timedelta(seconds=second)}] Transcript: {' '.join(rng.choices(WORDS, k=14))}.")
+        if second % 30 == 0:
+            lines.append(f"[{timedelta(seconds=second)} - {timedelta(seconds=second + 25)}] Frame OCR: "
+                         f"{' '.join(rng.choices(WORDS, k=8)).title()}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return os.path.getsize(path)
+
+
+def token_totals():
+    from services.metrics import UPSTREAM_TOKENS
+    totals = {}
+    for kind in ("prompt", "cached", "output"):
+        totals[kind] = sum(UPSTREAM_TOKENS.get(provider="gemini", operation=operation, kind=kind)
+                           for operation in ("generate", "chat", "summarize", "cache"))
+    return totals
+
+
+def run_mode(mode, stub, transcript_path, turns, workdir):
+    from services.gemini_service import GeminiChatbot
+    from services.chat_service import ChatService, ChatSessionStore
+
+    chatbot = GeminiChatbot("stub-key")
+    service = None
+    if mode != "stateless":
+        store = ChatSessionStore(os.path.join(workdir, f"{mode}.db"))
+        service = ChatService(chatbot, store, min_cache_tokens=10 ** 9 if mode == "session_inline" else 4096)
+
+    per_turn = []
+    session_id = None
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        stub.stats.reset()
+        before = token_totals()
+        if service:
+            reply = service.send("bench-video", transcript_path, question, session_id=session_id)
+            session_id = reply["session_id"]
+            history_tokens = reply["usage"]["history_tokens"]
+        else:
+            chatbot.read_transcript(transcript_path)
+            chatbot.send_message(question)
+            history_tokens = 0
+        after = token_totals()
+        upstream = stub.stats.snapshot()
+        per_turn.append({
+            "turn": turn + 1,
+            "request_bytes": sum(upstream["request_bytes"].values()),
+            "requests": upstream["requests"],
+            "prompt_tokens": after["prompt"] - before["prompt"],
+            "cached_tokens": after["cached"] - before["cached"],
+            "history_tokens": history_tokens
+        })
+    return per_turn
+
+
+def summarize(per_turn):
+    return {
+        "request_bytes_total": sum(t["request_bytes"] for t in per_turn),
+        "prompt_tokens_total": sum(t["prompt_tokens"] for t in per_turn),
+        "cached_tokens_total": sum(t["cached_tokens"] for t in per_turn),
+        "uncached_prompt_tokens_total": sum(t["prompt_tokens"] - t["cached_tokens"] for t in per_turn),
+        "request_bytes_last_turn": per_turn[-1]["request_bytes"],
+        "max_history_tokens": max(t["history_tokens"] for t in per_turn)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-turn upstream bytes and tokens for chat")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--minutes", type=int, default=30, help="Length of the synthetic video")
+    parser.add_argument("--answer-words", type=int, default=120, help="Length of stub answers")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vidiwise-chat-bench-")
+    transcript_path = os.path.join(workdir, "video_transcript.txt")
+    transcript_bytes = write_transcript(transcript_path, args.minutes, args.seed)
+    print(f"Transcript: {transcript_bytes} bytes (~{transcript_bytes // 4} tokens)")
+
+    results = {}
+    with StubServer(latency=args.latency, answer_words=args.answer_words) as stub:
+        os.environ["GEMINI_API_BASE"] = stub.base_url
+        install_unlimited_scheduler(workdir)
+        for mode in ("stateless", "session_inline", "session_cached"):
+            per_turn = run_mode(mode, stub, transcript_path, args.turns, workdir)
+            results[mode] = {"summary": summarize(per_turn), "turns": per_turn}
+
+    print(f"{'mode':<16}{'bytes':>12}{'prompt tok':>12}{'cached tok':>12}{'uncached tok':>14}{'last turn B':>13}")
+    for mode, result in results.items():
+        s = result["summary"]
+        print(f"{mode:<16}{s['request_bytes_total']:>12}{s['prompt_tokens_total']:>12}{s['cached_tokens_total']:>12}"
+              f"{s['uncached_prompt_tokens_total']:>14}{s['request_bytes_last_turn']:>13}")
+
+    save_results("chat", {"config": vars(args), "transcript_bytes": transcript_bytes, "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Keyframe storage: bytes written and time the pipeline spends saving frames.
+
+Usage:
+    python benchmarks/bench_frames.py --frames 15 --width 1920 --height 1080 --ocr-ms 300
+
+Renders synthetic slide keyframes (a share of them repeats, as when a
+slide is shown twice) and saves them the old way and through FrameStore:
+  sync_jpeg         cv2.imwrite at default quality on 4 threads, before OCR starts
+  store_jpg         FrameStore defaults: tuned JPEG frames and WebP thumbnails,
+                    written while OCR runs
+  store_webp        FrameStore with WebP frames
+  store_jpg_sprite  store_jpg plus a thumbnail sprite sheet
+OCR is simulated with --ocr-ms of sleep per frame on 4 threads, as the
+tesseract subprocesses would run. "critical" is the saving time the pipeline
+waits for; "save" is first frame to last byte on disk. Each store mode then
+saves the same frames again to show that content-addressed frames are not
+rewritten.
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from common import percentiles, save_results
+from synthetic_media import render_slide, slide_lines
+
+
+def make_frames(count, width, height, repeat_every):
+    frames = []
+    for i in range(count):
+        # Every repeat_every-th frame shows an earlier slide again
+        slide = i - 2 if repeat_every and i >= 2 and i % repeat_every == 0 else i
+        lines = slide_lines(slide, 6)
+        frames.append(render_slide(width, height, lines, len(lines)))
+    return frames
+
+
+def simulate_ocr(frames, ocr_ms):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda frame: time.sleep(ocr_ms / 1000), frames))
+
+
+def sync_jpeg(frames, video_dir, ocr_ms):
+    frames_dir = os.path.join(video_dir, "frames")
+    os.makedirs(frames_dir, exist_ok=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda item: cv2.imwrite(os.path.join(frames_dir, f"frame_{item[0]}.jpg"), item[1]),
+                          enumerate(frames)))
+    written = time.perf_counter() - start
+    simulate_ocr(frames, ocr_ms)
+    size = sum(entry.stat().st_size for entry in os.scandir(frames_dir))
+    return {"critical_s": written, "save_s": written, "bytes_written": size, "files_written": len(frames),
+            "bytes": {"frame": size, "thumbnail": 0, "sprite": 0}}
+
+
+def store_run(frames, video_dir, ocr_ms, **options):
+    from services.frame_store import FrameStore
+    start = time.perf_counter()
+    store = FrameStore(video_dir, **options)
+    for i, frame in enumerate(frames):
+        store.put(frame, i * 5000)
+    queued = time.perf_counter() - start
+    simulate_ocr(frames, ocr_ms)
+    stats = store.close()
+    return {"critical_s": queued + stats["blocked_seconds"], "save_s": stats["save_seconds"],
+            "bytes_written": stats["bytes_written"], "files_written": stats["files_written"],
+            "unique_frames": stats["unique_frames"], "bytes": stats["bytes"]}
+
+
+MODES = {
+    "store_jpg": {"format": "jpg"},
+    "store_webp": {"format": "webp"},
+    "store_jpg_sprite": {"format": "jpg", "sprite": True},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark keyframe storage")
+    parser.add_argument("--frames", type=int, default=15, help="Keyframes per video")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--repeat-every", type=int, default=5, help="Every Nth frame repeats an earlier slide (0: never)")
+    parser.add_argument("--ocr-ms", type=float, default=300, help="Simulated OCR time per frame")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames, args.width, args.height, args.repeat_every)
+    work_dir = tempfile.mkdtemp(prefix="vidiwise-frames-bench-")
+    results = {}
+    try:
+        for mode in ["sync_jpeg"] + list(MODES):
+            runs, rerun = [], None
+            for run in range(args.runs):
+                video_dir = os.path.join(work_dir, f"{mode}-{run}")
+                if mode == "sync_jpeg":
+                    runs.append(sync_jpeg(frames, video_dir, args.ocr_ms))
+                else:
+                    runs.append(store_run(frames, video_dir, args.ocr_ms, **MODES[mode]))
+                    rerun = store_run(frames, video_dir, args.ocr_ms, **MODES[mode])
+            results[mode] = {
+                "bytes_written": runs[-1]["bytes_written"],
+                "bytes": runs[-1]["bytes"],
+                "files_written": runs[-1]["files_written"],
+                "unique_frames": runs[-1].get("unique_frames", args.frames),
+                "critical": percentiles([r["critical_s"] for r in runs]),
+                "save": percentiles([r["save_s"] for r in runs]),
+                "rerun_bytes_written": rerun["bytes_written"] if rerun else None
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{args.frames} frames at {args.width}x{args.height}, {args.ocr_ms:.0f}ms simulated OCR per frame")
+    print(f"{'mode':<19}{'bytes':>10}{'files':>7}{'critical p50':>14}{'save p50':>10}{'rerun bytes':>13}")
+    for mode, r in results.items():
+        rerun = "-" if r["rerun_bytes_written"] is None else r["rerun_bytes_written"]
+        print(f"{mode:<19}{r['bytes_written']:>10}{r['files_written']:>7}{r['critical']['p50_ms']:>12.1f}ms"
+              f"{r['save']['p50_ms']:>8.0f}ms{rerun:>13}")
+
+    save_results("frames", {"config": vars(args), "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""End-to-end benchmark of VideoService.process_video on synthetic media.
+
+Usage:
+    python benchmarks/bench_pipeline.py --duration 120 --height 720 --scene-change-rate 0.2
+
+Groq and Gemini are replaced by local stubs; download is replaced by a copy
+of the generated video. Reports per-stage wall time, CPU time, RSS
+(sampled_peak_rss_mb is the highest RSS sampled during the stage,
+rss_growth_mb how far that is above RSS at the stage's start), frames
+decoded and OCR calls, and writes them to benchmarks/results/.
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+from common import RssSampler, find_ffmpeg, install_unlimited_scheduler, peak_rss_mb, save_results
+from stub_servers import StubServer
+from synthetic_media import generate_video
+
+STAGES = [
+    ("download_video", "download"),
+    ("extract_audio", "audio"),
+    ("transcribe_audio", "transcript"),
+    ("extract_keyframes", "keyframes"),
+    ("write_keyframes", "write_frames"),
+    ("ocr_keyframes", "ocr"),
+    ("combine_data", "combine"),
+    ("prepare_combined_transcript", "format_transcript"),
+]
+
+
+class StageRecorder:
+    """Wraps instance methods to record wall time, CPU time and sampled RSS per stage."""
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {"frames_decoded": 0, "ocr_calls": 0}
+
+    def wrap(self, obj, method_name, stage_name):
+        original = getattr(obj, method_name)
+
+        def timed(*args, **kwargs):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            try:
+                with self.sampler.window() as rss:
+                    return original(*args, **kwargs)
+            finally:
+                stage = self.stages.setdefault(stage_name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                            "sampled_peak_rss_mb": None, "rss_growth_mb": None})
+                stage["calls"] += 1
+                stage["wall_s"] += time.perf_counter() - wall_start
+                stage["cpu_s"] += time.process_time() - cpu_start
+                if rss["peak_mb"] is not None:
+                    # Over several calls, the largest of each
+                    stage["sampled_peak_rss_mb"] = max(stage["sampled_peak_rss_mb"] or 0.0, rss["peak_mb"])
+                    stage["rss_growth_mb"] = max(stage["rss_growth_mb"] or 0.0, rss["peak_mb"] - rss["start_mb"])
+
+        setattr(obj, method_name, timed)
+
+    def count(self, obj, method_name, counter):
+        original = getattr(obj, method_name)
+
+        def counted(*args, **kwargs):
+            with self.lock:
+                self.counters[counter] += 1
+            return original(*args, **kwargs)
+
+        setattr(obj, method_name, counted)
+
+
+def counting_capture(cv2_module, recorder):
+    """Swap cv2.VideoCapture for a proxy that counts successfully decoded frames."""
+    real_capture = cv2_module.VideoCapture
+
+    class CountingCapture:
+        def __init__(self, *args, **kwargs):
+            self._cap = real_capture(*args, **kwargs)
+
+        def read(self, *args):
+            ret, frame = self._cap.read(*args)
+            if ret:
+                with recorder.lock:
+                    recorder.counters["frames_decoded"] += 1
+            return ret, frame
+
+        def __getattr__(self, name):
+            return getattr(self._cap, name)
+
+    cv2_module.VideoCapture = CountingCapture
+    return real_capture
+
+
+def run_once(source_video, stub, run_index):
+    import cv2
+    from services.video_service import VideoService
+    from services.gemini_service import GeminiChatbot
+
+    class BenchVideoService(VideoService):
+        def download_video(self, url):
+            target = os.path.join(self.current_video_dir, "video.mp4")
+            shutil.copyfile(source_video, target)
+            return target
+
+    stub.stats.reset()
+    sampler = RssSampler().start()
+    recorder = StageRecorder(sampler)
+    service = BenchVideoService()
+    service.base_output_dir = tempfile.mkdtemp(prefix="vidiwise-bench-")
+    for method_name, stage_name in STAGES:
+        recorder.wrap(service, method_name, stage_name)
+    recorder.count(service, "perform_ocr", "ocr_calls")
+
+    real_capture = counting_capture(cv2, recorder)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        result = service.process_video(f"https://youtu.be/bench{run_index}")
+
+        chatbot = GeminiChatbot("stub-key")
+        recorder.wrap(chatbot, "send_message", "metadata")
+        chatbot.read_transcript(result["transcript_file"])
+        chatbot.send_message("Generate a title")
+        chatbot.send_message("Generate a summary")
+        transcript_bytes = os.path.getsize(result["transcript_file"])
+    finally:
+        cv2.VideoCapture = real_capture
+        sampler.stop()
+        shutil.rmtree(service.base_output_dir, ignore_errors=True)
+
+    return {
+        "total_wall_s": time.perf_counter() - wall_start,
+        "total_cpu_s": time.process_time() - cpu_start,
+        # Process high-water mark, including earlier runs
+        "peak_rss_mb": peak_rss_mb(),
+        "transcript_bytes": transcript_bytes,
+        "stages": recorder.stages,
+        "counters": recorder.counters,
+        "upstream": stub.stats.snapshot()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video processing pipeline")
+    parser.add_argument("--duration", type=float, default=60, help="Video length in seconds")
+    parser.add_argument("--width", type=int, default=854)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--scene-change-rate", type=float, default=0.1, help="Slide changes per second")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="Seconds per stub API call")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/pipeline-<time>.json)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="vidiwise-media-")
+    try:
+        video = generate_video(os.path.join(work_dir, "synthetic.mp4"), args.duration, args.width,
+                               args.height, args.fps, args.scene_change_rate)
+        print(f"Generated {video['frames']} frames, {video['bytes']} bytes")
+
+        with StubServer(latency=args.stub_latency) as stub:
+            os.environ["GROQ_API_KEY"] = "stub-key"
+            os.environ["GROQ_BASE_URL"] = stub.base_url
+            os.environ["GEMINI_API_BASE"] = stub.base_url
+            os.environ["FFMPEG_PATH"] = find_ffmpeg()
+            install_unlimited_scheduler(work_dir)
+
+            runs = []
+            for run_index in range(args.runs):
+                run = run_once(video["path"], stub, run_index)
+                runs.append(run)
+                print(f"Run {run_index + 1}/{args.runs}: {run['total_wall_s']:.2f}s wall, "
+                      f"{run['counters']['frames_decoded']} frames decoded, {run['counters']['ocr_calls']} OCR calls")
+                for name, stage in run["stages"].items():
+                    rss = "-" if stage["sampled_peak_rss_mb"] is None else \
+                        f"{stage['sampled_peak_rss_mb']:8.1f}MB peak {stage['rss_growth_mb']:+7.1f}MB"
+                    print(f"  {name:<18} {stage['wall_s']:8.3f}s wall {stage['cpu_s']:8.3f}s cpu {rss}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    save_results("pipeline", {"config": vars(args), "video": video, "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
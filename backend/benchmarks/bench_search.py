@@ -0,0 +1,114 @@
+"""Query latency and index size of the cross-video search index.
+
+Usage:
+    python benchmarks/bench_search.py --videos 100000 --segments 60 --queries 500
+
+Builds an index of synthetic transcripts whose words follow a Zipf
+distribution (so there are very common and very rare terms, as in real
+speech), then measures search latency for rare, mid-frequency and common
+query terms plus the cost of adding and removing one video incrementally.
+Reuse an index across runs with --index to skip the build.
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from common import percentiles, save_results
+from services.search_service import SearchIndex
+
+VOCABULARY_SIZE = 50000
+
+
+def make_vocabulary(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words, key=lambda word: (len(word), word))
+
+
+def make_segments(rng, vocabulary, weights, count):
+    segments = []
+    for i in range(count):
+        words = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(8, 30))
+        kind = "ocr" if i % 5 == 4 else "transcript"
+        segments.append({"kind": kind, "start": i * 6.0, "end": i * 6.0 + 6, "text": " ".join(words)})
+    return segments
+
+
+def build(index, rng, vocabulary, weights, videos, segments):
+    start = time.perf_counter()
+    for n in range(videos):
+        index.index_video(f"video{n:06d}", make_segments(rng, vocabulary, weights, segments))
+        if n and n % 10000 == 0:
+            print(f"  indexed {n} videos ({time.perf_counter() - start:.0f}s)")
+    return time.perf_counter() - start
+
+
+def measure(index, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full-text search over transcripts")
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--segments", type=int, default=60, help="Segments per video")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per term class")
+    parser.add_argument("--index", help="Index file to build or reuse (default: temporary)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    cumulative, weights = 0.0, []
+    for rank in range(1, len(vocabulary) + 1):
+        cumulative += 1 / rank
+        weights.append(cumulative)
+
+    path = args.index or os.path.join(tempfile.mkdtemp(prefix="vidiwise-search-bench-"), "search.db")
+    index = SearchIndex(path)
+    build_s = None
+    if len(index.indexed_videos()) < args.videos:
+        print(f"Building index of {args.videos} videos x {args.segments} segments at {path}")
+        build_s = build(index, rng, vocabulary, weights, args.videos, args.segments)
+    index_mb = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)) / 1e6
+
+    # Term classes by Zipf rank: a word near rank r appears in roughly 1/r of segments' words
+    classes = {"rare": (20000, 50000), "mid": (500, 5000), "common": (20, 200)}
+    results = {}
+    for name, (low, high) in classes.items():
+        queries = [vocabulary[rng.randrange(low, high)] for _ in range(args.queries)]
+        results[f"{name}_term"] = measure(index, queries)
+    two_terms = [" ".join(rng.sample(vocabulary[500:50000], 2)) for _ in range(args.queries)]
+    results["two_terms"] = measure(index, two_terms)
+    mixed = [f"{vocabulary[rng.randrange(20, 200)]} {vocabulary[rng.randrange(20000, 50000)]}" for _ in range(args.queries)]
+    results["common_and_rare"] = measure(index, mixed)
+
+    update = []
+    for n in range(20):
+        segments = make_segments(rng, vocabulary, weights, args.segments)
+        start = time.perf_counter()
+        index.index_video(f"bench-update-{n}", segments)
+        index.remove_video(f"bench-update-{n}")
+        update.append(time.perf_counter() - start)
+    results["add_and_remove_video"] = percentiles(update)
+
+    print(f"index: {args.videos} videos, {index_mb:.0f}MB" + (f", built in {build_s:.0f}s" if build_s else ""))
+    for name, stats in results.items():
+        print(f"{name:<22} p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms")
+
+    save_results("search", {"config": vars(args), "index_mb": index_mb, "build_s": build_s,
+                            "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Cold start time and idle RSS of a bare API worker.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10
+
+Each run imports main in a fresh interpreter, the way a new uvicorn worker
+does, and reports import time, RSS after import and which media libraries
+ended up loaded. The "pipeline" variant also imports the media stack to show
+what a worker that processes videos pays on top.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+from common import APP_DIR, save_results
+
+HEAVY_MODULES = ["cv2", "numpy", "yt_dlp", "groq", "pytesseract", "imagehash", "PIL"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import main
+if {pipeline}:
+    main.get_video_service()
+elapsed = time.perf_counter() - start
+rss_kb = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss_kb = int(line.split()[1])
+print(json.dumps({{"import_s": elapsed, "rss_mb": rss_kb / 1024,
+                  "loaded": [m for m in {heavy} if m in sys.modules]}}))
+"""
+
+
+def probe(pipeline):
+    env = dict(os.environ, GROQ_API_KEY=os.getenv("GROQ_API_KEY", "bench-key"),
+               GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "bench-key"), LOG_LEVEL="WARNING")
+    code = PROBE.format(pipeline=pipeline, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    return {
+        "import_s_median": statistics.median(s["import_s"] for s in samples),
+        "import_s_min": min(s["import_s"] for s in samples),
+        "rss_mb_median": statistics.median(s["rss_mb"] for s in samples),
+        "heavy_modules_loaded": samples[-1]["loaded"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API worker cold start and idle RSS")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = {}
+    for variant, pipeline in (("api", False), ("pipeline", True)):
+        samples = [probe(pipeline) for _ in range(args.runs)]
+        results[variant] = summarize(samples)
+        print(f"{variant:<9} import {results[variant]['import_s_median'] * 1000:7.1f}ms  "
+              f"RSS {results[variant]['rss_mb_median']:6.1f}MB  "
+              f"media libs: {', '.join(results[variant]['heavy_modules_loaded']) or 'none'}")
+
+    save_results("startup", {"config": vars(args), "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
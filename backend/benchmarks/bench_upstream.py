@@ -0,0 +1,115 @@
+"""Upstream 429s and chat latency when background work and chat share a Gemini quota.
+
+Usage:
+    python benchmarks/bench_upstream.py --rpm 60 --background 40 --chats 20
+
+Starts a stub Gemini API that answers 429 past --rpm requests per minute and
+runs a burst of background title/summary calls alongside interactive chat
+messages, two ways:
+  unscheduled  no local limits or retries, as before the scheduler: a 429
+               fails the call
+  scheduled    the UpstreamScheduler with the stub's quota, so background
+               calls wait in their lane and leave a reserve for chat
+and reports 429s received, chat latency and how long the background burst took.
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from common import percentiles, save_results
+from stub_servers import StubServer
+
+
+def run_mode(mode, stub, args, workdir):
+    from services.gemini_service import GeminiChatbot
+    from services.upstream import UpstreamScheduler, BACKGROUND, INTERACTIVE, UpstreamError
+
+    limits = {"gemini": {"rpm": args.rpm}} if mode == "scheduled" else {}
+    scheduler = UpstreamScheduler(os.path.join(workdir, f"{mode}.db"), limits=limits,
+                                  max_retries=3 if mode == "scheduled" else 0)
+    chatbot = GeminiChatbot("stub-key", scheduler=scheduler)
+    chatbot.transcript_content = "Transcript: a talk about caches and queues."
+    stub.stats.reset()
+
+    failures = {"chat": 0, "background": 0}
+    chat_latencies = []
+    lock = threading.Lock()
+
+    def background_call(n):
+        try:
+            chatbot.send_message(f"Title for video {n}", lane=BACKGROUND)
+        except UpstreamError:
+            with lock:
+                failures["background"] += 1
+
+    def chat_call(n):
+        # Chats trickle in while the background burst is running
+        time.sleep(n * args.chat_interval)
+        start = time.perf_counter()
+        try:
+            chatbot.send_message(f"Question {n}", lane=INTERACTIVE)
+            with lock:
+                chat_latencies.append(time.perf_counter() - start)
+        except UpstreamError:
+            with lock:
+                failures["chat"] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as background_pool, \
+            ThreadPoolExecutor(max_workers=args.chats) as chat_pool:
+        background = [background_pool.submit(background_call, n) for n in range(args.background)]
+        chats = [chat_pool.submit(chat_call, n) for n in range(args.chats)]
+        for future in chats:
+            future.result()
+        chats_done_s = time.perf_counter() - start
+        for future in background:
+            future.result()
+    background_done_s = time.perf_counter() - start
+
+    upstream = stub.stats.snapshot()
+    return {
+        "rate_limited_responses": upstream["rate_limited"].get("gemini_generate", 0),
+        "successful_requests": upstream["requests"].get("gemini_generate", 0),
+        "chat_latency": percentiles(chat_latencies),
+        "chat_failures": failures["chat"],
+        "background_failures": failures["background"],
+        "chats_done_s": chats_done_s,
+        "background_done_s": background_done_s
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure 429s and chat latency under a shared upstream quota")
+    parser.add_argument("--rpm", type=int, default=60, help="Requests per minute the stub admits")
+    parser.add_argument("--background", type=int, default=40, help="Background calls in the burst")
+    parser.add_argument("--chats", type=int, default=20, help="Chat messages sent during the burst")
+    parser.add_argument("--chat-interval", type=float, default=1.0, help="Seconds between chat messages")
+    parser.add_argument("--concurrency", type=int, default=8, help="Background worker threads")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vidiwise-upstream-bench-")
+    results = {}
+    for mode in ("unscheduled", "scheduled"):
+        # A fresh stub per mode so each starts with a full quota
+        with StubServer(latency=args.latency, gemini_rate_limit=(args.rpm, 60)) as stub:
+            os.environ["GEMINI_API_BASE"] = stub.base_url
+            results[mode] = run_mode(mode, stub, args, workdir)
+
+    print(f"{'mode':<13}{'429s':>7}{'chat p50':>11}{'chat p95':>11}{'failed':>8}{'background':>12}")
+    for mode, r in results.items():
+        latency = r["chat_latency"]
+        print(f"{mode:<13}{r['rate_limited_responses']:>7}{latency.get('p50_ms', 0):>9.0f}ms"
+              f"{latency.get('p95_ms', 0):>9.0f}ms{r['chat_failures'] + r['background_failures']:>8}"
+              f"{r['background_done_s']:>11.1f}s")
+
+    save_results("upstream", {"config": vars(args), "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Shared helpers for the VidiWise benchmark scripts."""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import threading
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# Benchmarks import the app the same way run_server.py does
+sys.path.insert(0, str(APP_DIR))
+
+
+def find_ffmpeg():
+    """Locate ffmpeg from FFMPEG_PATH or PATH."""
+    ffmpeg = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+    if not ffmpeg:
+        sys.exit("ffmpeg not found. Install it or set FFMPEG_PATH.")
+    return ffmpeg
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def current_rss_mb():
+    """Current resident set size of this process in MB, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RssSampler:
+    """Polls current RSS on a thread so a window of code gets its own peak.
+
+    ru_maxrss is the high-water mark of the whole process: once the biggest
+    stage has run, every later stage would report the same number. A window
+    records RSS at its start and the highest sample while it is open;
+    overlapping windows each see every sample.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.windows = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        with self.lock:
+            for window in self.windows:
+                window["peak_mb"] = max(window["peak_mb"], rss)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if current_rss_mb() is not None:
+            self.thread = threading.Thread(target=self.run, name="rss-sampler", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    @contextmanager
+    def window(self):
+        """Yield {'start_mb', 'peak_mb'}, filled in when the window closes (None without /proc)."""
+        start = current_rss_mb()
+        window = {"start_mb": start, "peak_mb": start or 0.0}
+        with self.lock:
+            self.windows.append(window)
+        try:
+            yield window
+        finally:
+            self.sample()
+            with self.lock:
+                self.windows.remove(window)
+            if start is None:
+                window["peak_mb"] = None
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=BENCH_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save_results(name, results, output=None):
+    """Write results as JSON with run metadata and return the file path."""
+    results = dict(results)
+    results["run"] = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+    if output:
+        path = Path(output)
+    else:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+    return path
+
+
+def percentiles(samples):
+    """Summary statistics for a list of latencies in seconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000
+    }
+
+
+def install_unlimited_scheduler(directory):
+    """Stub upstreams have no quota, so don't throttle them with the default free-tier limits."""
+    import services.upstream as upstream
+    upstream.scheduler = upstream.UpstreamScheduler(os.path.join(directory, "upstream.db"), limits={})
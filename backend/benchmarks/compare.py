@@ -0,0 +1,47 @@
+"""Compare two benchmark result files.
+
+Usage:
+    python benchmarks/compare.py results/pipeline-old.json results/pipeline-new.json
+"""
+
+import sys
+import json
+
+
+def flatten(value, prefix=""):
+    """Flatten nested dicts into dotted keys, averaging lists of run dicts."""
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(flatten(child, f"{prefix}{key}."))
+        return items
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        runs = [flatten(v, prefix) for v in value]
+        keys = set().union(*runs)
+        return {key: sum(r.get(key, 0) for r in runs) / len(runs)
+                for key in keys if all(isinstance(r.get(key, 0), (int, float)) for r in runs)}
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix.rstrip("."): value}
+    return {}
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        old = json.load(f)
+    with open(sys.argv[2], encoding="utf-8") as f:
+        new = json.load(f)
+
+    old_metrics = flatten({k: v for k, v in old.items() if k not in ("config", "run")})
+    new_metrics = flatten({k: v for k, v in new.items() if k not in ("config", "run")})
+
+    print(f"{'metric':<60} {'old':>12} {'new':>12} {'change':>9}")
+    for key in sorted(set(old_metrics) & set(new_metrics)):
+        before, after = old_metrics[key], new_metrics[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{key:<60} {before:>12.3f} {after:>12.3f} {change:>9}")
+
+
+if __name__ == "__main__":
+    main()
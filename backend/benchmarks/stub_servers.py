@@ -0,0 +1,147 @@
+"""Local stand-ins for the Groq transcription and Gemini generateContent/cachedContents APIs.
+
+The stubs answer with realistic response shapes after a configurable delay
+so benchmarks measure our own overhead without spending upstream quota.
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.request_bytes = {}
+        self.rate_limited = {}
+
+    def record(self, endpoint, size):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.request_bytes[endpoint] = self.request_bytes.get(endpoint, 0) + size
+
+    def record_rate_limited(self, endpoint):
+        with self.lock:
+            self.rate_limited[endpoint] = self.rate_limited.get(endpoint, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.request_bytes.clear()
+            self.rate_limited.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "request_bytes": dict(self.request_bytes),
+                    "rate_limited": dict(self.rate_limited)}
+
+
+class RateLimit:
+    """Admit `requests` calls per `period` seconds, refilled continuously like a provider's RPM quota."""
+
+    def __init__(self, requests, period):
+        self.capacity = requests
+        self.rate = requests / period
+        self.level = float(requests)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def admit(self):
+        """Return None when admitted, else seconds until a request would be."""
+        with self.lock:
+            now = time.time()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.level < 1:
+                return (1 - self.level) / self.rate
+            self.level -= 1
+            return None
+
+
+def make_handler(stats, latency, segments, answer_words, gemini_limit):
+    # Token counts use the same ~4 bytes per token for prompts and cached content
+    caches = {}
+    answer = " ".join(["Stub", "answer", "about", "caching."] * (answer_words // 4 + 1))
+    answer = " ".join(answer.split()[:answer_words])
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            time.sleep(latency)
+
+            if self.path.startswith("/openai/v1/audio/transcriptions"):
+                stats.record("groq_transcription", length)
+                items = [{"id": i, "start": i * 5.0, "end": (i + 1) * 5.0,
+                          "text": f" Segment {i} talks about caches, queues and latency budgets."}
+                         for i in range(segments)]
+                self.send_json({"text": " ".join(s["text"] for s in items), "segments": items})
+            elif self.path.startswith("/v1beta/cachedContents"):
+                stats.record("gemini_cache_create", length)
+                name = f"cachedContents/stub{len(caches)}"
+                caches[name] = length // 4
+                self.send_json({"name": name, "usageMetadata": {"totalTokenCount": caches[name]}})
+            elif ":generateContent" in self.path:
+                retry_after = gemini_limit.admit() if gemini_limit else None
+                if retry_after is not None:
+                    stats.record_rate_limited("gemini_generate")
+                    self.send_json({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "details": [
+                        {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after:.3f}s"}]}},
+                        status=429)
+                    return
+                stats.record("gemini_generate", length)
+                cached_tokens = caches.get(json.loads(body).get("cachedContent"), 0)
+                prompt_tokens = length // 4 + cached_tokens
+                output_tokens = len(answer) // 4
+                usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                         "totalTokenCount": prompt_tokens + output_tokens}
+                if cached_tokens:
+                    usage["cachedContentTokenCount"] = cached_tokens
+                self.send_json({
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": answer}]}}],
+                    "usageMetadata": usage
+                })
+            else:
+                self.send_json({"error": {"message": f"Unknown stub path {self.path}"}}, status=404)
+
+    return StubHandler
+
+
+class StubServer:
+    """Serves both stub APIs on one local port in a background thread."""
+
+    def __init__(self, latency=0.05, segments=20, port=0, answer_words=4, gemini_rate_limit=None):
+        """gemini_rate_limit=(requests, window_seconds) makes generateContent answer 429 past that rate."""
+        self.stats = StubStats()
+        limit = RateLimit(*gemini_rate_limit) if gemini_rate_limit else None
+        self.server = ThreadingHTTPServer(("127.0.0.1", port),
+                                          make_handler(self.stats, latency, segments, answer_words, limit))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
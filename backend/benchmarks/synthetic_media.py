@@ -0,0 +1,134 @@
+"""Generate synthetic lecture-style videos: rendered text slides plus a tone track."""
+
+import os
+import wave
+import argparse
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+from common import find_ffmpeg
+
+WORDS = ("cache latency throughput memory vector index thread queue worker "
+         "pipeline frame audio model token batch shard replica budget").split()
+
+
+def slide_lines(slide_index, lines_per_slide):
+    """Deterministic slide text so OCR output is stable between runs."""
+    title = f"Slide {slide_index + 1}: {WORDS[slide_index % len(WORDS)].title()} Basics"
+    bullets = []
+    for line in range(lines_per_slide):
+        words = [WORDS[(slide_index * 7 + line * 3 + k) % len(WORDS)] for k in range(5)]
+        bullets.append("- " + " ".join(words))
+    return [title] + bullets
+
+
+def render_slide(width, height, lines, visible_lines):
+    """Render a slide image showing the first visible_lines lines."""
+    frame = np.full((height, width, 3), 255, dtype=np.uint8)
+    scale = max(0.5, height / 720.0)
+    y = int(80 * scale)
+    for i, text in enumerate(lines[:visible_lines]):
+        font_scale = 1.4 * scale if i == 0 else 1.0 * scale
+        cv2.putText(frame, text, (int(40 * scale), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (20, 20, 20), max(1, int(2 * scale)), cv2.LINE_AA)
+        y += int(60 * scale)
+    return frame
+
+
+def write_tone(path, duration, sample_rate=16000):
+    """Write a mono WAV tone so the pipeline has an audio stream to extract."""
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        t = np.arange(int(duration * sample_rate)) / sample_rate
+        wav.writeframes((8000 * np.sin(2 * np.pi * 440 * t)).astype("<i2").tobytes())
+
+
+def write_speechlike(path, duration, seed=1, sample_rate=16000):
+    """Write a mono WAV of syllable-rate voiced bursts and pauses.
+
+    It passes voice activity detection like speech does, but it has no words,
+    so ASR benchmarks on it measure model speed rather than transcript quality.
+    """
+    rng = np.random.default_rng(seed)
+    samples = np.zeros(int(duration * sample_rate), dtype=np.float32)
+    position = 0
+    while position < len(samples):
+        # A 2-8s phrase of ~4 syllables per second, then a 0.2-1s pause
+        phrase = int(rng.uniform(2, 8) * sample_rate)
+        t = np.arange(min(phrase, len(samples) - position)) / sample_rate
+        pitch = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None)
+        samples[position:position + len(t)] = voiced * envelope + 0.05 * rng.standard_normal(len(t))
+        position += phrase + int(rng.uniform(0.2, 1.0) * sample_rate)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((6000 * samples / max(1e-6, np.abs(samples).max())).astype("<i2").tobytes())
+
+
+def generate_video(output_path, duration=60, width=854, height=480, fps=25,
+                   scene_change_rate=0.1, lines_per_slide=4, build_up=True):
+    """Create an mp4 with text slides changing scene_change_rate times per second.
+
+    With build_up, bullet lines appear one at a time within each slide the way
+    presentation decks usually reveal them.
+    """
+    ffmpeg = find_ffmpeg()
+    slide_seconds = 1.0 / scene_change_rate if scene_change_rate > 0 else duration
+    total_frames = int(duration * fps)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        silent_path = os.path.join(tmp_dir, "silent.mp4")
+        audio_path = os.path.join(tmp_dir, "tone.wav")
+
+        writer = cv2.VideoWriter(silent_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        cache = {}
+        for frame_index in range(total_frames):
+            t = frame_index / fps
+            slide_index = int(t // slide_seconds)
+            lines = slide_lines(slide_index, lines_per_slide)
+            if build_up:
+                progress = (t % slide_seconds) / slide_seconds
+                visible = 1 + min(lines_per_slide, int(progress * (lines_per_slide + 1)))
+            else:
+                visible = len(lines)
+            key = (slide_index, visible)
+            if key not in cache:
+                cache.clear()
+                cache[key] = render_slide(width, height, lines, visible)
+            writer.write(cache[key])
+        writer.release()
+
+        write_tone(audio_path, duration)
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-i", silent_path, "-i", audio_path,
+                        "-c:v", "copy", "-c:a", "aac", "-shortest", output_path], check=True)
+
+    return {
+        "path": output_path,
+        "duration": duration,
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "scene_change_rate": scene_change_rate,
+        "frames": total_frames,
+        "bytes": os.path.getsize(output_path)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic slide video")
+    parser.add_argument("output")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--width", type=int, default=854)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--scene-change-rate", type=float, default=0.1, help="Slide changes per second")
+    args = parser.parse_args()
+    print(generate_video(args.output, args.duration, args.width, args.height, args.fps, args.scene_change_rate))
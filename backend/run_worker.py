@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+VidiWise Pipeline Worker Runner
+Loads environment variables and processes jobs from the shared work queue
+"""
+
+import os
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# Add the app directory to Python path
+current_dir = Path(__file__).resolve().parent
+app_dir = current_dir / "app"
+sys.path.insert(0, str(app_dir))
+
+# Load environment variables from .env file if it exists
+env_file = current_dir / ".env"
+if env_file.exists():
+    with open(env_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                os.environ.setdefault(key, value)
+
+missing_vars = [var for var in ["GROQ_API_KEY", "GEMINI_API_KEY"] if not os.getenv(var)]
+if missing_vars:
+    print(f"\n❌ ERROR: Missing required environment variables: {', '.join(missing_vars)}")
+    print("See .env.example for reference.")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a VidiWise pipeline worker")
+    parser.add_argument("--lease-seconds", type=int, default=300, help="Job lease length")
+    parser.add_argument("--heartbeat-interval", type=int, default=30, help="Seconds between lease renewals")
+    parser.add_argument("--poll-interval", type=float, default=2, help="Seconds to wait when the queue is empty")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("VIDIWISE_WORKER_METRICS_PORT", "9108")),
+                        help="Port serving this worker's Prometheus /metrics (0 disables it)")
+    args = parser.parse_args()
+
+    # Same working directory as the API so relative artifact paths match
+    os.chdir(app_dir)
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
+    from services.job_queue import create_job_queue
+    from services.video_service import VideoService
+    from services.worker import Worker
+    from services.search_service import SearchIndex
+    from services.video_utils import OUTPUT_DIR
+    from services.metrics import start_metrics_server
+
+    # Stage, OCR, frame and upstream metrics are recorded in this process, not the API's
+    if args.metrics_port:
+        try:
+            start_metrics_server(args.metrics_port)
+        except OSError as e:
+            # e.g. a second worker on the same host; pass --metrics-port to give each its own
+            print(f"⚠️  Metrics not served on port {args.metrics_port}: {e}")
+
+    job_queue = create_job_queue()
+    video_service = VideoService(queue_depth=lambda: job_queue.depth().get('queued', 0))
+    worker = Worker(job_queue, lambda: video_service, lease_seconds=args.lease_seconds,
+                    heartbeat_interval=args.heartbeat_interval, poll_interval=args.poll_interval,
+                    search_index=SearchIndex(os.path.join(OUTPUT_DIR, "search.db")))
+    print(f"🚀 Starting VidiWise worker {worker.worker_id}...")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
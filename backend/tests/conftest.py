@@ -0,0 +1,29 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+# Services are imported as `services.x`, as the app and worker run them from backend/app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+
+@pytest.fixture
+def redis_url(monkeypatch):
+    """VIDIWISE_TEST_REDIS_URL when set, otherwise a fakeredis server (with lupa for Lua scripts)."""
+    url = os.getenv("VIDIWISE_TEST_REDIS_URL")
+    if not url:
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        import redis
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(redis.Redis, "from_url",
+                            classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)))
+        url = "redis://fake"
+    return url
+
+
+@pytest.fixture
+def redis_prefix():
+    """Key prefix unique to the test, so runs against a real server don't share keys."""
+    return f"vidiwise-test-{uuid.uuid4().hex[:8]}"
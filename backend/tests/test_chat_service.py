@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+import uuid
+
+import pytest
+
+from services.chat_service import ChatService, ChatSessionStore, RedisChatSessionStore
+
+
+class SlowChatbot:
+    """Answers after a delay, so turns sent together overlap."""
+
+    def generate(self, contents, system_instruction=None, cached_content=None, operation='chat'):
+        time.sleep(0.1)
+        return {"text": f"answer to {contents[-1]['text']}", "request_bytes": 1, "usage": {}}
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def open_store(request, tmp_path):
+    """Opens a new connection to one shared store, as each API process would."""
+    if request.param == "sqlite":
+        path = os.path.join(tmp_path, "chat.db")
+        return lambda: ChatSessionStore(path)
+    url, prefix = request.getfixturevalue("redis_url"), request.getfixturevalue("redis_prefix")
+    return lambda: RedisChatSessionStore(url, prefix=prefix)
+
+
+@pytest.fixture
+def transcript(tmp_path):
+    path = os.path.join(tmp_path, "video_transcript.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[0:00:00] Transcript: caches and queues\n")
+    return path
+
+
+def send_together(services, session_id, transcript):
+    threads = [threading.Thread(target=service.send, args=("v1", transcript, f"question {i}", session_id))
+               for i, service in enumerate(services)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_turns_on_one_session_are_all_kept(tmp_path, transcript):
+    service = ChatService(SlowChatbot(), ChatSessionStore(os.path.join(tmp_path, "chat.db")))
+    session_id = service.send("v1", transcript, "first")["session_id"]
+    send_together([service, service], session_id, transcript)
+
+    session = service.store.get(session_id)
+    questions = [turn["text"] for turn in session["history"] if turn["role"] == "user"]
+    assert sorted(questions) == ["first", "question 0", "question 1"]
+    assert session["usage"]["turns"] == 3
+
+
+def test_turns_from_separate_processes_are_merged(open_store, transcript):
+    # Two services over one store stand in for two API processes, whose locks are not shared
+    services = [ChatService(SlowChatbot(), open_store()) for _ in range(2)]
+    session_id = services[0].send("v1", transcript, "first")["session_id"]
+    send_together(services, session_id, transcript)
+
+    session = open_store().get(session_id)
+    questions = [turn["text"] for turn in session["history"] if turn["role"] == "user"]
+    assert sorted(questions) == ["first", "question 0", "question 1"]
+    assert len(session["history"]) == 6 and session["usage"]["turns"] == 3
+
+
+def test_stale_save_is_rejected(open_store):
+    store = open_store()
+    session = ChatService(SlowChatbot(), store).new_session("v1")
+    assert store.save(session)
+    assert not store.save(dict(session, version=None))
+    first, second = store.get(session["id"]), store.get(session["id"])
+    assert store.save(first)
+    assert not store.save(second)
+
+
+def test_expiry_and_video_deletion(open_store):
+    store = open_store()
+    service = ChatService(SlowChatbot(), store)
+    old, kept = service.new_session("v1"), service.new_session("v2")
+    assert store.save(old) and store.save(kept)
+    store.save_cache("v2", "hash", None, time.time() + 60)
+    time.sleep(0.05)
+    assert store.save(kept)
+    store.expire(0.03)
+    assert store.get(old["id"]) is None and store.get(kept["id"])["version"] == 2
+
+    assert store.delete_video("v2")["name"] is None
+    assert store.get(kept["id"]) is None and store.get_cache("v2") is None
+
+
+class CachingChatbot(SlowChatbot):
+    def create_cache(self, contents, system_instruction, ttl):
+        time.sleep(0.1)
+        return f"cachedContents/{uuid.uuid4().hex}"
+
+
+def test_first_chats_on_many_videos_do_not_deadlock(tmp_path):
+    # Transcripts big enough for a context cache, on enough videos that session and cache stripes collide
+    service = ChatService(CachingChatbot(), ChatSessionStore(os.path.join(tmp_path, "chat.db")), min_cache_tokens=1)
+    paths = []
+    for i in range(16):
+        path = os.path.join(tmp_path, f"t{i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"transcript {i}")
+        paths.append(path)
+    threads = [threading.Thread(target=service.send, args=(f"v{i}", path, "hello"), daemon=True)
+               for i, path in enumerate(paths)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads)
+    # Chats on different videos overlap instead of queueing behind one lock
+    assert time.perf_counter() - started < 16 * 0.2 / 2
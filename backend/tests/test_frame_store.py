@@ -0,0 +1,29 @@
+import os
+
+import cv2
+import numpy as np
+
+from services.frame_store import FrameStore
+
+
+def slide(page):
+    """A 720p title slide with a small page number in the corner."""
+    frame = np.full((720, 1280, 3), 255, dtype=np.uint8)
+    cv2.putText(frame, "Quarterly results", (100, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 4)
+    cv2.putText(frame, page, (1200, 700), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+    return frame
+
+
+def test_slides_differing_only_in_page_number_get_their_own_files(tmp_path):
+    # Their 16x16 perceptual hashes are equal
+    store = FrameStore(str(tmp_path))
+    first = store.put(slide("41"), 0)
+    second = store.put(slide("42"), 5)
+    repeat = store.put(slide("41"), 9)
+    stats = store.close()
+
+    assert first["path"] != second["path"]
+    # An identical frame still shares the file written for it first
+    assert repeat["path"] == first["path"] and stats["unique_frames"] == 2
+    assert sorted(os.listdir(tmp_path / "frames")) == sorted(
+        os.path.basename(record["path"]) for record in (first, second))
@@ -0,0 +1,174 @@
+"""Broker semantics shared by SQLiteJobQueue and RedisJobQueue.
+
+The Redis cases run against VIDIWISE_TEST_REDIS_URL when it is set, otherwise
+against fakeredis (with lupa for the lease script) when installed.
+"""
+
+import os
+import time
+
+import pytest
+
+from services.job_queue import SQLiteJobQueue, RedisJobQueue, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+URL = "https://www.youtube.com/watch?v={}"
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        job_queue = SQLiteJobQueue(os.path.join(tmp_path, "jobs.db"))
+    else:
+        job_queue = RedisJobQueue(request.getfixturevalue("redis_url"),
+                                  prefix=request.getfixturevalue("redis_prefix"))
+    job_queue.retry_backoff = 0
+    return job_queue
+
+
+def expire(seconds=0.15):
+    time.sleep(seconds)
+
+
+def test_lease_order_and_exclusivity(queue):
+    queue.enqueue("batch", URL.format("batch"), priority=PRIORITY_BATCH)
+    queue.enqueue("single", URL.format("single"), priority=PRIORITY_INTERACTIVE)
+    first = queue.lease("a", 60)
+    second = queue.lease("b", 60)
+    assert (first["id"], second["id"]) == ("single", "batch")
+    assert first["lease_owner"] == "a" and first["attempts"] == 1
+    assert queue.lease("c", 60) is None
+
+
+def test_enqueue_is_idempotent_while_active(queue):
+    queue.enqueue("v1", URL.format("v1"))
+    queue.lease("a", 60)
+    job = queue.enqueue("v1", URL.format("v1"))
+    assert job["status"] == "leased" and job["lease_owner"] == "a"
+
+
+def test_tenants_take_turns(queue):
+    for i in range(3):
+        queue.enqueue(f"a{i}", URL.format(f"a{i}"), tenant="team-a")
+    queue.enqueue("b0", URL.format("b0"), tenant="team-b")
+    leased = [queue.lease("w", 60)["id"] for _ in range(3)]
+    assert leased[:2] in (["a0", "b0"], ["b0", "a0"])
+
+
+def test_heartbeat_extends_only_own_lease(queue):
+    queue.enqueue("v1", URL.format("v1"))
+    job = queue.lease("a", 0.1)
+    assert queue.heartbeat("v1", "a", 60)
+    assert queue.get("v1")["lease_expires_at"] > job["lease_expires_at"]
+    assert not queue.heartbeat("v1", "b", 60)
+    expire()
+    # Renewed, so not redelivered
+    assert queue.lease("b", 60) is None
+
+
+def test_expired_lease_is_redelivered(queue):
+    queue.enqueue("v1", URL.format("v1"))
+    queue.lease("a", 0.1)
+    expire()
+    job = queue.lease("b", 60)
+    assert job["id"] == "v1" and job["lease_owner"] == "b" and job["attempts"] == 2
+    # The first worker has lost the lease and cannot renew it
+    assert not queue.heartbeat("v1", "a", 60)
+
+
+def test_stale_completion_and_failure_are_rejected(queue):
+    queue.enqueue("v1", URL.format("v1"))
+    queue.lease("a", 0.1)
+    expire()
+    queue.lease("b", 60)
+
+    assert not queue.complete("v1", "a", video_folder="stale")
+    assert not queue.fail("v1", "a", "stale error")
+    job = queue.get("v1")
+    assert job["status"] == "leased" and job["lease_owner"] == "b"
+    assert job["video_folder"] is None and job["error"] is None
+
+    assert queue.complete("v1", "b", video_folder="folder", metadata={"title": "T"})
+    job = queue.get("v1")
+    assert job["status"] == "completed" and job["video_folder"] == "folder"
+    assert job["metadata"] == {"title": "T"} and job["lease_owner"] is None
+    # A completed job is not leased again, even after its old lease time
+    expire()
+    assert queue.lease("c", 60) is None
+
+
+def test_fail_requeues_until_attempts_are_exhausted(queue):
+    queue.enqueue("v1", URL.format("v1"), max_attempts=2)
+    queue.lease("a", 60)
+    assert queue.fail("v1", "a", "first")
+    assert queue.get("v1")["status"] == "queued"
+    job = queue.lease("a", 60)
+    assert job["attempts"] == 2
+    assert queue.fail("v1", "a", "second")
+    job = queue.get("v1")
+    assert job["status"] == "failed" and job["error"] == "second"
+    assert queue.lease("a", 60) is None
+
+
+def test_defer_requeues_without_using_an_attempt(queue):
+    queue.enqueue("v1", URL.format("v1"), max_attempts=1)
+    queue.lease("a", 60)
+    assert not queue.defer("v1", "b", 900, "quota")
+    before = time.time()
+    assert queue.defer("v1", "a", 900, "quota")
+    job = queue.get("v1")
+    assert job["status"] == "queued" and job["attempts"] == 0 and job["error"] == "quota"
+    assert job["available_at"] >= before + 900
+    # Not runnable until the quota window has passed
+    assert queue.lease("a", 60) is None
+
+
+def test_jobs_waiting_out_a_backoff_do_not_hide_runnable_ones(queue):
+    queue.retry_backoff = 3600
+    for i in range(25):
+        queue.enqueue(f"v{i:02d}", URL.format(i))
+    for _ in range(21):
+        job = queue.lease("a", 60)
+        assert queue.fail(job["id"], "a", "transient")
+    # The 21 oldest jobs are all waiting an hour; the next one is still runnable
+    assert queue.lease("a", 60)["id"] == "v21"
+    # A delayed job goes back in its place in line once its delay has passed
+    assert queue.defer("v21", "a", 0.05)
+    expire()
+    assert queue.lease("a", 60)["id"] == "v21"
+
+
+def test_expired_lease_on_final_attempt_fails_the_job(queue):
+    queue.enqueue("v1", URL.format("v1"), max_attempts=1)
+    queue.lease("a", 0.1)
+    expire()
+    assert queue.lease("b", 60) is None
+    job = queue.get("v1")
+    assert job["status"] == "failed" and job["error"] == "Lease expired on final attempt"
+
+
+def test_depth_and_batch_progress(queue):
+    queue.create_batch("batch-1", "team-a", ["v1", "v2"], source="playlist")
+    queue.enqueue("v1", URL.format("v1"), tenant="team-a", batch_id="batch-1")
+    queue.enqueue("v2", URL.format("v2"), tenant="team-a", batch_id="batch-1")
+    job = queue.lease("a", 60)
+    queue.complete(job["id"], "a")
+    assert queue.depth() == {"completed": 1, "queued": 1}
+    progress = queue.batch_progress("batch-1")
+    assert progress["total"] == 2 and progress["progress"] == 0.5 and not progress["done"]
+
+
+@pytest.mark.parametrize("status", ["completed", "failed"])
+def test_update_to_a_final_status_takes_the_job_off_the_queue(queue, status):
+    # How startup imports videos known only from checkpoint manifests
+    queue.enqueue("v1", URL.format("v1"))
+    queue.update("v1", status=status, video_folder="folder", metadata={"title": "T"})
+    assert queue.lease("a", 60) is None
+    job = queue.get("v1")
+    assert job["status"] == status and job["video_folder"] == "folder"
+
+
+def test_update_back_to_queued_makes_the_job_leasable(queue):
+    queue.enqueue("v1", URL.format("v1"))
+    queue.update("v1", status="completed")
+    queue.update("v1", status="queued")
+    assert queue.lease("a", 60)["id"] == "v1"
@@ -0,0 +1,101 @@
+import os
+import json
+
+import pytest
+
+from services.video_service import VideoService
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SLIDE = ["Raft Consensus Overview", "Leader election with randomized timeouts",
+         "Log replication to a majority of followers", "Safety: committed entries are never lost"]
+
+
+@pytest.fixture
+def service():
+    return VideoService()
+
+
+def frame(timestamp, lines):
+    return {"timestamp": timestamp, "path": f"frames/{timestamp}.jpg", "ocr_text": "\n".join(lines)}
+
+
+def all_text(entries):
+    return "\n".join(entry["ocr_text"] for entry in entries)
+
+
+def test_buildup_fixture_keeps_every_line_and_shrinks(service):
+    with open(os.path.join(FIXTURES, "ocr_buildup_frames.json")) as f:
+        frames = json.load(f)
+    entries = service.deduplicate_ocr_frames(frames)
+
+    text = all_text(entries)
+    for line in ("Log replication across followers", "Snapshots bound the log size", "Membership Changes"):
+        assert line in text
+    assert len(entries) == 4
+    assert entries[0]["ranges"] == [[0, 4000]]
+    assert entries[2]["ranges"] == [[16000, 20000]]
+
+    combined = service.prepare_combined_transcript(service.combine_data([], frames))
+    raw = sum(len(frame["ocr_text"]) for frame in frames)
+    assert sum(len(entry["ocr_text"]) for entry in entries) < raw / 2
+    assert "[0:00:00 - 0:00:04] Frame OCR" in combined
+
+
+def test_buildup_keeps_only_new_lines(service):
+    entries = service.deduplicate_ocr_frames([frame(0, SLIDE[:2]), frame(2000, SLIDE[:3]), frame(4000, SLIDE)])
+    assert [entry["ocr_text"] for entry in entries] == ["\n".join(SLIDE[:2]), SLIDE[2], SLIDE[3]]
+
+
+def test_small_addition_is_not_merged_away(service):
+    entries = service.deduplicate_ocr_frames([frame(0, SLIDE), frame(2000, SLIDE + ["Quorum: 3 of 5"])])
+    assert len(entries) == 2
+    assert entries[1]["ocr_text"] == "Quorum: 3 of 5"
+    assert entries[1]["timestamp"] == 2000
+
+
+def test_repeated_slide_merges_into_one_range(service):
+    entries = service.deduplicate_ocr_frames([frame(0, SLIDE), frame(2000, SLIDE), frame(4000, SLIDE)])
+    assert len(entries) == 1
+    assert entries[0]["ranges"] == [[0, 4000]]
+
+
+def test_slide_shown_again_gets_a_separate_range(service):
+    other = ["Membership changes", "Joint consensus between old and new configurations"]
+    frames = [frame(0, SLIDE), frame(2000, SLIDE), frame(4000, other), frame(6000, SLIDE)]
+    entries = service.deduplicate_ocr_frames(frames)
+    assert len(entries) == 2
+    assert entries[0]["ranges"] == [[0, 2000], [6000, 6000]]
+    assert entries[1]["ranges"] == [[4000, 4000]]
+
+    combined = service.prepare_combined_transcript(service.combine_data([], frames))
+    assert "[0:00:00 - 0:00:02, 0:00:06] Frame OCR" in combined
+    assert "0:00:00 - 0:00:06" not in combined
+
+
+def noisy(lines, index, position=5, char="0"):
+    """The slide as OCR might re-read it, with one character wrong in one line."""
+    line = lines[index]
+    return lines[:index] + [line[:position] + char + line[position + 1:]] + lines[index + 1:]
+
+
+def test_one_character_ocr_noise_still_merges(service):
+    frames = [frame(0, SLIDE), frame(2000, noisy(SLIDE, 1)), frame(4000, SLIDE), frame(6000, noisy(SLIDE, 3, 2, "5"))]
+    entries = service.deduplicate_ocr_frames(frames)
+    assert len(entries) == 1
+    assert entries[0]["ranges"] == [[0, 6000]]
+    assert entries[0]["ocr_text"] == "\n".join(SLIDE)
+
+
+def test_noisy_buildup_keeps_only_the_added_line(service):
+    frames = [frame(0, SLIDE[:3]), frame(2000, noisy(SLIDE, 0)), frame(4000, noisy(SLIDE, 2, 8, "l"))]
+    entries = service.deduplicate_ocr_frames(frames)
+    assert [entry["ocr_text"] for entry in entries] == ["\n".join(SLIDE[:3]), SLIDE[3]]
+    assert entries[1]["ranges"] == [[2000, 4000]]
+
+
+def test_line_matching_tolerates_noise_but_not_different_numbers(service):
+    assert service.ocr_line_matches("leader election with randomized timeouts",
+                                    {"leader electi0n with randomized timeouts"})
+    assert not service.ocr_line_matches("42", {"41"})
+    assert not service.ocr_line_matches("quorum 3 of 5", {"quorum 2 of 3"})
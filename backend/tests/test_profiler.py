@@ -0,0 +1,40 @@
+import os
+import threading
+
+import pytest
+
+from services.profiler import SamplingProfiler
+from services.video_service import VideoService
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_job_profile_leaves_out_unrelated_threads():
+    stop = threading.Event()
+    threads = [threading.Thread(target=busy, args=(stop,), name=name, daemon=True)
+               for name in ("chat-request", "pipeline-ocr_0")]
+    for thread in threads:
+        thread.start()
+    profiler = SamplingProfiler(interval=0.005, thread_id=threading.get_ident()).start()
+    threading.Event().wait(0.2)
+    profiler.stop()
+    stop.set()
+
+    roots = {stack.split(";")[0] for stack in profiler.samples}
+    assert roots == {"MainThread", "pipeline-ocr"}
+
+
+def test_profile_is_not_written_to_an_earlier_run_folder(tmp_path, monkeypatch):
+    monkeypatch.setenv("VIDIWISE_ENABLE_PROFILING", "true")
+    service = VideoService()
+    service.current_video_dir = str(tmp_path)
+
+    def fail_before_folder(url, cancel=None):
+        raise RuntimeError("download failed")
+    monkeypatch.setattr(service, "_process_video", fail_before_folder)
+    with pytest.raises(RuntimeError):
+        service.process_video("https://www.youtube.com/watch?v=v2", profile=True)
+    assert not os.path.exists(os.path.join(tmp_path, "profile.folded"))
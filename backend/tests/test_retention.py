@@ -0,0 +1,134 @@
+import os
+import time
+
+from services.checkpoint_service import CheckpointManager
+from services.retention_service import RetentionManager
+
+MB = 1024 * 1024
+
+
+def make_video(base_dir, name, media_bytes=1000, frames=2, mtime=None):
+    folder = os.path.join(base_dir, name)
+    os.makedirs(os.path.join(folder, "frames"))
+    with open(os.path.join(folder, "video.mp4"), "wb") as f:
+        f.write(b"\0" * media_bytes)
+    for i in range(frames):
+        with open(os.path.join(folder, "frames", f"{i}.jpg"), "wb") as f:
+            f.write(b"\0" * 100)
+    with open(os.path.join(folder, "video_transcript.txt"), "w") as f:
+        f.write("transcript")
+    if mtime:
+        os.utime(folder, (mtime, mtime))
+    return folder
+
+
+def counting_manager(base_dir, **options):
+    manager = RetentionManager(str(base_dir), budget_mb=options.pop("budget_mb", 100), **options)
+    manager.walked = []
+    scan_folder = manager.scan_folder
+
+    def walk(video_dir):
+        manager.walked.append(os.path.basename(video_dir))
+        return scan_folder(video_dir)
+    manager.scan_folder = walk
+    return manager
+
+
+def test_unchanged_folders_are_not_walked_again(tmp_path):
+    for i in range(5):
+        make_video(tmp_path, f"v{i}")
+    manager = counting_manager(tmp_path, sweep_per_pass=0)
+    stats = manager.collect_once()
+    assert len(manager.walked) == 5
+    assert stats["tiers"]["media"] == {"bytes": 5000, "files": 5}
+    assert stats["tiers"]["frames"] == {"bytes": 1000, "files": 10}
+
+    manager.walked.clear()
+    stats = manager.collect_once()
+    assert manager.walked == [] and stats["rescanned_folders"] == 0
+    assert stats["total_bytes"] == 5 * (1000 + 200 + len("transcript"))
+
+
+def test_changed_and_removed_folders_are_rescanned(tmp_path):
+    for i in range(3):
+        make_video(tmp_path, f"v{i}")
+    manager = counting_manager(tmp_path, sweep_per_pass=0)
+    manager.collect_once()
+    manager.walked.clear()
+
+    os.replace(os.path.join(tmp_path, "v1", "video.mp4"), os.path.join(tmp_path, "v1", "video.webm"))
+    with open(os.path.join(tmp_path, "v1", "video.mp3"), "wb") as f:
+        f.write(b"\0" * 300)
+    os.rename(os.path.join(tmp_path, "v2"), os.path.join(tmp_path, "gone"))
+    os.rename(os.path.join(tmp_path, "gone"), os.path.join(tmp_path, "v3"))
+    stats = manager.collect_once()
+    # v3 is new (a rename keeps the mtime, but the folder was never seen)
+    assert sorted(manager.walked) == ["v1", "v3"]
+    assert stats["videos"] == 3
+    assert stats["tiers"]["audio"] == {"bytes": 300, "files": 1}
+
+
+def test_rescans_per_pass_are_bounded_after_the_first(tmp_path):
+    for i in range(6):
+        make_video(tmp_path, f"v{i}", mtime=time.time() - 100)
+    manager = counting_manager(tmp_path, max_rescans_per_pass=2, sweep_per_pass=1)
+    manager.collect_once()
+    assert len(manager.walked) == 6
+
+    for i in range(6):
+        os.utime(os.path.join(tmp_path, f"v{i}"), None)
+    for _ in range(3):
+        manager.walked.clear()
+        manager.collect_once()
+        # At most two changed folders plus one swept
+        assert len(manager.walked) <= 3
+    # Deferred folders are caught up on later passes
+    assert all(state["mtime"] == os.stat(path).st_mtime_ns for path, state in manager.folders.items())
+
+
+def test_eviction_frees_least_recently_used_media_first(tmp_path):
+    old = make_video(tmp_path, "old", media_bytes=MB)
+    new = make_video(tmp_path, "new", media_bytes=MB)
+    manager = RetentionManager(str(tmp_path), budget_mb=1.5)
+    os.utime(old, (time.time() - 1000, time.time() - 1000))
+    manager.touch(new)
+
+    stats = manager.collect_once()
+    assert not os.path.exists(os.path.join(old, "video.mp4"))
+    assert os.path.exists(os.path.join(new, "video.mp4"))
+    assert stats["evicted_bytes"] == MB
+    assert stats["tiers"]["media"]["bytes"] == MB
+
+    # The eviction changed the folder, so the next pass sees it from disk
+    stats = manager.collect_once()
+    assert stats["tiers"]["media"] == {"bytes": MB, "files": 1}
+
+
+def test_folder_requeued_since_the_scan_is_not_evicted(tmp_path):
+    old = make_video(tmp_path, "old", media_bytes=MB)
+    CheckpointManager(old).update_job(video_id="old", status="completed")
+    statuses = {}
+    manager = RetentionManager(str(tmp_path), budget_mb=100, job_status=statuses.get)
+    manager.collect_once()
+
+    # Resubmitted after the last scan, then the budget shrinks before the next one
+    statuses["old"] = "queued"
+    manager.budget_bytes = MB // 2
+    manager.sweep_per_pass = 0
+    stats = manager.collect_once()
+    assert os.path.exists(os.path.join(old, "video.mp4"))
+    assert stats["evicted_bytes"] == 0
+
+    statuses["old"] = "completed"
+    manager.collect_once()
+    assert not os.path.exists(os.path.join(old, "video.mp4"))
+
+
+def test_databases_count_against_the_budget(tmp_path):
+    make_video(tmp_path, "v1")
+    for name in ("jobs.db", "jobs.db-wal", "search.db"):
+        with open(os.path.join(tmp_path, name), "wb") as f:
+            f.write(b"\0" * 500)
+    stats = RetentionManager(str(tmp_path), budget_mb=100).collect_once()
+    assert stats["tiers"]["databases"] == {"bytes": 1500, "files": 3}
+    assert stats["total_bytes"] == 1000 + 200 + len("transcript") + 1500
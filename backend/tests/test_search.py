@@ -0,0 +1,43 @@
+import os
+
+from services.video_service import VideoService
+from services.search_service import SearchIndex, parse_transcript
+
+SLIDE = ["Raft Consensus Overview", "Leader election with randomized timeouts"]
+OTHER = ["Membership changes", "Joint consensus between configurations"]
+
+
+def frame(timestamp, lines):
+    return {"timestamp": timestamp, "path": "", "ocr_text": "\n".join(lines)}
+
+
+def write_transcript(tmp_path, transcript, frames):
+    service = VideoService()
+    path = os.path.join(tmp_path, "video_transcript.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(service.prepare_combined_transcript(service.combine_data(transcript, frames)))
+    return path
+
+
+def test_revisited_slide_round_trips_with_every_range(tmp_path):
+    frames = [frame(0, SLIDE), frame(2000, SLIDE), frame(4000, OTHER), frame(6000, SLIDE),
+              frame(90000000, OTHER + ["Log compaction"])]
+    path = write_transcript(tmp_path, [{"start": 1.5, "end": 3.0, "text": "welcome"}], frames)
+    segments = parse_transcript(path)
+
+    assert all(segment["start"] is not None for segment in segments)
+    slide = [(s["start"], s["end"]) for s in segments if s["text"].startswith("Raft")]
+    assert slide == [(0.0, 2.0), (6.0, 6.0)]
+    assert [s["text"] for s in segments if s["kind"] == "transcript"] == ["welcome"]
+    # Timestamps past a day are written as "1 day, 1:00:00"
+    assert [(s["start"], s["text"]) for s in segments if s["start"] == 90000.0] == [(90000.0, "Log compaction")]
+
+
+def test_search_hits_on_a_revisited_slide_have_timestamps(tmp_path):
+    path = write_transcript(tmp_path, [], [frame(0, SLIDE), frame(4000, OTHER), frame(6000, SLIDE)])
+    index = SearchIndex(os.path.join(tmp_path, "search.db"))
+    index.index_transcript("v1", path)
+    results = index.search("randomized timeouts")
+    assert results and results[0]["video_id"] == "v1"
+    starts = [segment["start"] for segment in results[0]["matches"]]
+    assert starts and None not in starts
@@ -0,0 +1,58 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from services.transcription import GroqBackend, LocalWhisperBackend, TranscriptionRouter
+
+FFMPEG = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+
+class RecordingGroqBackend(GroqBackend):
+    """Records each upload instead of calling Groq; each answer is one segment covering the upload."""
+
+    def __init__(self, **kwargs):
+        super().__init__(api_key="test", **kwargs)
+        self.uploads = []
+
+    def transcribe_file(self, audio_file, duration):
+        self.uploads.append(os.path.getsize(audio_file))
+        return [{"start": 0.0, "end": duration, "text": f"upload {len(self.uploads)}"}]
+
+
+class MissingLocalBackend(LocalWhisperBackend):
+    def available(self):
+        return False
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    if not shutil.which(FFMPEG):
+        pytest.skip("ffmpeg is not installed")
+    path = os.path.join(tmp_path, "audio.mp3")
+    subprocess.run([FFMPEG, "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=30",
+                    "-b:a", "128k", path], check=True)
+    return path
+
+
+def test_audio_too_large_for_groq_is_split_when_groq_is_the_only_backend(audio_file):
+    # 50KB holds about 11s at the upload bitrate, so 30s of audio needs three pieces
+    groq = RecordingGroqBackend(max_file_bytes=50000)
+    router = TranscriptionRouter(groq, MissingLocalBackend())
+    assert not groq.accepts(audio_file)
+    assert router.choose(audio_file, 30) == ([groq], "only_backend")
+
+    segments = router.transcribe(audio_file)
+    assert len(groq.uploads) == 3 and max(groq.uploads) <= 50000
+    assert [segment["text"] for segment in segments] == ["upload 1", "upload 2", "upload 3"]
+    # Segment times are moved back onto the original audio's timeline
+    assert segments[0]["start"] == 0 and segments[1]["start"] == pytest.approx(11.25)
+    assert segments[-1]["end"] == pytest.approx(30, abs=0.5)
+
+
+def test_audio_too_large_for_groq_prefers_local_and_keeps_groq_as_fallback(audio_file):
+    groq = RecordingGroqBackend(max_file_bytes=50000)
+    local = LocalWhisperBackend()
+    local.available = lambda: True
+    assert TranscriptionRouter(groq, local).choose(audio_file, 30) == ([local, groq], "too_large")
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from services.upstream import UpstreamScheduler, RedisUpstreamScheduler, BACKGROUND, INTERACTIVE
+
+LIMITS = {"groq": {"rpm": 4, "ash": 600}}
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def open_scheduler(request, tmp_path):
+    """Opens a new scheduler over one shared store, as each API or worker process would."""
+    if request.param == "sqlite":
+        path = os.path.join(tmp_path, "upstream.db")
+        return lambda: UpstreamScheduler(path, LIMITS)
+    url, prefix = request.getfixturevalue("redis_url"), request.getfixturevalue("redis_prefix")
+    return lambda: RedisUpstreamScheduler(url, LIMITS, prefix=prefix)
+
+
+def test_processes_share_buckets_and_background_leaves_a_reserve(open_scheduler):
+    api, worker = open_scheduler(), open_scheduler()
+    for _ in range(3):
+        assert worker.try_acquire("groq:whisper", LIMITS["groq"], {"requests": 1}, BACKGROUND) == 0
+    # The last request of the minute is kept for chat, whichever process asks
+    assert worker.estimate_wait("groq", "whisper", {}, BACKGROUND) > 0
+    assert api.estimate_wait("groq", "whisper", {}, INTERACTIVE) == 0
+    assert api.try_acquire("groq:whisper", LIMITS["groq"], {"requests": 1}, INTERACTIVE) == 0
+    assert api.estimate_wait("groq", "whisper", {}, INTERACTIVE) > 0
+
+
+def test_actual_cost_is_settled(open_scheduler):
+    scheduler = open_scheduler()
+    scheduler.call("groq", "whisper", lambda: 30, cost={"audio_seconds": 300}, lane=BACKGROUND,
+                   actual_cost=lambda seconds: {"audio_seconds": seconds})
+    # 270 of the 300 estimated seconds are refunded, leaving room above the 150 second reserve
+    assert scheduler.estimate_wait("groq", "whisper", {"audio_seconds": 400}, BACKGROUND) == 0
+    assert scheduler.estimate_wait("groq", "whisper", {"audio_seconds": 450}, BACKGROUND) > 0
+
+
+def test_rate_limit_backs_off_and_recovers(open_scheduler):
+    scheduler = open_scheduler()
+    scheduler.record_rate_limited("groq", "whisper", retry_after=30)
+    assert 25 < open_scheduler().estimate_wait("groq", "whisper", {}) <= 30
+    scheduler.record_rate_limited("groq", "whisper")
+    assert 0 < open_scheduler().estimate_wait("groq", "whisper", {}) <= 2
+    # Each success restores 5% of the rate; at the full rate the backoff is cleared
+    for _ in range(20):
+        scheduler.record_success("groq", "whisper")
+    assert open_scheduler().estimate_wait("groq", "whisper", {}) == 0
@@ -0,0 +1,55 @@
+import os
+import threading
+
+from services.job_queue import SQLiteJobQueue, JobCancelled
+from services.upstream import QuotaExceededError
+from services.worker import Worker
+
+
+class BlockingVideoService:
+    """Runs until cancelled, like a long pipeline stage."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    def process_video(self, url, profile=False, cancel=None):
+        if cancel is not None and cancel.wait(5):
+            self.cancelled.set()
+            raise JobCancelled("cancelled")
+        return {"video_folder": "unused"}
+
+
+class QuotaExhaustedVideoService:
+    def process_video(self, url, profile=False, cancel=None):
+        raise QuotaExceededError("groq", "Daily audio quota used up", retry_after=900)
+
+
+def test_worker_defers_job_when_upstream_quota_is_exhausted(tmp_path):
+    queue = SQLiteJobQueue(os.path.join(tmp_path, "jobs.db"))
+    queue.enqueue("v1", "https://www.youtube.com/watch?v=v1", max_attempts=1)
+    worker = Worker(queue, QuotaExhaustedVideoService, worker_id="a")
+    worker.run_once()
+
+    job = queue.get("v1")
+    # On its only attempt, a quota wait would otherwise fail the job for good
+    assert job["status"] == "queued" and job["attempts"] == 0
+    assert job["available_at"] - job["updated_at"] >= 900
+
+
+def test_worker_stops_job_when_lease_is_lost(tmp_path):
+    queue = SQLiteJobQueue(os.path.join(tmp_path, "jobs.db"))
+    queue.enqueue("v1", "https://www.youtube.com/watch?v=v1")
+    service = BlockingVideoService()
+    # The lease runs out before the first renewal, so another worker can take the job
+    worker = Worker(queue, lambda: service, worker_id="a", lease_seconds=0.2, heartbeat_interval=0.5)
+    thread = threading.Thread(target=worker.run_once)
+    thread.start()
+    threading.Event().wait(0.3)
+    assert queue.lease("b", 60)["id"] == "v1"
+    thread.join(5)
+
+    assert service.cancelled.is_set()
+    job = queue.get("v1")
+    # Worker a neither completed nor failed the job it no longer owns
+    assert job["status"] == "leased" and job["lease_owner"] == "b"
+    assert job["error"] is None
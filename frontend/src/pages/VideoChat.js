@@ -16,9 +16,11 @@ const VideoChat = () => {
   const [isEditingTitle, setIsEditingTitle] = useState(false);
   const [tempTitle, setTempTitle] = useState('');
   const [mounted, setMounted] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
 
   useEffect(() => {
     // Check video status and initialize chat
+    setSessionId(null);
     initializeChat();
     
     // Trigger mount animation
@@ -114,13 +116,18 @@ const VideoChat = () => {
     setIsLoading(true);
 
     try {
-      const response = await apiService.sendChatMessage(videoId, currentMessage);
+      const response = await apiService.sendChatMessage(videoId, currentMessage, sessionId);
+      setSessionId(response.sessionId);
       const aiResponse = {
         type: 'ai',
         content: response.message
       };
       setMessages(prev => [...prev, aiResponse]);
     } catch (err) {
+      if (err.message.startsWith('Chat session not found')) {
+        // Expired on the server; the next message starts a new session
+        setSessionId(null);
+      }
       const errorResponse = {
         type: 'ai',
         content: `Sorry, I encountered an error: ${err.message}. Please try again.`
@@ -76,8 +76,8 @@ class ApiService {
     }
   }
 
-  // Send chat message
-  async sendChatMessage(videoId, message) {
+  // Send chat message; pass the sessionId from the previous reply to continue the conversation
+  async sendChatMessage(videoId, message, sessionId = null) {
     try {
       const response = await fetch(`${API_BASE_URL}/start-chat`, {
         method: 'POST',
@@ -87,6 +87,7 @@ class ApiService {
         body: JSON.stringify({
           videoId,
           message,
+          sessionId,
         }),
       });
 